@@ -0,0 +1,37 @@
+# CurrMainTrans.aspx 選課結果（alert 訊息）的分類
+#
+# 比對 ALERT_RULES 的每一條規則，關鍵字都是完整的片語，不用「限修」「不符合」這類可能出現在其他訊息中的片段。
+# - 'relogin' 符合時一律重新登入
+# - 只符合一種失敗（full / conflict / ineligible）時為該失敗：實際系統的失敗訊息也可能以「加選訊息：」開頭，
+#   所以同時符合 'success' 時仍以失敗為準
+# - 同時符合兩種以上的失敗時無法判斷，為 'unknown'（退避後重試，不會把額滿的課程誤判為資格不符而移除）
+# - 只符合 'success' 時為成功，都不符合時為 'unknown'
+# 'conflict' / 'ineligible' 再試也不會成功，排程會直接移除該課程，不再送出請求。
+
+ALERT_RULES = [
+    ('relogin', ('please log on again!', '請重新登入')),
+    ('full', ('人數已額滿', '已額滿', '人數已滿', '名額已滿')),
+    ('conflict', ('衝堂', '時間衝突', '時段重疊')),
+    ('ineligible', ('超過學分上限', '學分已達上限', '超修學分', '不符合修課資格', '修課資格不符', '非限修對象',
+                    '不符限修條件', '擋修', '不得重複修習')),
+    ('success', ('加選訊息：', '加選成功', '已選過')),
+]
+
+OUTCOMES = ('success', 'full', 'conflict', 'ineligible', 'relogin', 'unknown')
+# 不會因為重試而改變結果的失敗
+FINAL_FAILURES = ('conflict', 'ineligible')
+
+
+def classify_alert(alertMsg, course_name=None, rules=ALERT_RULES):
+    """alert 訊息 -> OUTCOMES 之一；course_name 會先從訊息中移除，避免課名中的字（例如「教師資格」）誤判"""
+    if course_name:
+        alertMsg = alertMsg.replace(course_name, '')
+    matched = [outcome for outcome, keywords in rules if any(keyword in alertMsg for keyword in keywords)]
+    if 'relogin' in matched:
+        return 'relogin'
+    failures = [outcome for outcome in matched if outcome != 'success']
+    if len(failures) > 1:
+        return 'unknown'
+    if failures:
+        return failures[0]
+    return 'success' if matched else 'unknown'
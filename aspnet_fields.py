@@ -0,0 +1,70 @@
+# 快速擷取 ASP.NET 頁面中的隱藏欄位，不需要為整個 ViewState 頁面建立 BeautifulSoup 樹
+
+import re
+from html import unescape
+
+# WebForms 每次 postback 都必須帶回的欄位
+ASPNET_FIELDS = ('__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION')
+
+_ATTR_RE = re.compile(r'''([^\s=/>"']+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''')
+_OPTION_RE = re.compile(r'''<option\b([^>]*)>''', re.IGNORECASE)
+_SCRIPT_RE = re.compile(r'''<script\b[^>]*>(.*?)</script\s*>''', re.IGNORECASE | re.DOTALL)
+
+
+class MissingFieldError(ValueError):
+    """頁面中找不到預期的欄位（通常代表被登出、被擋或頁面格式改變）"""
+
+    def __init__(self, field):
+        self.field = field
+        super().__init__('{} not found in page (logged out, blocked or page layout changed?)'.format(field))
+
+
+def _parse_attrs(tag):
+    attrs = {}
+    for name, dq, sq, bare in _ATTR_RE.findall(tag):
+        attrs[name.lower()] = unescape(dq or sq or bare)
+    return attrs
+
+
+def _find_tag(html, element_id, start=0):
+    """以 id 尋找元素的開始標籤，回傳 (屬性 dict, 標籤結束位置)"""
+    for quote in ('"', "'"):
+        needle = 'id={0}{1}{0}'.format(quote, element_id)
+        idx = html.find(needle, start)
+        while idx > 0 and not html[idx - 1].isspace():
+            # 略過 data-id="..." 之類的屬性
+            idx = html.find(needle, idx + len(needle))
+        if idx > 0:
+            tag_start = html.rfind('<', 0, idx)
+            tag_end = html.find('>', idx)
+            if tag_start >= 0 and tag_end >= 0:
+                return _parse_attrs(html[tag_start:tag_end]), tag_end + 1
+    raise MissingFieldError(element_id)
+
+
+def extract_field(html, element_id):
+    """取得 <input id=element_id> 的 value"""
+    attrs, _ = _find_tag(html, element_id)
+    return attrs.get('value', '')
+
+
+def extract_hidden_fields(html, names=ASPNET_FIELDS):
+    """取得 __VIEWSTATE、__VIEWSTATEGENERATOR、__EVENTVALIDATION 等隱藏欄位"""
+    return {name: extract_field(html, name) for name in names}
+
+
+def extract_select_options(html, element_id):
+    """取得 <select id=element_id> 中所有 option 的 value"""
+    _, start = _find_tag(html, element_id)
+    end = html.find('</select', start)
+    if end < 0:
+        raise MissingFieldError(element_id + ' </select>')
+    return [_parse_attrs(attrs).get('value', '') for attrs in _OPTION_RE.findall(html, start, end)]
+
+
+def extract_first_script(html):
+    """取得頁面中第一個 <script> 的內容（選課結果以 alert(...) 回傳）"""
+    match = _SCRIPT_RE.search(html)
+    if match is None:
+        raise MissingFieldError('<script>')
+    return match.group(1)
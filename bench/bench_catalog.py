@@ -0,0 +1,101 @@
+# 比較 coursesDB 原本的 {'name', 'mUrl'} dict 與 CourseRecord / CourseCatalog 的記憶體用量與查詢速度
+#
+# usage: python bench/bench_catalog.py [--depts 80] [--courses 150] [-n 100000]
+#
+# 以合成的全系所課程清單量測（tracemalloc，包含建立期間的暫存），查詢包含：
+# 確認列表頁上仍有該課程的按鈕（原本每次都要 split），以及同一課號的所有班級。
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from course_catalog import CourseCatalog, CourseRecord
+
+LANGUAGES = ['Chinese', 'English']
+
+
+def synthetic_mUrls(depts, courses):
+    rng = random.Random(0)
+    for d in range(depts):
+        dept = str(300 + d)
+        for i in range(courses):
+            code = 'D{:03d}{:03d}'.format(d, i // 2)
+            cls = 'AB'[i % 2]
+            credits = rng.choice([1, 2, 3])
+            yield dept, 'SelCos,{0},{1},{2},F,{3},{4},{5},{0},{1},{3} 課程名稱{6}'.format(
+                code, cls, rng.randint(1, 4), credits, rng.choice('YN'), rng.choice(LANGUAGES), i)
+
+
+def build_dicts(listing):
+    db = {}
+    for dept, mUrl in listing:
+        tokens = mUrl.split(',')
+        key = tokens[1] + tokens[2]
+        db[key] = {'name': '{} {}'.format(key, tokens[-1].split(' ')[1]), 'mUrl': mUrl}
+    return db
+
+
+def build_catalog(listing):
+    return CourseCatalog(CourseRecord.from_mUrl(mUrl, dept) for dept, mUrl in listing)
+
+
+def measure(build, args):
+    # 按鈕名稱字串在量測期間才產生，只有被保留下來的部分會計入
+    tracemalloc.start()
+    start = time.perf_counter()
+    db = build(synthetic_mUrls(args.depts, args.courses))
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return db, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory and lookup cost of the course catalog')
+    parser.add_argument('--depts', type=int, default=80)
+    parser.add_argument('--courses', type=int, default=150, help='courses per department')
+    parser.add_argument('-n', '--lookups', type=int, default=100_000)
+    args = parser.parse_args()
+
+    dicts, dict_size, dict_build = measure(build_dicts, args)
+    catalog, catalog_size, catalog_build = measure(build_catalog, args)
+
+    keys = random.Random(1).choices(list(dicts), k=args.lookups)
+
+    start = time.perf_counter()
+    for key in keys:
+        dicts[key]['mUrl'].split(' ')[0]
+    dict_lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        catalog[key].button
+    catalog_lookup = time.perf_counter() - start
+
+    codes = [key[:-1] for key in keys[:1000]]
+    start = time.perf_counter()
+    for code in codes:
+        [v for k, v in dicts.items() if k[:-1] == code]
+    dict_classes = time.perf_counter() - start
+    start = time.perf_counter()
+    for code in codes:
+        catalog.classes(code)
+    catalog_classes = time.perf_counter() - start
+
+    print('{} courses in {} departments'.format(len(catalog), args.depts))
+    print('  {:<16} {:>10} {:>12} {:>16} {:>20}'.format('', 'memory', 'build', 'button lookup', 'classes of a code'))
+    print('  {:<16} {:>7.0f} KB {:>9.1f} ms {:>13.2f} us {:>17.2f} us'.format(
+        'dict', dict_size / 1024, dict_build * 1000, dict_lookup / len(keys) * 1e6, dict_classes / len(codes) * 1e6))
+    print('  {:<16} {:>7.0f} KB {:>9.1f} ms {:>13.2f} us {:>17.2f} us'.format(
+        'CourseCatalog', catalog_size / 1024, catalog_build * 1000, catalog_lookup / len(keys) * 1e6,
+        catalog_classes / len(codes) * 1e6))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# 量測登入所需時間（time-to-logged-in）：依序下載驗證碼 -> 辨識 -> 下載登入頁，或登入頁與辨識同時進行
+#
+# usage: python bench/bench_login.py [-n 20] [--latency 0 50 150] [--backend numpy] [--model model.h5]
+#
+# 在本機模擬伺服器上量測 login()，以及 selectCourses 收到 please log on again! 之後的重新登入
+# （模擬伺服器每 2 次選課要求重新登入一次）。依序模式以同步執行的 executor 取代登入頁的背景下載，
+# 也就是原本 GET 驗證碼、辨識、GET 登入頁、POST 的順序。
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import Future
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.mock_server import DEFAULT_CATALOG, start_mock_server
+from yzuCourseBot import CourseBot
+
+BENCH_CATALOG = {dept: [course[:5] + (10 ** 9,) for course in courses] for dept, courses in DEFAULT_CATALOG.items()}
+BENCH_COURSES = ['304,CS201A', '304,CS352A', '304,CS354A', '901,LS239A', '312,EEB219A']
+
+
+class InlineExecutor:
+    """submit 時直接執行，等同於沒有重疊的原本流程"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def median(samples):
+    return sorted(samples)[len(samples) // 2]
+
+
+def measure(args, latency, pipelined):
+    server, mock, base_url = start_mock_server(catalog=BENCH_CATALOG, latency_ms=latency, relogin_every=2)
+    try:
+        bot = CourseBot('bench', 'bench', args.backend, args.model, cachePath=None, baseUrl=base_url)
+        bot.log = lambda msg: None
+        if not pipelined:
+            bot.loginPrefetch = InlineExecutor()
+
+        logins = []
+        login = bot.login
+
+        def timed_login():
+            start = time.perf_counter()
+            login()
+            logins.append((time.perf_counter() - start) * 1000)
+
+        bot.login = timed_login
+        for _ in range(args.iterations):
+            bot.login()
+        fresh, logins[:] = logins[:], []
+
+        bot.getCourseDB(sorted(set(course.split(',')[0] for course in BENCH_COURSES)))
+        for _ in range(max(1, args.iterations // 2)):
+            bot.selectCourses(list(BENCH_COURSES))
+        return median(fresh), median(logins) if logins else float('nan'), len(logins)
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time-to-logged-in with and without overlapping OCR and the login page')
+    parser.add_argument('-n', '--iterations', type=int, default=20)
+    parser.add_argument('--latency', type=float, nargs='+', default=[0, 50, 150],
+                        help='simulated server latency per request (ms)')
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--model', default=os.path.join(ROOT, 'model.h5'))
+    args = parser.parse_args()
+
+    print('median time-to-logged-in (ms), {} logins per case, {} backend'.format(args.iterations, args.backend))
+    print('  {:>8} {:>14} {:>14} {:>8} {:>16} {:>16} {:>8}'.format(
+        'latency', 'login seq', 'login overlap', 'saved', 'relogin seq', 'relogin overlap', 'saved'))
+    for latency in args.latency:
+        seq_login, seq_relogin, _ = measure(args, latency, pipelined=False)
+        pipe_login, pipe_relogin, relogins = measure(args, latency, pipelined=True)
+        print('  {:>8.0f} {:>14.1f} {:>14.1f} {:>8.1f} {:>16.1f} {:>16.1f} {:>8.1f}'.format(
+            latency, seq_login, pipe_login, seq_login - pipe_login, seq_relogin, pipe_relogin, seq_relogin - pipe_relogin))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# 量測 ocr_daemon.py 省下的啟動時間：每次都在新程序中建立 CourseBot（與重新執行 yzuCourseBot.py 相同）
+#
+# usage: python bench/bench_ocr_daemon.py [-n 5] [--model model.h5] [--backend keras]
+#
+# 分別在沒有 daemon 與 daemon 執行中時，量測新程序從啟動到 CourseBot 建立完成的時間（包含 Python 啟動與 import），
+# 以及第一張驗證碼的辨識延遲（daemon 為 socket 來回，程序內則已 warm up）。只能在有 AF_UNIX 的平台執行。
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from yzuCourseBot import CourseBot
+from tools.mock_server import render_captcha
+bot = CourseBot('bench', 'bench', {backend!r}, modelPath={model!r}, cachePath=None, ocrSocket={socket!r})
+bot.log = lambda msg: None
+ready = time.perf_counter()
+captcha = render_captcha('AB12')
+ocr_start = time.perf_counter()
+bot.captchaOCR(captcha)
+print(json.dumps({{'startup': ready - start, 'ocr': time.perf_counter() - ocr_start, 'daemon': bot.ocrClient is not None}}))
+'''
+
+
+def run_child(args, socket_path):
+    code = CHILD.format(root=ROOT, backend=args.backend, model=os.path.abspath(args.model), socket=socket_path)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True, cwd=ROOT).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['total'] = time.perf_counter() - start
+    return result
+
+
+def report(name, results):
+    def median(key):
+        return sorted(r[key] for r in results)[len(results) // 2] * 1000
+    print('  {:<12} process {:8.0f} ms   CourseBot ready {:8.0f} ms   first OCR {:7.1f} ms'.format(
+        name, median('total'), median('startup'), median('ocr')))
+    return median('total')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-run startup time saved by the OCR daemon')
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('--model', default=os.path.join(ROOT, 'model.h5'))
+    parser.add_argument('--backend', default='keras')
+    args = parser.parse_args()
+
+    socket_path = os.path.join(tempfile.mkdtemp(), 'ocr.sock')
+    cold = [run_child(args, socket_path) for _ in range(args.runs)]
+
+    daemon = subprocess.Popen([sys.executable, os.path.join(ROOT, 'ocr_daemon.py'), '--model', args.model,
+                               '--backend', args.backend, '--socket', socket_path],
+                              stdout=subprocess.PIPE, text=True, cwd=ROOT)
+    try:
+        print(daemon.stdout.readline().strip())
+        warm = [run_child(args, socket_path) for _ in range(args.runs)]
+    finally:
+        daemon.terminate()
+        daemon.wait()
+    if not all(r['daemon'] for r in warm):
+        print('CourseBot did not use the daemon')
+        return 1
+
+    print('{} runs each, {} backend (medians)'.format(args.runs, args.backend))
+    cold_ms = report('in-process', cold)
+    warm_ms = report('daemon', warm)
+    print('  startup saved per run: {:.0f} ms'.format(cold_ms - warm_ms))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
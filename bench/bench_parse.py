@@ -0,0 +1,87 @@
+# 比較 BeautifulSoup 與 aspnet_fields 擷取 ASP.NET 隱藏欄位的速度
+#
+# usage: python bench/bench_parse.py [saved_page.html ...] [-n 200]
+#
+# 未指定頁面時會產生一個模擬的 CosList.aspx（含大型 ViewState 與課程表格）。
+
+import os
+import sys
+import time
+import base64
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from aspnet_fields import extract_hidden_fields
+
+
+def synthetic_page(viewstate_bytes=200_000, courses=150):
+    viewstate = base64.b64encode(os.urandom(viewstate_bytes)).decode()
+    validation = base64.b64encode(os.urandom(4_000)).decode()
+    rows = '\n'.join(
+        '<tr><td><input type="image" name="SelCos,CS{0:03d},A,1,F,3,Y,Chinese,CS{0:03d},A,3 課程{0}" src="add.gif" /></td>'
+        '<td>CS{0:03d}A</td><td>課程{0}</td><td>3</td></tr>'.format(i)
+        for i in range(courses)
+    )
+    return '''<html><head><title>CosList</title></head><body>
+<form method="post" action="./CosList.aspx" id="form1">
+<div class="aspNetHidden">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{}" />
+</div>
+<div class="aspNetHidden">
+<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="3A0F6B1C" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{}" />
+</div>
+<table id="CosListTable">{}</table>
+</form></body></html>'''.format(viewstate, validation, rows)
+
+
+def bs4_fields(html):
+    parser = BeautifulSoup(html, 'lxml')
+    return {
+        '__VIEWSTATE': parser.select("#__VIEWSTATE")[0]['value'],
+        '__VIEWSTATEGENERATOR': parser.select("#__VIEWSTATEGENERATOR")[0]['value'],
+        '__EVENTVALIDATION': parser.select("#__EVENTVALIDATION")[0]['value'],
+    }
+
+
+def timeit(fn, html, n):
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn(html)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ASP.NET hidden field extraction benchmark')
+    parser.add_argument('pages', nargs='*', help='saved html pages (default: synthetic CosList page)')
+    parser.add_argument('-n', type=int, default=200, help='iterations per page')
+    args = parser.parse_args()
+
+    pages = []
+    for path in args.pages:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        pages.append(('synthetic CosList.aspx', synthetic_page()))
+
+    for name, html in pages:
+        if bs4_fields(html) != extract_hidden_fields(html):
+            print('{}: results differ!'.format(name))
+            return 1
+        bs_p50, bs_p95 = timeit(bs4_fields, html, args.n)
+        fast_p50, fast_p95 = timeit(extract_hidden_fields, html, args.n)
+        print('{} ({:.0f} KB)'.format(name, len(html) / 1024))
+        print('  BeautifulSoup : p50 {:8.3f} ms  p95 {:8.3f} ms'.format(bs_p50, bs_p95))
+        print('  aspnet_fields : p50 {:8.3f} ms  p95 {:8.3f} ms  ({:.0f}x faster)'.format(
+            fast_p50, fast_p95, bs_p50 / fast_p50 if fast_p50 else float('inf')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
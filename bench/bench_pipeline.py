@@ -0,0 +1,137 @@
+# 端對端效能測試：login -> getCourseDB -> selectCourses，另外量測 OCR 與 HTML 解析
+#
+# usage: python bench/bench_pipeline.py [-n 50] [--backend numpy] [--model model.h5] [--latency 0] [-o result.json]
+#
+# 在本機啟動 tools/mock_server.py，不會連線到學校伺服器。結果會輸出各階段的百分位數，
+# 並寫入 JSON 檔，方便比較不同 commit / OCR 引擎 / 解析方式的差異。
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup
+from aspnet_fields import extract_hidden_fields
+from tools.mock_server import DEFAULT_CATALOG, render_captcha, start_mock_server
+from yzuCourseBot import CourseBot
+
+# 名額充足，讓每一輪選課都能在第一次嘗試就成功
+BENCH_CATALOG = {dept: [course[:5] + (10 ** 9,) for course in courses] for dept, courses in DEFAULT_CATALOG.items()}
+BENCH_COURSES = ['304,CS201A', '304,CS352A', '304,CS354A', '901,LS239A', '312,EEB219A']
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def rank(p):
+        return samples[min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))]
+
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'min': samples[0],
+        'p50': rank(50),
+        'p90': rank(90),
+        'p99': rank(99),
+        'max': samples[-1],
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end CourseBot benchmark against the local mock server')
+    parser.add_argument('-n', '--iterations', type=int, default=50)
+    parser.add_argument('--backend', default='numpy', help="OCR backend ('numpy' or 'keras')")
+    parser.add_argument('--model', default=os.path.join(ROOT, 'model.h5'))
+    parser.add_argument('--latency', type=float, default=0, help='simulated server latency per request (ms)')
+    parser.add_argument('--viewstate-kb', type=int, default=40)
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    server, mock, base_url = start_mock_server(catalog=BENCH_CATALOG, latency_ms=args.latency,
+                                               viewstate_kb=args.viewstate_kb)
+    depts = sorted(set(course.split(',')[0] for course in BENCH_COURSES))
+
+    # 建立 CourseBot 包含載入模型與 warm-up
+    startup_ms, bot = timed(lambda: CourseBot('bench', 'bench', args.backend, args.model, cachePath=None, baseUrl=base_url))
+    bot.log = lambda msg: None
+
+    timings = {'login': [], 'getCourseDB': [], 'selectCourses': [], 'ocr': [], 'parse_fields': [], 'parse_course_table': []}
+    try:
+        for _ in range(args.iterations):
+            ms, _ = timed(bot.login)
+            timings['login'].append(ms)
+
+            bot.coursesDB.clear()
+            bot.deptState.clear()
+            ms, _ = timed(bot.getCourseDB, depts, True)
+            timings['getCourseDB'].append(ms)
+
+            ms, _ = timed(bot.selectCourses, list(BENCH_COURSES))
+            timings['selectCourses'].append(ms)
+
+        # 單獨量測 OCR 與 HTML 解析
+        captchas = [render_captcha('AB12', mock.captcha_size) for _ in range(args.iterations)]
+        for captcha in captchas:
+            ms, _ = timed(bot.captchaOCR, captcha)
+            timings['ocr'].append(ms)
+
+        listing = mock.course_list_page('304')
+        for _ in range(args.iterations):
+            ms, _ = timed(extract_hidden_fields, listing)
+            timings['parse_fields'].append(ms)
+            ms, _ = timed(lambda: BeautifulSoup(listing, 'lxml').select('#CosListTable input'))
+            timings['parse_course_table'].append(ms)
+    finally:
+        server.shutdown()
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'iterations': args.iterations,
+        'latency_ms': args.latency,
+        'viewstate_kb': args.viewstate_kb,
+        'startup_ms': startup_ms,
+        'server_requests': mock.stats['requests'],
+        'stages': {stage: percentiles(samples) for stage, samples in timings.items()},
+        # CourseBot 內部各階段的 histogram（與 metricsPath 輸出的內容相同）
+        'spans': bot.metrics.snapshot()['stages'],
+    }
+
+    print('commit {}  backend {}  {} iterations  startup {:.0f} ms'.format(
+        result['commit'], args.backend, args.iterations, startup_ms))
+    print('{:<20}{:>10}{:>10}{:>10}{:>10}{:>10}'.format('stage (ms)', 'mean', 'p50', 'p90', 'p99', 'max'))
+    for stage, stats in result['stages'].items():
+        print('{:<20}{mean:>10.2f}{p50:>10.2f}{p90:>10.2f}{p99:>10.2f}{max:>10.2f}'.format(stage, **stats))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print('results written to {}'.format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
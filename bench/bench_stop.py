@@ -0,0 +1,115 @@
+# 量測 GUI 按下「停止」到選課流程真正結束的時間：執行緒引擎 vs asyncio 引擎
+#
+# usage: python bench/bench_stop.py [-n 10] [--latency 1500] [--delay 2.5] [--model model.h5]
+#
+# 在本機模擬伺服器上持續搶一門已額滿的課程，隨機時間後按下停止。
+# 執行緒引擎只能在請求之間檢查 stop_event（time.sleep(delay) 與進行中的請求都必須等完），
+# asyncio 引擎則直接取消 task。需要安裝 flet 與 httpx。
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from threading import Thread, Event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from captcha_ocr import get_predictor
+from tools.mock_server import start_mock_server
+from yzuCourseBot_GUI import AsyncCourseBot, CourseBot
+
+# CS201B 名額為 0，會一直重試直到被停止
+COURSES = ['304,CS201B']
+
+
+def make_bot(cls, base_url, args, stop_event):
+    bot = cls('bench', 'bench', stop_event=stop_event, ocr_backend=args.backend, base_url=base_url)
+    bot.predictor = get_predictor(args.model, args.backend)
+    bot.model = bot.predictor.model
+    bot.log = lambda msg: None
+    return bot
+
+
+def stop_thread_engine(base_url, args, wait):
+    stop_event = Event()
+    bot = make_bot(CourseBot, base_url, args, stop_event)
+
+    def run():
+        if bot.login() and bot.getCourseDB(['304']):
+            bot.selectCourses(list(COURSES), args.delay)
+
+    t = Thread(target=run, daemon=True)
+    t.start()
+    time.sleep(wait)
+    start = time.perf_counter()
+    stop_event.set()
+    t.join()
+    return (time.perf_counter() - start) * 1000
+
+
+def stop_async_engine(base_url, args, wait):
+    async def trial():
+        stop_event = Event()
+        bot = make_bot(AsyncCourseBot, base_url, args, stop_event)
+
+        async def run():
+            try:
+                if await bot.login() and await bot.getCourseDB(['304']):
+                    await bot.selectCourses(list(COURSES), args.delay)
+            finally:
+                await bot.aclose()
+
+        task = asyncio.create_task(run())
+        await asyncio.sleep(wait)
+        start = time.perf_counter()
+        stop_event.set()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return (time.perf_counter() - start) * 1000
+
+    return asyncio.run(trial())
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return 'p50 {:8.1f} ms  p90 {:8.1f} ms  max {:8.1f} ms'.format(
+        samples[len(samples) // 2], samples[max(0, int(round(len(samples) * 0.9)) - 1)], samples[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stop latency of the thread and asyncio GUI engines')
+    parser.add_argument('-n', '--iterations', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=1500, help='simulated server latency per request (ms)')
+    parser.add_argument('--delay', type=float, default=2.5, help='delay between selection attempts (s)')
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--model', default=os.path.join(ROOT, 'model.h5'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server, mock, base_url = start_mock_server(latency_ms=args.latency)
+    rng = random.Random(args.seed)
+    # 登入與取得課程資料約需 5 次請求，之後才開始選課
+    waits = [5 * args.latency / 1000 + rng.uniform(0.5, 2 * args.delay) for _ in range(args.iterations)]
+
+    try:
+        results = {
+            'thread': [stop_thread_engine(base_url, args, wait) for wait in waits],
+            'asyncio': [stop_async_engine(base_url, args, wait) for wait in waits],
+        }
+    finally:
+        server.shutdown()
+
+    print('server latency {:.0f} ms, delay {} s, {} stops'.format(args.latency, args.delay, args.iterations))
+    for engine, samples in results.items():
+        print('  {:<8}: {}'.format(engine, summary(samples)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# 量測 transport.HttpSession：gzip 省下的傳輸量，以及伺服器卡住時逾時與 GET 重試的效果
+#
+# usage: python bench/bench_transport.py [--backend numpy] [--model model.h5] [--stall-every 7] [--stall-ms 3000]
+#
+# 在本機模擬伺服器上執行 login -> getCourseDB -> selectCourses，輸出每個頁面的請求數、重試、錯誤、
+# 解壓縮後與實際傳輸的位元組數與延遲。卡住的情境中模擬伺服器每 N 個請求延遲 --stall-ms 才回應，
+# 讀取逾時設為 --read-timeout：沒有逾時的 requests.Session 會在第一個卡住的請求停住 --stall-ms（真實情況可能永遠不回應）。
+# getCourseDB 期間不延遲：逾時的系所會暫停 1 秒後重新下載，會讓各情境的耗時無法比較。
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.mock_server import DEFAULT_CATALOG, start_mock_server
+from transport import HttpSession
+from yzuCourseBot import CourseBot
+
+BENCH_CATALOG = {dept: [course[:5] + (10 ** 9,) for course in courses] for dept, courses in DEFAULT_CATALOG.items()}
+BENCH_COURSES = ['304,CS201A', '304,CS352A', '304,CS354A', '901,LS239A', '312,EEB219A']
+
+
+def run(args, title, session=None, stall_every=0, **options):
+    server, mock, base_url = start_mock_server(catalog=BENCH_CATALOG, stall_every=stall_every, **options)
+    try:
+        bot = CourseBot('bench', 'bench', args.backend, args.model, cachePath=None, baseUrl=base_url)
+        bot.log = lambda msg: None
+        if session is not None:
+            session.headers['User-Agent'] = bot.session.headers['User-Agent']
+            bot.session = session
+        start = time.perf_counter()
+        bot.login()
+        mock.stall_every = 0
+        bot.getCourseDB(sorted(set(course.split(',')[0] for course in BENCH_COURSES)))
+        mock.stall_every = stall_every
+        bot.selectCourses(list(BENCH_COURSES))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    stats = bot.session.stats.snapshot()
+    print('{}: {:.2f} s, {} requests, {} retries, {} errors, {:.1f} KB received ({:.1f} KB on the wire){}'.format(
+        title, elapsed, sum(s['requests'] for s in stats.values()), sum(s['retries'] for s in stats.values()),
+        sum(s['errors'] for s in stats.values()), sum(s['bytes_in'] for s in stats.values()) / 1024,
+        sum(s['wire_bytes'] for s in stats.values()) / 1024,
+        ', {} requests stalled'.format(mock.stats['stalled']) if mock.stats['stalled'] else ''))
+    for line in bot.session.stats.summary_lines():
+        print('  ' + line)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transport layer: gzip savings and behaviour on a stalling server')
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--model', default=os.path.join(ROOT, 'model.h5'))
+    parser.add_argument('--viewstate-kb', type=int, default=40)
+    parser.add_argument('--stall-every', type=int, default=7)
+    parser.add_argument('--stall-ms', type=float, default=3000)
+    parser.add_argument('--read-timeout', type=float, default=0.5)
+    args = parser.parse_args()
+
+    run(args, 'identity', viewstate_kb=args.viewstate_kb, compress=False)
+    run(args, 'gzip', viewstate_kb=args.viewstate_kb)
+    run(args, 'stalling server, read timeout {}s'.format(args.read_timeout), HttpSession(read_timeout=args.read_timeout),
+        viewstate_kb=args.viewstate_kb, stall_every=args.stall_every, stall_ms=args.stall_ms)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# 由登入結果自動標記的驗證碼資料集（選用）
+#
+# 每張送出（或因信心不足而重抓）的驗證碼都記錄原始圖片、辨識結果、各字元信心值與登入結果：
+#   success  登入成功，辨識結果就是正確答案
+#   wrong    伺服器回應驗證碼錯誤，至少有一個字元辨識錯誤
+#   skipped  信心低於 ocrThreshold，沒有送出
+#   failed   其他登入失敗（帳號密碼、選課時程等），無法判斷辨識是否正確
+#
+# 以只會新增的 NPZ 分片儲存：每次 flush 寫出一個新的分片，既有的分片不會被改寫。
+# 圖片保留伺服器回傳的原始位元組（PNG / GIF），串接成一個 uint8 陣列並以 offsets 切分，不需要 pickle。
+# 每個分片也記錄收集時使用的模型（model_fingerprint），success 的樣本只包含該模型辨識正確的驗證碼。
+
+import os
+import time
+import glob
+import hashlib
+from threading import Lock
+
+OUTCOMES = ('success', 'wrong', 'skipped', 'failed')
+SHARD_SIZE = 256  # 記憶體中累積這麼多筆時直接寫出一個分片
+
+
+class CaptchaCorpus:
+    def __init__(self, directory, shard_size=SHARD_SIZE, model=None):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.model = model  # 辨識這些驗證碼的模型的 model_fingerprint
+        self.pending = []
+        self.lock = Lock()
+
+    def add(self, image_bytes, label, confidence, outcome):
+        import numpy as np
+
+        if outcome not in OUTCOMES:
+            raise ValueError('unknown captcha outcome: {}'.format(outcome))
+        with self.lock:
+            self.pending.append((bytes(image_bytes), label, np.asarray(confidence, dtype=np.float32), outcome,
+                                 time.time()))
+            full = len(self.pending) >= self.shard_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """將累積的紀錄寫成一個新的分片，回傳分片路徑（沒有紀錄時回傳 None）"""
+        import numpy as np
+
+        with self.lock:
+            records, self.pending = self.pending, []
+        if not records:
+            return None
+
+        images, labels, confidences, outcomes, times = zip(*records)
+        offsets = np.zeros(len(images) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(image) for image in images])
+        width = max(len(c) for c in confidences)
+        confidence = np.full((len(records), width), np.nan, dtype=np.float32)
+        for i, c in enumerate(confidences):
+            confidence[i, :len(c)] = c
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, 'captchas-{}-{}.npz'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+        while os.path.exists(path):
+            path = path[:-len('.npz')] + '_.npz'
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                images=np.frombuffer(b''.join(images), dtype=np.uint8),
+                offsets=offsets,
+                labels=np.array(labels, dtype='U{}'.format(max(max(len(label) for label in labels), 1))),
+                confidence=confidence,
+                outcomes=np.array([OUTCOMES.index(o) for o in outcomes], dtype=np.uint8),
+                times=np.array(times, dtype=np.float64),
+                model=np.array(self.model or ''),
+            )
+        os.replace(tmp_path, path)
+        return path
+
+
+def model_fingerprint(path):
+    """模型檔內容的雜湊，用來判斷兩個路徑是否為同一個模型"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def shard_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, 'captchas-*.npz')))
+
+
+def iter_records(directory, outcomes=None):
+    """依序產生 (圖片位元組, 辨識結果, 信心值, 登入結果, 時間)；outcomes 可限定登入結果"""
+    import numpy as np
+
+    for path in shard_paths(directory):
+        with np.load(path) as shard:
+            # NpzFile 每次取值都會重新解壓縮，先一次讀出
+            images, offsets, labels = shard['images'], shard['offsets'], shard['labels']
+            confidence, codes, times = shard['confidence'], shard['outcomes'], shard['times']
+        for i, label in enumerate(labels):
+            outcome = OUTCOMES[codes[i]]
+            if outcomes is not None and outcome not in outcomes:
+                continue
+            c = confidence[i]
+            yield images[offsets[i]:offsets[i + 1]].tobytes(), str(label), c[~np.isnan(c)], outcome, float(times[i])
+
+
+def corpus_models(directory):
+    """各分片記錄的模型（model_fingerprint）；舊版分片沒有記錄時為 ''"""
+    import numpy as np
+
+    models = set()
+    for path in shard_paths(directory):
+        with np.load(path) as shard:
+            models.add(str(shard['model']) if 'model' in shard.files else '')
+    return models
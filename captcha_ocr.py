@@ -0,0 +1,501 @@
+# 驗證碼辨識模型載入與純 NumPy 推論引擎
+
+import os
+import json
+import time
+from threading import Lock
+
+N_CLASSES = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# 可用的推論後端：keras 需要 TensorFlow，numpy 只需要 numpy + h5py
+BACKENDS = ('keras', 'numpy')
+
+# tools/quantize_model.py 產生的量化模型（model.int8.h5 / model.float16.h5），依序優先（較小者優先）
+QUANTIZED_MODES = ('int8', 'float16')
+
+
+def load_keras_model(path):
+    """使用 Keras 載入 model.h5（會 import TensorFlow）"""
+    # 抑制不必要的 TensorFlow 警告和日誌
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+    from keras.models import load_model
+    import tensorflow as tf
+
+    tf.get_logger().setLevel('ERROR')
+    tf.autograph.set_verbosity(0)
+
+    # 直接載入模型但不編譯
+    try:
+        model = load_model(path)
+    except ValueError as e:
+        if 'lr' in str(e):
+            # 直接載入模型但跳過編譯
+            model = load_model(path, compile=False)
+            # 手動重新編譯
+            model.compile(
+                optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+                loss='categorical_crossentropy',
+                metrics=['accuracy']
+            )
+        else:
+            raise e
+    return model
+
+
+def load_numpy_model(path):
+    """使用 h5py 讀取 model.h5 的權重，以 NumPy 執行推論（不 import TensorFlow）"""
+    return NumpyCaptchaModel.from_h5(path)
+
+
+def load_model(path, backend='keras'):
+    if backend == 'keras':
+        return load_keras_model(path)
+    if backend == 'numpy':
+        return load_numpy_model(path)
+    raise ValueError('Unknown OCR backend: {} (choose from {})'.format(backend, ', '.join(BACKENDS)))
+
+
+def quantized_path(path, mode):
+    """model.h5 -> model.int8.h5"""
+    root, ext = os.path.splitext(path)
+    return '{}.{}{}'.format(root, mode, ext)
+
+
+def read_model_eval(path):
+    """量化模型檔中記錄的評估結果（tools/quantize_model.py --eval），沒有時回傳 None"""
+    import h5py
+
+    try:
+        with h5py.File(path, 'r') as f:
+            if 'eval_char_accuracy' not in f.attrs:
+                return None
+            return {key[len('eval_'):]: float(f.attrs[key]) for key in f.attrs if key.startswith('eval_')}
+    except OSError:
+        return None
+
+
+def choose_model(path, backend='numpy', accuracy_floor=None):
+    """挑選要載入的模型，回傳 (路徑, 評估結果)
+
+    accuracy_floor 不為 None 且使用 numpy 後端時（keras 無法載入量化後的權重），
+    選擇評估過、逐字元正確率不低於 accuracy_floor 的量化模型；都不符合時使用原本的模型。
+    """
+    if accuracy_floor is None or backend != 'numpy':
+        return path, None
+    for mode in QUANTIZED_MODES:
+        candidate = quantized_path(path, mode)
+        if not os.path.exists(candidate):
+            continue
+        result = read_model_eval(candidate)
+        if result is not None and result['char_accuracy'] >= accuracy_floor:
+            return candidate, result
+    return path, None
+
+
+def decode_prediction(outputs, classes=N_CLASSES, with_confidence=False):
+    """將每個字元輸出的 softmax 一次取 argmax，組成驗證碼字串
+
+    with_confidence=True 時同時回傳每個字元的 softmax 機率（信心值）
+    """
+    import numpy as np
+
+    # outputs: [(1, n_classes), ...] -> (n_chars, n_classes)
+    probs = np.stack([output[0] for output in outputs])
+    indices = probs.argmax(axis=1)
+    text = ''.join(classes[i] for i in indices)
+    if with_confidence:
+        return text, probs[np.arange(len(indices)), indices]
+    return text
+
+
+def _compile_predict(model):
+    """建立單張圖片專用的推論函式，避免 keras Model.predict 每次呼叫都重建資料管線"""
+    if isinstance(model, NumpyCaptchaModel):
+        def predict(batch):
+            outputs = model.predict(batch)
+            return outputs if isinstance(outputs, list) else [outputs]
+        return predict
+
+    import tensorflow as tf
+
+    signature = tf.TensorSpec((1,) + tuple(model.input_shape[1:]), tf.float32)
+
+    @tf.function(input_signature=[signature])
+    def infer(batch):
+        return model(batch, training=False)
+
+    def predict(batch):
+        outputs = infer(tf.constant(batch))
+        if not isinstance(outputs, (list, tuple)):
+            outputs = [outputs]
+        return [output.numpy() for output in outputs]
+    return predict
+
+
+class CaptchaPredictor:
+    """包裝已載入的模型，提供單張驗證碼的低開銷推論"""
+
+    def __init__(self, model, backend):
+        self.model = model
+        self.backend = backend
+        self.input_shape = tuple(model.input_shape[1:])
+        self._predict = _compile_predict(model)
+
+    def __call__(self, img):
+        import numpy as np
+
+        batch = np.asarray(img, dtype=np.float32)[np.newaxis]
+        return self._predict(batch)
+
+    def warm_up(self, runs=5):
+        """先跑一次空白圖片完成 tracing / 記憶體配置，回傳 (首次, 穩定後中位數) 延遲（毫秒）"""
+        import numpy as np
+
+        img = np.zeros(self.input_shape, dtype=np.float32)
+        start = time.perf_counter()
+        self(img)
+        first = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            self(img)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return first, sorted(latencies)[len(latencies) // 2]
+
+
+_predictors = {}
+_predictors_lock = Lock()
+
+
+def get_predictor(path, backend='keras'):
+    """取得（必要時載入）模型，同一個 model / backend 在整個程式中只載入一次"""
+    key = (os.path.abspath(path), backend)
+    with _predictors_lock:
+        if key not in _predictors:
+            _predictors[key] = CaptchaPredictor(load_model(path, backend), backend)
+        return _predictors[key]
+
+
+def decode_captcha(data):
+    """直接從 HTTP 回應的位元組解碼驗證碼，並正規化成 float32（不經過暫存檔）"""
+    import numpy as np
+    import cv2
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError('Unable to decode captcha image ({} bytes)'.format(len(data)))
+    # 一次完成 uint8 -> float32 的轉換與縮放，不產生 float64 的中間陣列
+    return np.multiply(img, np.float32(1.0 / 255.0), dtype=np.float32)
+
+
+# ===== 純 NumPy 推論 =====
+
+def _activation(name):
+    import numpy as np
+
+    if name in (None, 'linear'):
+        return lambda x: x
+    if name == 'relu':
+        return lambda x: np.maximum(x, 0)
+    if name == 'sigmoid':
+        return lambda x: 1.0 / (1.0 + np.exp(-x))
+    if name == 'tanh':
+        return np.tanh
+    if name == 'softmax':
+        def softmax(x):
+            e = np.exp(x - x.max(axis=-1, keepdims=True))
+            return e / e.sum(axis=-1, keepdims=True)
+        return softmax
+    raise NotImplementedError('Unsupported activation: {}'.format(name))
+
+
+def _same_padding(size, kernel, stride):
+    out = -(-size // stride)
+    total = max((out - 1) * stride + kernel - size, 0)
+    return total // 2, total - total // 2
+
+
+def _windows(x, kernel, strides, padding):
+    """將 NHWC 張量切成 (N, H', W', C, kh, kw) 的滑動視窗（不複製資料）"""
+    import numpy as np
+
+    kh, kw = kernel
+    sh, sw = strides
+    if padding == 'same':
+        ph = _same_padding(x.shape[1], kh, sh)
+        pw = _same_padding(x.shape[2], kw, sw)
+        if any(ph) or any(pw):
+            x = np.pad(x, ((0, 0), ph, pw, (0, 0)))
+    elif padding != 'valid':
+        raise NotImplementedError('Unsupported padding: {}'.format(padding))
+
+    win = np.lib.stride_tricks.sliding_window_view(x, (kh, kw), axis=(1, 2))
+    return win[:, ::sh, ::sw]
+
+
+class _Layer:
+    def __init__(self, name, config, weights):
+        self.name = name
+        self.config = config
+
+    def __call__(self, x):
+        return x
+
+
+class _Conv2D(_Layer):
+    def __init__(self, name, config, weights):
+        super().__init__(name, config, weights)
+        if tuple(config.get('dilation_rate', (1, 1))) != (1, 1):
+            raise NotImplementedError('{}: dilated convolution is not supported'.format(name))
+        if config.get('data_format', 'channels_last') != 'channels_last':
+            raise NotImplementedError('{}: only channels_last is supported'.format(name))
+        kernel = weights['kernel']  # (kh, kw, in, out)
+        # 量化模型：int8 權重乘上逐輸出通道的 scale（float16 則沒有 scale）
+        self.kernel_scale = weights.get('kernel_scale')
+        self.kernel_size = kernel.shape[:2]
+        self.strides = tuple(config.get('strides', (1, 1)))
+        self.padding = config.get('padding', 'valid')
+        # 預先轉成與滑動視窗 (C, kh, kw) 相同的排列，推論時只剩一次矩陣乘法
+        self.kernel = kernel.transpose(2, 0, 1, 3).reshape(-1, kernel.shape[3])
+        self.bias = weights.get('bias')
+        self.activation = _activation(config.get('activation'))
+
+    def __call__(self, x):
+        win = _windows(x, self.kernel_size, self.strides, self.padding)
+        n, h, w = win.shape[:3]
+        y = win.reshape(n * h * w, -1) @ self.kernel
+        if self.kernel_scale is not None:
+            y *= self.kernel_scale
+        if self.bias is not None:
+            y += self.bias
+        return self.activation(y.reshape(n, h, w, -1))
+
+
+class _Pooling2D(_Layer):
+    reduce = None
+
+    def __init__(self, name, config, weights):
+        super().__init__(name, config, weights)
+        self.pool_size = tuple(config.get('pool_size', (2, 2)))
+        self.strides = tuple(config.get('strides') or self.pool_size)
+        self.padding = config.get('padding', 'valid')
+
+    def __call__(self, x):
+        ph, pw = self.pool_size
+        if self.padding == 'valid' and self.strides == self.pool_size:
+            # 最常見的情況：不重疊的池化直接 reshape
+            n, h, w, c = x.shape
+            x = x[:, :h // ph * ph, :w // pw * pw]
+            x = x.reshape(n, h // ph, ph, w // pw, pw, c)
+            return self.reduce(x, axis=(2, 4))
+        if self.padding == 'same':
+            raise NotImplementedError('{}: same padding is not supported for pooling'.format(self.name))
+        win = _windows(x, self.pool_size, self.strides, 'valid')
+        return self.reduce(win, axis=(4, 5))
+
+
+class _MaxPooling2D(_Pooling2D):
+    @staticmethod
+    def reduce(x, axis):
+        return x.max(axis=axis)
+
+
+class _AveragePooling2D(_Pooling2D):
+    @staticmethod
+    def reduce(x, axis):
+        return x.mean(axis=axis)
+
+
+class _BatchNormalization(_Layer):
+    def __init__(self, name, config, weights):
+        super().__init__(name, config, weights)
+        import numpy as np
+
+        mean = weights['moving_mean']
+        var = weights['moving_variance']
+        gamma = weights.get('gamma', np.ones_like(mean))
+        beta = weights.get('beta', np.zeros_like(mean))
+        # 推論時 BN 等同於逐通道的 scale + shift
+        self.scale = (gamma / np.sqrt(var + config.get('epsilon', 1e-3))).astype(np.float32)
+        self.shift = (beta - mean * self.scale).astype(np.float32)
+
+    def __call__(self, x):
+        return x * self.scale + self.shift
+
+
+class _Flatten(_Layer):
+    def __call__(self, x):
+        return x.reshape(x.shape[0], -1)
+
+
+class _Dense(_Layer):
+    def __init__(self, name, config, weights):
+        super().__init__(name, config, weights)
+        self.kernel = weights['kernel']
+        self.kernel_scale = weights.get('kernel_scale')
+        self.bias = weights.get('bias')
+        self.activation = _activation(config.get('activation'))
+
+    def __call__(self, x):
+        y = x @ self.kernel
+        if self.kernel_scale is not None:
+            y *= self.kernel_scale
+        if self.bias is not None:
+            y += self.bias
+        return self.activation(y)
+
+
+class _Activation(_Layer):
+    def __init__(self, name, config, weights):
+        super().__init__(name, config, weights)
+        self.activation = _activation(config.get('activation'))
+
+    def __call__(self, x):
+        return self.activation(x)
+
+
+class _ReLU(_Layer):
+    def __call__(self, x):
+        import numpy as np
+        return np.maximum(x, 0)
+
+
+_LAYERS = {
+    'InputLayer': _Layer,
+    'Dropout': _Layer,
+    'SpatialDropout2D': _Layer,
+    'GaussianNoise': _Layer,
+    'Conv2D': _Conv2D,
+    'MaxPooling2D': _MaxPooling2D,
+    'AveragePooling2D': _AveragePooling2D,
+    'BatchNormalization': _BatchNormalization,
+    'Flatten': _Flatten,
+    'Dense': _Dense,
+    'Activation': _Activation,
+    'ReLU': _ReLU,
+}
+
+
+def _decode_attr(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _inbound_names(layer):
+    """取得 functional model 中某一層的輸入層名稱（支援 Keras 2 與 Keras 3 的格式）"""
+    nodes = layer.get('inbound_nodes') or []
+    names = []
+    for node in nodes:
+        if isinstance(node, dict):
+            # Keras 3: {'args': [{'class_name': '__keras_tensor__', 'config': {'keras_history': [...]}}], ...}
+            stack = list(node.get('args', []))
+            while stack:
+                item = stack.pop(0)
+                if isinstance(item, (list, tuple)):
+                    stack[0:0] = item
+                elif isinstance(item, dict) and 'keras_history' in item.get('config', {}):
+                    names.append(item['config']['keras_history'][0])
+        else:
+            # Keras 2: [[name, node_index, tensor_index, kwargs], ...]
+            names.extend(inbound[0] for inbound in node)
+    return names
+
+
+def _tensor_names(specs):
+    # input_layers / output_layers 可能是 [name, 0, 0] 或 [[name, 0, 0], ...]
+    if specs and isinstance(specs[0], str):
+        specs = [specs]
+    return [spec[0] for spec in specs]
+
+
+class NumpyCaptchaModel:
+    """以 NumPy 重現 Keras model.h5 的前向傳播，介面與 keras Model.predict 相同"""
+
+    def __init__(self, layers, inputs, outputs, input_shape=None):
+        # layers: [(name, layer, [inbound names])]，已依拓撲順序排列
+        self.layers = layers
+        self.inputs = inputs
+        self.outputs = outputs
+        # 與 keras 相同，包含 batch 維度，例如 (None, 60, 200, 3)
+        self.input_shape = input_shape
+
+    @classmethod
+    def from_h5(cls, path):
+        import h5py
+        import numpy as np
+
+        with h5py.File(path, 'r') as f:
+            model_config = json.loads(_decode_attr(f.attrs['model_config']))
+            group = f['model_weights'] if 'model_weights' in f else f
+            weights = {}
+            for layer_name in group.attrs.get('layer_names', []):
+                layer_name = _decode_attr(layer_name)
+                layer_group = group[layer_name]
+                layer_weights = {}
+                for weight_name in layer_group.attrs.get('weight_names', []):
+                    weight_name = _decode_attr(weight_name)
+                    # e.g. 'conv2d_1/kernel:0' -> 'kernel'
+                    short = weight_name.split('/')[-1].split(':')[0]
+                    dataset = layer_group[weight_name]
+                    if dataset.dtype in (np.int8, np.float16):
+                        # 量化過的權重保持原本的型別，推論時矩陣乘法再轉成 float32
+                        layer_weights[short] = dataset[()]
+                        if 'scale' in dataset.attrs:
+                            layer_weights[short + '_scale'] = np.asarray(dataset.attrs['scale'], dtype=np.float32)
+                    else:
+                        layer_weights[short] = dataset[()].astype('float32')
+                weights[layer_name] = layer_weights
+        return cls.from_config(model_config, weights)
+
+    @classmethod
+    def from_config(cls, model_config, weights):
+        config = model_config['config']
+        layer_configs = config['layers'] if isinstance(config, dict) else config
+
+        layers = []
+        previous = None
+        for layer in layer_configs:
+            class_name = layer['class_name']
+            layer_config = layer['config']
+            name = layer_config.get('name') or layer.get('name')
+            if class_name not in _LAYERS:
+                raise NotImplementedError('Unsupported layer type for numpy backend: {} ({})'.format(class_name, name))
+            if model_config['class_name'] == 'Sequential':
+                inbound = [previous] if previous else []
+            else:
+                inbound = _inbound_names(layer)
+            layers.append((name, _LAYERS[class_name](name, layer_config, weights.get(name, {})), inbound))
+            previous = name
+
+        first = layer_configs[0]['config']
+        input_shape = first.get('batch_input_shape') or first.get('batch_shape')
+        input_shape = tuple(input_shape) if input_shape else None
+
+        if model_config['class_name'] == 'Sequential':
+            return cls(layers, [layers[0][0]], [previous], input_shape)
+        return cls(layers, _tensor_names(config['input_layers']), _tensor_names(config['output_layers']), input_shape)
+
+    @property
+    def weight_bytes(self):
+        """常駐記憶體中所有權重的大小"""
+        import numpy as np
+
+        return sum(value.nbytes for _, layer, _ in self.layers for value in vars(layer).values()
+                   if isinstance(value, np.ndarray))
+
+    def predict(self, x, verbose=0):
+        import numpy as np
+
+        tensors = {}
+        x = np.asarray(x, dtype=np.float32)
+        for name, layer, inbound in self.layers:
+            if not inbound:
+                tensors[name] = layer(x)
+            else:
+                tensors[name] = layer(tensors[inbound[0]])
+
+        outputs = [tensors[name] for name in self.outputs]
+        # 與 Keras 相同：單一輸出回傳 array，多輸出回傳 list
+        return outputs[0] if len(outputs) == 1 else outputs
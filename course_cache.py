@@ -0,0 +1,80 @@
+# 課程資料（coursesDB 與各系所的 postback payload）的本機快取
+
+import os
+import json
+import time
+
+DEFAULT_TTL = 6 * 60 * 60  # 6 小時
+
+
+def current_semester(now=None):
+    """以民國學年度推算選課的學期，例如 2025/09 -> '114-1'，2026/03 -> '114-2'
+
+    6、7 月的選課是下一學年度第一學期的初選，所以 2026/06 -> '115-1'，而不是已經結束的 '114-2'。
+    """
+    now = time.localtime(now)
+    year = now.tm_year - 1911
+    if now.tm_mon >= 6:
+        return '{}-1'.format(year)
+    if now.tm_mon == 1:
+        return '{}-1'.format(year - 1)
+    return '{}-2'.format(year - 1)
+
+
+class CourseCache:
+    """以 (學期, 系所) 為 key，將解析好的課程清單存成 JSON，重新啟動時不必再下載 CosList.aspx"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.load()
+
+    @staticmethod
+    def _key(dept, semester):
+        return '{}/{}'.format(semester, dept)
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f).get('entries', {})
+        except (OSError, ValueError):
+            # 沒有快取或快取損毀時當作空的
+            self.entries = {}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, dept, semester):
+        """取得未過期的快取資料，沒有或已過期時回傳 None"""
+        entry = self.entries.get(self._key(dept, semester))
+        if entry is None or time.time() - entry['savedAt'] > self.ttl:
+            return None
+        return entry
+
+    def semester_entries(self, semester, fresh=False):
+        """某學期所有系所的快取資料，回傳 {系所: entry}；fresh=True 時只包含未過期的"""
+        prefix = self._key('', semester)
+        now = time.time()
+        return {key[len(prefix):]: entry for key, entry in self.entries.items()
+                if key.startswith(prefix) and not (fresh and now - entry['savedAt'] > self.ttl)}
+
+    def put(self, dept, semester, selectPayLoad, courses):
+        self.entries[self._key(dept, semester)] = {
+            'savedAt': time.time(),
+            'selectPayLoad': selectPayLoad,
+            'courses': courses,
+        }
+
+    def invalidate(self, dept, semester):
+        """刪除某系所的快取，回傳被刪除的資料（沒有則為 None）"""
+        entry = self.entries.pop(self._key(dept, semester), None)
+        if entry is not None:
+            self.save()
+        return entry
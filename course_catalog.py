@@ -0,0 +1,264 @@
+# 課程資料：將 CosList.aspx 課程按鈕的 name 屬性解析成精簡的紀錄，並建立查詢用的索引
+#
+# name 格式：SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 電腦與網路安全概論
+#           ^0     ^1    ^2 ^3 ^4 ^5 ^6 ^7     ^8   ^9 ^10（學分 + 課名）
+
+import sys
+from bisect import bisect_left
+
+
+class CourseRecord:
+    """一門課（一個班級）
+
+    字串欄位都經過 intern，而按鈕的 name 屬性可以由各欄位組回來，不另外保存，
+    全系所的課程清單也只佔很少記憶體。
+    """
+
+    __slots__ = ('dept', 'code', 'cls', 'year', 'term', 'credits', 'required', 'language', 'name', '_raw')
+
+    def __init__(self, dept, code, cls, year, term, credits, required, language, name, raw=None):
+        self.dept = dept
+        self.code = code          # CS354
+        self.cls = cls            # A
+        self.year = year          # 開課年級
+        self.term = term
+        self.credits = credits
+        self.required = required
+        self.language = language
+        self.name = name          # 電腦與網路安全概論
+        self._raw = raw           # 無法由欄位組回原字串時才保存原始的 name 屬性
+
+    @classmethod
+    def from_mUrl(cls, mUrl, dept=None):
+        """解析按鈕的 name 屬性；至少要有課號與班別，否則丟出 ValueError"""
+        tokens = mUrl.split(',', 10)
+        if len(tokens) < 3 or not tokens[1] or not tokens[2]:
+            raise ValueError('unexpected course button name: {!r}'.format(mUrl))
+        intern = sys.intern
+        if len(tokens) != 11 or tokens[0] != 'SelCos':
+            # 格式與預期不同：只取選課用得到的課號、班別與課名（最後一個欄位中空白之後），保留原始的 name 屬性
+            return cls(intern(dept) if dept else dept, intern(tokens[1]), intern(tokens[2]),
+                       None, None, None, False, None, mUrl.rpartition(',')[2].partition(' ')[2], raw=mUrl)
+        credits, _, name = tokens[10].partition(' ')
+        record = cls(
+            intern(dept) if dept else dept,
+            intern(tokens[1]),
+            intern(tokens[2]),
+            intern(tokens[3]),
+            intern(tokens[4]),
+            int(tokens[5]) if tokens[5].isdigit() else intern(tokens[5]),
+            tokens[6] == 'Y',
+            intern(tokens[7]),
+            name,
+        )
+        if record.mUrl != mUrl:
+            record._raw = mUrl
+        return record
+
+    @property
+    def mUrl(self):
+        """課程按鈕的 name 屬性，送出選課時使用"""
+        if self._raw is not None:
+            return self._raw
+        return '{} {}'.format(self.button, self.name)
+
+    @property
+    def key(self):
+        """coursesList 中使用的課程代碼：課號 + 班別，例如 CS354A"""
+        return self.code + self.cls
+
+    @property
+    def button(self):
+        """課程按鈕 name 屬性在課名之前的部分，用來確認列表頁上仍有這門課"""
+        if self._raw is not None:
+            return self._raw.partition(' ')[0]
+        return 'SelCos,{0},{1},{2},{3},{4},{5},{6},{0},{1},{4}'.format(
+            self.code, self.cls, self.year, self.term, self.credits, 'Y' if self.required else 'N', self.language)
+
+    @property
+    def title(self):
+        return '{} {}'.format(self.key, self.name)
+
+    def __repr__(self):
+        return 'CourseRecord({!r}, {!r})'.format(self.mUrl, self.dept)
+
+
+def records_from_cache(courses, dept):
+    """快取中的課程（key -> mUrl；舊格式為 key -> {'name', 'mUrl'}）轉成 CourseRecord"""
+    return {key: CourseRecord.from_mUrl(value['mUrl'] if isinstance(value, dict) else value, dept)
+            for key, value in courses.items()}
+
+
+class CourseCatalog:
+    """以課程代碼（CS354A）為 key 的課程表，另外以課號、系所與課名前綴建立索引
+
+    介面與原本的 coursesDB dict 相同（in / [] / get / pop / update），查詢時不必再切字串。
+    """
+
+    def __init__(self, records=None):
+        self.records = {}
+        self.by_code = {}
+        self.by_dept = {}
+        self._names = None  # (課名, key) 排序後的清單，需要時才重建
+        if records:
+            self.update(records)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get(self, key, default=None):
+        return self.records.get(key, default)
+
+    def keys(self):
+        return self.records.keys()
+
+    def values(self):
+        return self.records.values()
+
+    def items(self):
+        return self.records.items()
+
+    def add(self, record):
+        key = record.key
+        if key in self.records:
+            self.pop(key)
+        self.records[key] = record
+        self.by_code.setdefault(record.code, []).append(record)
+        self.by_dept.setdefault(record.dept, {})[key] = record
+        self._names = None
+
+    def update(self, records):
+        """接受 {key: CourseRecord} 或 CourseRecord 的 iterable"""
+        for record in (records.values() if isinstance(records, dict) else records):
+            self.add(record)
+
+    def clear(self):
+        self.records.clear()
+        self.by_code.clear()
+        self.by_dept.clear()
+        self._names = None
+
+    def pop(self, key, default=None):
+        record = self.records.pop(key, None)
+        if record is None:
+            return default
+        self.by_code[record.code].remove(record)
+        self.by_dept[record.dept].pop(key, None)
+        self._names = None
+        return record
+
+    def classes(self, code):
+        """同一課號的所有班級"""
+        return list(self.by_code.get(code, ()))
+
+    def in_dept(self, dept):
+        return list(self.by_dept.get(dept, {}).values())
+
+    def search_name(self, prefix, limit=None):
+        """課名以 prefix 開頭的課程（不分大小寫）"""
+        if self._names is None:
+            self._names = sorted((record.name.casefold(), key) for key, record in self.records.items())
+        prefix = prefix.casefold()
+        result = []
+        for i in range(bisect_left(self._names, (prefix, '')), len(self._names)):
+            name, key = self._names[i]
+            if not name.startswith(prefix) or (limit is not None and len(result) >= limit):
+                break
+            result.append(self.records[key])
+        return result
+
+
+def catalog_from_cache(cache, semester):
+    """由課程快取中未過期的系所建立某學期的 CourseCatalog（過期的系所可能少了之後才開的班級）"""
+    catalog = CourseCatalog()
+    for dept, entry in cache.semester_entries(semester, fresh=True).items():
+        catalog.update(records_from_cache(entry['courses'], dept))
+    return catalog
+
+
+class CourseTrie:
+    """課程代碼（CS354A）與課名的前綴樹，用於逐字輸入時的自動完成
+
+    每個節點是 {字元: 子節點} 的 dict，'' 存放在該處結束的課程。
+    連續輸入時，新的前綴若是上一次的延伸，就從上一次停下的節點繼續往下走。
+    """
+
+    def __init__(self, catalog=None):
+        self.root = {}
+        self._last = ('', self.root)
+        if catalog is not None:
+            for record in catalog.values():
+                self.add(record)
+
+    def add(self, record):
+        for text in (record.key, record.name):
+            node = self.root
+            for ch in text.casefold():
+                node = node.setdefault(ch, {})
+            node.setdefault('', []).append(record)
+        self._last = ('', self.root)
+
+    def _find(self, prefix):
+        start, node = self._last
+        if not prefix.startswith(start):
+            start, node = '', self.root
+        for ch in prefix[len(start):]:
+            if node is None:
+                break
+            node = node.get(ch)
+        self._last = (prefix, node)
+        return node
+
+    def search(self, prefix, limit=None, dept=None):
+        """以 prefix 開頭的課程（依課程代碼 / 課名排序，不分大小寫），dept 不為 None 時只找該系所"""
+        node = self._find(prefix.casefold())
+        result = []
+        seen = set()
+        stack = [node] if node is not None else []
+        while stack and (limit is None or len(result) < limit):
+            node = stack.pop()
+            for record in node.get('', ()):
+                if (dept is None or record.dept == dept) and id(record) not in seen:
+                    seen.add(id(record))
+                    result.append(record)
+            stack.extend(child for ch, child in sorted(node.items(), reverse=True) if ch)
+        return result if limit is None else result[:limit]
+
+
+def check_course_lines(lines, catalog):
+    """檢查課程清單（'部門代碼,課程代碼[,優先順序]'），回傳 [(行號, 錯誤訊息)]
+
+    catalog 中沒有某系所的資料時，該系所的課程只檢查格式。
+    """
+    errors = []
+    seen = set()
+    for lineno, line in enumerate(lines, 1):
+        tokens = [token.strip() for token in line.split(',')]
+        if len(tokens) not in (2, 3) or not tokens[0] or not tokens[1]:
+            errors.append((lineno, '格式應為 部門代碼,課程代碼[,優先順序]'))
+            continue
+        if len(tokens) == 3 and tokens[2]:
+            try:
+                int(tokens[2])
+            except ValueError:
+                errors.append((lineno, '優先順序必須是整數'))
+                continue
+        dept, key = tokens[0], tokens[1]
+        record = catalog.get(key)
+        if record is not None and record.dept != dept:
+            errors.append((lineno, '{} 屬於系所 {}，不是 {}'.format(key, record.dept, dept)))
+        elif record is None and catalog.by_dept.get(dept):
+            errors.append((lineno, '系所 {} 沒有 {} 這門課'.format(dept, key)))
+        elif key in seen:
+            errors.append((lineno, '{} 重複'.format(key)))
+        seen.add(key)
+    return errors
@@ -0,0 +1,137 @@
+# 各階段（下載驗證碼、OCR、登入 POST、系所 POST、選課 GET…）的耗時統計
+#
+# 以固定 bucket 的 histogram 累計，可輸出成 JSON 快照，或 Prometheus textfile
+# （node_exporter --collector.textfile.directory 指向輸出目錄即可抓取）。
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+METRIC_NAME = 'yzucoursebot_stage_duration_seconds'
+
+# CLI 與 GUI 版本共用的 stage 名稱
+STAGES = (
+    'captcha_download',  # GET SelRandomImage.aspx
+    'captcha_ocr',       # decode + predict
+    'login_page',        # GET Index.aspx
+    'login_post',        # POST Index.aspx
+    'catalog_page',      # GET CosList.aspx
+    'dept_post',         # POST CosList.aspx (department listing)
+    'catalog_parse',     # parse the course table
+    'click_post',        # POST CosList.aspx (simulated button click)
+    'select_get',        # GET CurrMainTrans.aspx
+)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class StageHistogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # 非累積，輸出時才累加
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def cumulative(self):
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """以 bucket 上界估計分位數（與 Prometheus histogram_quantile 相同精度）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return self.max
+
+
+class StageMetrics:
+    """以 span(stage) 量測各階段耗時，thread-safe（GUI 版本在背景執行緒中記錄）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = StageHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self.lock:
+            stages = {}
+            for stage, h in self.histograms.items():
+                stages[stage] = {
+                    'count': h.count,
+                    'sum': h.sum,
+                    'mean': h.sum / h.count,
+                    'min': h.min,
+                    'max': h.max,
+                    'p50': h.quantile(0.5),
+                    'p90': h.quantile(0.9),
+                    'p99': h.quantile(0.99),
+                    'buckets': {str(bound): total for bound, total in h.cumulative()},
+                }
+        return {'metric': METRIC_NAME, 'started': self.started, 'timestamp': time.time(), 'stages': stages}
+
+    def prometheus_text(self):
+        lines = [
+            '# HELP {} Time spent in each CourseBot stage.'.format(METRIC_NAME),
+            '# TYPE {} histogram'.format(METRIC_NAME),
+        ]
+        with self.lock:
+            for stage in sorted(self.histograms):
+                h = self.histograms[stage]
+                for bound, total in h.cumulative():
+                    lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(METRIC_NAME, stage, bound, total))
+                lines.append('{}_bucket{{stage="{}",le="+Inf"}} {}'.format(METRIC_NAME, stage, h.count))
+                lines.append('{}_sum{{stage="{}"}} {}'.format(METRIC_NAME, stage, repr(h.sum)))
+                lines.append('{}_count{{stage="{}"}} {}'.format(METRIC_NAME, stage, h.count))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """寫出 path + '.json' 與 path + '.prom'（先寫暫存檔再取代，exporter 不會讀到一半的檔案）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _write_atomic(path + '.json', json.dumps(self.snapshot(), indent=2))
+        _write_atomic(path + '.prom', self.prometheus_text())
+
+
+def _write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
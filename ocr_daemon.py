@@ -0,0 +1,173 @@
+# 常駐的驗證碼辨識程序（選用）：模型只載入一次，透過 Unix socket 提供辨識
+#
+# usage: python ocr_daemon.py [--model model.h5] [--backend numpy|keras] [--accuracy-floor 0.98] [--socket PATH]
+#
+# 每次執行 yzuCourseBot.py 都要 import TensorFlow、載入 model.h5 並 warm up。daemon 執行中時，
+# CourseBot 連得上 socket 且 daemon 載入的是同一個模型，就略過這些步驟，驗證碼改由 daemon 辨識；
+# 連不上、模型不同或辨識途中斷線時，CourseBot 改回在自己的程序中載入模型。
+# Windows 的 Python 沒有 AF_UNIX，一律在程序內辨識。
+#
+# 協定：每則訊息為 4 bytes big-endian 長度 + 內容
+#   請求：驗證碼圖片的原始位元組；長度 0 表示查詢 daemon 資訊
+#   回應：JSON，辨識結果 {"text", "confidence"}、資訊 {"model", "backend", "load_ms", "pid"}，失敗時 {"error"}
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import tempfile
+import argparse
+import socketserver
+from threading import Lock
+
+from captcha_ocr import BACKENDS, choose_model, decode_captcha, decode_prediction, get_predictor
+
+DEFAULT_SOCKET = os.environ.get('YZU_OCR_SOCKET', os.path.join(tempfile.gettempdir(), 'yzuCourseBot-ocr.sock'))
+HEADER = struct.Struct('>I')
+MAX_MESSAGE = 1 << 20  # 驗證碼圖片只有幾 KB，超過代表不是這個協定
+
+
+def send_message(sock, payload):
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError('OCR daemon connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    size, = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if size > MAX_MESSAGE:
+        raise ConnectionError('OCR message too large: {} bytes'.format(size))
+    return _recv_exact(sock, size)
+
+
+class OcrClient:
+    """CourseBot 端的連線，一次執行只建立一條連線"""
+
+    def __init__(self, sock, path):
+        self.sock = sock
+        self.path = path
+        self.info = {}
+
+    @classmethod
+    def connect(cls, path=DEFAULT_SOCKET, timeout=2.0):
+        """連上 daemon 並取得它載入的模型，沒有 daemon 時回傳 None"""
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+            return None
+        # 暫存資料夾是共用的：不信任其他使用者建立的 socket，否則對方可以回傳任意的驗證碼
+        if hasattr(os, 'getuid') and os.stat(path).st_uid != os.getuid():
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        client = cls(sock, path)
+        try:
+            sock.connect(path)
+            client.info = client._request(b'')
+        except (OSError, ValueError):
+            sock.close()
+            return None
+        return client
+
+    def _request(self, payload):
+        send_message(self.sock, payload)
+        reply = json.loads(recv_message(self.sock))
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return reply
+
+    def serves(self, model_path, backend):
+        return self.info.get('model') == os.path.abspath(model_path) and self.info.get('backend') == backend
+
+    def ocr(self, data):
+        """回傳 (驗證碼字串, 各字元信心值)，與 CourseBot.captchaOCR 相同；連線問題時丟出 OSError，daemon 回報錯誤時丟出 ValueError"""
+        import numpy as np
+
+        reply = self._request(bytes(data))
+        return reply['text'], np.array(reply['confidence'], dtype=np.float32)
+
+    def close(self):
+        self.sock.close()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                data = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            if not data:
+                reply = server.info
+            else:
+                try:
+                    img = decode_captcha(data)
+                    with server.lock:
+                        text, confidence = decode_prediction(server.predictor(img), with_confidence=True)
+                    reply = {'text': text, 'confidence': confidence.tolist()}
+                except Exception as e:
+                    reply = {'error': '{}: {}'.format(type(e).__name__, e)}
+            send_message(self.request, json.dumps(reply).encode())
+
+
+class OcrServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, model_path, backend, accuracy_floor=None):
+        start = time.perf_counter()
+        model_path, _ = choose_model(model_path, backend, accuracy_floor)
+        self.predictor = get_predictor(model_path, backend)
+        self.predictor.warm_up()
+        self.lock = Lock()
+        # CourseBot 每次啟動省下的時間：import、載入模型與 warm up
+        self.info = {'model': os.path.abspath(model_path), 'backend': backend,
+                     'load_ms': (time.perf_counter() - start) * 1000, 'pid': os.getpid()}
+
+        if os.path.exists(path):
+            if OcrClient.connect(path) is not None:
+                raise RuntimeError('An OCR daemon is already listening on {}'.format(path))
+            os.unlink(path)  # 上次沒有正常結束留下的 socket
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the captcha model loaded and serve OCR over a Unix socket')
+    parser.add_argument('--model', default='model.h5')
+    parser.add_argument('--backend', choices=BACKENDS, default='numpy', help='as ocrBackend (same default)')
+    parser.add_argument('--accuracy-floor', type=float, default=None, help='as ocrAccuracyFloor')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    args = parser.parse_args()
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print('Unix sockets are not available on this platform')
+        return 1
+    server = OcrServer(args.socket, args.model, args.backend, args.accuracy_floor)
+    print('OCR daemon ({}, {}) loaded in {:.0f} ms, listening on {}'.format(
+        server.info['model'], args.backend, server.info['load_ms'], args.socket))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
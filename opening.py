@@ -0,0 +1,90 @@
+# 選課系統開放時間：以伺服器回應的 Date header 估計時鐘差，開放前休眠，
+# 接近開放時才取得並辨識驗證碼，之後以有上限的退避間隔輪詢登入頁。
+
+import time
+import statistics
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+DEFAULT_LEAD = 15.0   # 開放前幾秒開始準備（下載並辨識驗證碼）
+POLL_MIN = 0.25       # 尚未開放時的輪詢間隔（秒），每次乘上 POLL_GROWTH，最多 POLL_MAX
+POLL_MAX = 5.0
+POLL_GROWTH = 1.5
+MAX_SLEEP = 600.0     # 長時間等待時每隔一段時間重新校正時鐘差
+
+
+def parse_open_time(value):
+    """'2026-02-10 09:00'、'2026-02-10 09:00:00'（本機時區）或 epoch 秒"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return time.mktime(time.strptime(value.strip(), fmt))
+        except ValueError:
+            pass
+    raise ValueError('invalid opening time {!r}, expected YYYY-MM-DD HH:MM[:SS]'.format(value))
+
+
+class ServerClock:
+    """由回應的 Date header 估計 伺服器時間 - 本機時間
+
+    Date 只精確到秒，取回應時間的中點並對多個樣本取中位數。
+    """
+
+    def __init__(self, samples=15):
+        self.samples = deque(maxlen=samples)
+
+    def observe(self, response):
+        date = response.headers.get('Date')
+        if not date:
+            return
+        try:
+            server_time = parsedate_to_datetime(date).timestamp()
+        except (TypeError, ValueError):
+            return
+        elapsed = response.elapsed.total_seconds() if response.elapsed else 0.0
+        # Date 會被截到整秒，+0.5 取該秒的中間
+        self.samples.append(server_time + 0.5 - (time.time() - elapsed / 2))
+
+    @property
+    def offset(self):
+        return statistics.median(self.samples) if self.samples else 0.0
+
+    def now(self):
+        return time.time() + self.offset
+
+
+class OpeningWindow:
+    """決定開放前要休眠多久，以及尚未開放時下一次輪詢的間隔"""
+
+    def __init__(self, open_at=None, clock=None, lead=DEFAULT_LEAD):
+        self.open_at = parse_open_time(open_at)
+        self.clock = clock or ServerClock()
+        self.lead = lead
+        self.polls = 0
+
+    def until_open(self):
+        if self.open_at is None:
+            return None
+        return self.open_at - self.clock.now()
+
+    def sleep_before(self):
+        """距離「開放前 lead 秒」還有多久（不需等待時為 0），每次最多 MAX_SLEEP 秒以便重新校正"""
+        remaining = self.until_open()
+        if remaining is None:
+            return 0.0
+        return min(max(remaining - self.lead, 0.0), MAX_SLEEP)
+
+    def next_poll(self):
+        """登入頁顯示尚未開放時，下一次輪詢前要等待的秒數"""
+        remaining = self.until_open()
+        if remaining is not None and remaining > POLL_MIN:
+            # 還沒到設定的時間：直接等到開放的那一刻
+            return remaining
+        self.polls += 1
+        return min(POLL_MAX, POLL_MIN * POLL_GROWTH ** (self.polls - 1))
+
+    def opened(self):
+        self.polls = 0
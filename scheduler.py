@@ -0,0 +1,142 @@
+# 選課嘗試的排程：每門課的優先順序與退避時間，以及每分鐘的請求上限
+#
+# 課程格式為 'deptId,courseId+classId[,priority]'，priority 為整數，數字越大越優先（預設 0）。
+
+import time
+import threading
+from collections import deque
+
+# 依上一次的結果決定下一次嘗試前的等待：(delay 的倍數, 連續失敗時每次再乘上的倍數)
+BACKOFF = {
+    'full': (1.0, 1.0),     # 額滿：名額隨時可能釋出，固定每 delay 秒再試一次，不退避
+    'unknown': (2.0, 2.0),  # 無法分類的訊息：指數退避
+}
+DEFAULT_MAX_BACKOFF = 60.0
+# delay 小於此值（例如 0）時，退避以此為基準，避免失敗後毫無間隔地重試
+MIN_BACKOFF_BASE = 0.5
+# 移出排程、不再嘗試的結果（'error' 為課程代碼不存在）
+DROPPED = ('success', 'error', 'conflict', 'ineligible')
+
+
+class RequestBudget:
+    """任意 window 秒內最多送出 per_minute 個請求（滑動視窗，硬上限）；per_minute=None 表示不限制"""
+
+    def __init__(self, per_minute=None, window=60.0, clock=time.monotonic):
+        self.per_minute = per_minute
+        self.window = window
+        self.clock = clock
+        self.sent = deque()
+        # 登入頁在背景執行緒下載，檢查與扣除額度必須一起完成
+        self.lock = threading.Lock()
+
+    def delay(self, cost=1):
+        """還要等多久才能再送出 cost 個請求"""
+        if not self.per_minute:
+            return 0.0
+        now = self.clock()
+        while self.sent and now - self.sent[0] >= self.window:
+            self.sent.popleft()
+        over = len(self.sent) + min(cost, self.per_minute) - self.per_minute
+        if over <= 0:
+            return 0.0
+        return self.sent[over - 1] + self.window - now
+
+    def spend(self, cost=1):
+        if self.per_minute:
+            now = self.clock()
+            self.sent.extend([now] * cost)
+
+    def acquire(self, cost=1, sleep=time.sleep):
+        """等到額度足夠後扣除；sleep 回傳 True（例如 stop_event.wait）時放棄並回傳 False"""
+        while True:
+            with self.lock:
+                wait = self.delay(cost)
+                if wait <= 0:
+                    self.spend(cost)
+                    return True
+            if sleep(wait):
+                return False
+
+
+def parse_course(course):
+    """'304,CS352A,2' -> ('304', 'CS352A', 2)"""
+    tokens = [token.strip() for token in course.split(',')]
+    priority = int(tokens[2]) if len(tokens) > 2 and tokens[2] else 0
+    return tokens[0], tokens[1], priority
+
+
+class CourseAttempt:
+    __slots__ = ('course', 'dept', 'key', 'priority', 'order', 'attempts', 'failures', 'ready_at', 'last_outcome',
+                 'outcomes')
+
+    def __init__(self, course, order):
+        self.course = course
+        self.dept, self.key, self.priority = parse_course(course)
+        self.order = order
+        self.attempts = 0
+        self.failures = 0
+        self.ready_at = 0.0
+        self.last_outcome = None
+        self.outcomes = {}  # 結果 -> 次數
+
+    def format_outcomes(self):
+        """'full 12, success 1'"""
+        return ', '.join('{} {}'.format(outcome, count) for outcome, count in self.outcomes.items())
+
+
+class AttemptScheduler:
+    """決定下一門要嘗試的課程
+
+    可嘗試的課程中優先順序最高者先；同優先順序時嘗試次數最少者先（逐輪輪流），
+    再來是與上一門課同系所者（沿用同一份系所清單的 postback 狀態，不必重新送出系所 POST），最後是等最久的先。
+    """
+
+    def __init__(self, courses_list, delay=0, max_backoff=DEFAULT_MAX_BACKOFF, clock=time.monotonic):
+        self.delay = delay
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.attempts = [CourseAttempt(course, order) for order, course in enumerate(courses_list)]
+        self.pending = list(self.attempts)
+        self.last_dept = None
+        self.cycles = 0
+        self.cycle_attempted = set()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def next_attempt(self):
+        """回傳 (attempt, 需要等待的秒數)"""
+        now = self.clock()
+        ready = [a for a in self.pending if a.ready_at <= now]
+        if ready:
+            return min(ready, key=lambda a: (-a.priority, a.attempts, a.dept != self.last_dept, a.ready_at, a.order)), 0.0
+        attempt = min(self.pending, key=lambda a: (a.ready_at, -a.priority, a.order))
+        return attempt, attempt.ready_at - now
+
+    def backoff(self, outcome, failures):
+        base, growth = BACKOFF.get(outcome, BACKOFF['unknown'])
+        delay = max(self.delay, MIN_BACKOFF_BASE)
+        return min(delay * base * growth ** (failures - 1), max(self.max_backoff, delay))
+
+    def record(self, attempt, outcome):
+        """記錄結果：DROPPED 移出排程，'relogin' 重新登入後立即再試，其他依結果退避"""
+        attempt.attempts += 1
+        attempt.outcomes[outcome] = attempt.outcomes.get(outcome, 0) + 1
+        if outcome in DROPPED:
+            self.pending.remove(attempt)
+        elif outcome == 'relogin':
+            attempt.ready_at = self.clock()
+        else:
+            attempt.failures = attempt.failures + 1 if outcome == attempt.last_outcome else 1
+            attempt.ready_at = self.clock() + self.backoff(outcome, attempt.failures)
+        attempt.last_outcome = outcome
+        self.last_dept = attempt.dept
+        self.cycle_attempted.add(attempt)
+
+    def completed_cycle(self):
+        """每門待選課程都再嘗試過一次（完成一輪）時回傳 (這一輪的課程數, 系所數)，否則回傳 None"""
+        if not self.cycle_attempted or (self.pending and min(a.attempts for a in self.pending) <= self.cycles):
+            return None
+        self.cycles += 1
+        attempted, self.cycle_attempted = self.cycle_attempted, set()
+        return len(attempted), len({a.dept for a in attempted})
@@ -0,0 +1,101 @@
+# 將登入後的 session（cookies 與各系所的 postback 狀態）加密存到磁碟，
+# 重新啟動時先沿用，伺服器回應 please log on again! 時才重新辨識驗證碼並登入。
+#
+# 需要 cryptography 套件（Fernet + PBKDF2，金鑰由帳號密碼推導）；未安裝時 available() 為 False。
+
+import os
+import json
+import time
+import base64
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError:
+    Fernet = None
+
+DEFAULT_MAX_AGE = 2 * 60 * 60  # 超過 2 小時的 session 一定已失效，直接捨棄
+PBKDF2_ITERATIONS = 390_000
+
+
+def available():
+    return Fernet is not None
+
+
+def dump_cookies(cookies):
+    """requests 的 RequestsCookieJar 或 httpx 的 Cookies -> list of dict"""
+    jar = getattr(cookies, 'jar', cookies)
+    return [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path} for c in jar]
+
+
+def load_cookies(cookies, saved):
+    for c in saved:
+        cookies.set(c['name'], c['value'], domain=c['domain'], path=c['path'])
+
+
+class SessionStore:
+    """以 Fernet 加密的單一檔案；同一個 store 只推導一次金鑰，之後每次儲存都很快"""
+
+    def __init__(self, path, account, password, max_age=DEFAULT_MAX_AGE):
+        if not available():
+            raise RuntimeError('session persistence requires the cryptography package')
+        self.path = path
+        self.account = account
+        self.password = password
+        self.max_age = max_age
+        self.salt = None
+        self.fernet = None
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _key(self, salt):
+        if self.fernet is None or salt != self.salt:
+            kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=PBKDF2_ITERATIONS)
+            secret = '{}\0{}'.format(self.account, self.password).encode('utf-8')
+            self.salt = salt
+            self.fernet = Fernet(base64.urlsafe_b64encode(kdf.derive(secret)))
+        return self.fernet
+
+    def load(self):
+        """回傳上次儲存的 state，不存在、過期、帳密不同或無法解密時回傳 None"""
+        data = self._read()
+        if not data:
+            return None
+        try:
+            salt = base64.b64decode(data['salt'])
+            state = json.loads(self._key(salt).decrypt(data['token'].encode('ascii')))
+        except (KeyError, ValueError, InvalidToken):
+            return None
+        if state.get('account') != self.account or time.time() - state.get('savedAt', 0) > self.max_age:
+            return None
+        return state
+
+    def save(self, state):
+        if self.salt is None:
+            data = self._read()
+            salt = base64.b64decode(data['salt']) if data and 'salt' in data else os.urandom(16)
+        else:
+            salt = self.salt
+        state = dict(state, account=self.account, savedAt=time.time())
+        token = self._key(salt).encrypt(json.dumps(state, ensure_ascii=False).encode('utf-8'))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'salt': base64.b64encode(salt).decode('ascii'), 'token': token.decode('ascii')}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
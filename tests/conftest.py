@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模組都放在專案根目錄（沒有套件），測試直接 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
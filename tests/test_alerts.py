@@ -0,0 +1,40 @@
+import pytest
+
+from alerts import classify_alert
+
+
+@pytest.mark.parametrize('alertMsg, outcome', [
+    ('加選訊息：CS354A 電腦與網路安全概論 加選成功', 'success'),
+    ('已選過此課程', 'success'),
+    ('加選失敗：課程人數已額滿', 'full'),
+    ('限修人數已滿', 'full'),
+    ('加選失敗：與已選課程衝堂', 'conflict'),
+    ('加選失敗：超過學分上限', 'ineligible'),
+    ('加選失敗：不符合修課資格（限大三以上）', 'ineligible'),
+    ('please log on again!', 'relogin'),
+    ('選課系統尚未開放!', 'unknown'),
+    ('', 'unknown'),
+])
+def test_classify_alert(alertMsg, outcome):
+    assert classify_alert(alertMsg) == outcome
+
+
+def test_failure_with_the_success_prefix():
+    # 實際系統的失敗訊息也可能以「加選訊息：」開頭
+    assert classify_alert('加選訊息：課程人數已額滿') == 'full'
+    assert classify_alert('加選訊息：與已選課程衝堂') == 'conflict'
+
+
+def test_relogin_wins():
+    assert classify_alert('課程人數已額滿，請重新登入') == 'relogin'
+
+
+def test_mixed_failures_are_unknown():
+    # 額滿又資格不符時無法判斷，不能把額滿的課程誤判為資格不符而移除
+    assert classify_alert('加選失敗：課程人數已額滿；不符合修課資格') == 'unknown'
+
+
+def test_course_name_is_removed():
+    alertMsg = '加選訊息：ED101A 不符合修課資格之認定 加選成功'
+    assert classify_alert(alertMsg) == 'ineligible'
+    assert classify_alert(alertMsg, course_name='不符合修課資格之認定') == 'success'
@@ -0,0 +1,51 @@
+import pytest
+
+from aspnet_fields import (ASPNET_FIELDS, MissingFieldError, extract_field, extract_first_script,
+                           extract_hidden_fields, extract_select_options)
+
+PAGE = '''<html><body><form method="post" action="./CosList.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="dDw+&amp;abc==" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" id='__VIEWSTATEGENERATOR' value='A1B2C3' />
+<div data-id="__EVENTVALIDATION" value="wrong"></div>
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value=xyz />
+<select name="DDL_Dept" id="DDL_Dept">
+  <option value="">請選擇</option>
+  <option selected="selected" value="304">資訊工程學系</option>
+  <option value='901'>通識教學部</option>
+</select>
+</form>
+<script language="javascript">alert('加選訊息：CS354A 加選成功');</script>
+<script>window.close();</script>
+</body></html>'''
+
+
+def test_extract_hidden_fields():
+    assert extract_hidden_fields(PAGE) == {
+        '__VIEWSTATE': 'dDw+&abc==',
+        '__VIEWSTATEGENERATOR': 'A1B2C3',
+        '__EVENTVALIDATION': 'xyz',
+    }
+    assert tuple(extract_hidden_fields(PAGE)) == ASPNET_FIELDS
+
+
+def test_data_id_is_skipped():
+    assert extract_field(PAGE, '__EVENTVALIDATION') == 'xyz'
+
+
+def test_missing_field():
+    with pytest.raises(MissingFieldError) as excinfo:
+        extract_hidden_fields('<html><body>please log on again!</body></html>')
+    assert excinfo.value.field == '__VIEWSTATE'
+    assert isinstance(excinfo.value, ValueError)
+
+
+def test_extract_select_options():
+    assert extract_select_options(PAGE, 'DDL_Dept') == ['', '304', '901']
+    with pytest.raises(MissingFieldError):
+        extract_select_options('<select id="DDL_Dept"><option value="304">', 'DDL_Dept')
+
+
+def test_extract_first_script():
+    assert extract_first_script(PAGE) == "alert('加選訊息：CS354A 加選成功');"
+    with pytest.raises(MissingFieldError):
+        extract_first_script('<html></html>')
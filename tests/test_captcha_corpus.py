@@ -0,0 +1,20 @@
+import numpy as np
+
+from captcha_corpus import CaptchaCorpus, corpus_models, iter_records, model_fingerprint
+
+
+def test_round_trip_records_the_model(tmp_path):
+    model = tmp_path / 'model.h5'
+    model.write_bytes(b'weights')
+    corpus = CaptchaCorpus(str(tmp_path / 'corpus'), model=model_fingerprint(str(model)))
+    corpus.add(b'\x89PNG\r\n\x1a\nAB12', 'AB12', [0.9, 0.8, 0.95, 0.7], 'success')
+    corpus.add(b'GIF89a', '7KQ', [0.4, 0.5, 0.6], 'wrong')
+    assert corpus.flush() is not None
+    assert corpus.flush() is None
+
+    records = list(iter_records(corpus.directory))
+    assert [(image, label, outcome) for image, label, _, outcome, _ in records] == [
+        (b'\x89PNG\r\n\x1a\nAB12', 'AB12', 'success'), (b'GIF89a', '7KQ', 'wrong')]
+    np.testing.assert_allclose(records[1][2], [0.4, 0.5, 0.6])
+    assert list(iter_records(corpus.directory, outcomes=('wrong',)))[0][1] == '7KQ'
+    assert corpus_models(corpus.directory) == {model_fingerprint(str(model))}
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from course_cache import CourseCache, current_semester
+
+
+@pytest.mark.parametrize('date, semester', [
+    ('2025-09-01', '114-1'),
+    ('2025-12-31', '114-1'),
+    ('2026-01-15', '114-1'),
+    ('2026-02-10', '114-2'),
+    ('2026-05-31', '114-2'),
+    ('2026-06-01', '115-1'),
+    ('2026-07-20', '115-1'),
+    ('2026-08-01', '115-1'),
+])
+def test_current_semester(date, semester):
+    assert current_semester(time.mktime(time.strptime(date + ' 12:00', '%Y-%m-%d %H:%M'))) == semester
+
+
+def test_expired_entries(tmp_path):
+    cache = CourseCache(str(tmp_path / 'cache.json'), ttl=60)
+    cache.put('304', '114-1', {'DDL_Dept': '304'}, {'CS354A': 'SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 課'})
+    cache.put('901', '114-1', {}, {})
+    cache.entries['114-1/901']['savedAt'] -= 120
+    cache.save()
+
+    cache = CourseCache(cache.path, ttl=60)
+    assert cache.get('304', '114-1')['selectPayLoad'] == {'DDL_Dept': '304'}
+    assert cache.get('901', '114-1') is None
+    assert set(cache.semester_entries('114-1')) == {'304', '901'}
+    assert set(cache.semester_entries('114-1', fresh=True)) == {'304'}
+    assert cache.invalidate('304', '114-1') is not None
+    assert CourseCache(cache.path).get('304', '114-1') is None
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from course_cache import CourseCache
+from course_catalog import CourseCatalog, CourseRecord, CourseTrie, catalog_from_cache, check_course_lines
+
+SECURITY = 'SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 電腦與網路安全概論'
+NETWORK = 'SelCos,CS352,A,3,F,3,N,Chinese,CS352,A,3 計算機網路'
+ARTS = 'SelCos,LS239,A,1,F,2,N,Chinese,LS239,A,2 藝術與人生'
+
+
+@pytest.fixture
+def catalog():
+    return CourseCatalog([CourseRecord.from_mUrl(SECURITY, '304'), CourseRecord.from_mUrl(NETWORK, '304'),
+                          CourseRecord.from_mUrl(ARTS, '901')])
+
+
+def test_from_mUrl():
+    record = CourseRecord.from_mUrl(SECURITY, '304')
+    assert (record.dept, record.key, record.credits, record.required, record.name) == \
+        ('304', 'CS354A', 3, True, '電腦與網路安全概論')
+    assert record.mUrl == SECURITY
+    assert record._raw is None
+    assert record.button == SECURITY.partition(' ')[0]
+
+
+def test_from_mUrl_keeps_names_that_do_not_round_trip():
+    mUrl = 'SelCos,CS354,A,1,F,3,Y,Chinese,CS354,B,3 電腦與網路安全概論'
+    assert CourseRecord.from_mUrl(mUrl).mUrl == mUrl
+
+
+def test_from_mUrl_unexpected_layout():
+    mUrl = 'SelCos,CS999,B,Chinese 專題'
+    record = CourseRecord.from_mUrl(mUrl, '304')
+    assert (record.key, record.credits, record.name, record.mUrl) == ('CS999B', None, '專題', mUrl)
+
+
+@pytest.mark.parametrize('mUrl', ['', 'SelCos', 'SelCos,CS354', 'SelCos,,A,1,F,3,Y,Chinese,CS354,A,3 課'])
+def test_from_mUrl_rejects_buttons_without_code_and_class(mUrl):
+    with pytest.raises(ValueError):
+        CourseRecord.from_mUrl(mUrl)
+
+
+def test_catalog_indexes(catalog):
+    assert 'CS354A' in catalog and len(catalog) == 3
+    assert [record.key for record in catalog.in_dept('304')] == ['CS354A', 'CS352A']
+    assert [record.key for record in catalog.classes('LS239')] == ['LS239A']
+    assert catalog.pop('CS354A').key == 'CS354A'
+    assert catalog.pop('CS354A') is None
+    assert [record.key for record in catalog.in_dept('304')] == ['CS352A']
+    assert catalog.classes('CS354') == []
+
+
+def test_catalog_add_replaces(catalog):
+    catalog.add(CourseRecord.from_mUrl(SECURITY, '305'))
+    assert catalog['CS354A'].dept == '305'
+    assert 'CS354A' not in catalog.by_dept['304']
+    assert len(catalog.classes('CS354')) == 1
+
+
+def test_search_name(catalog):
+    assert [record.key for record in catalog.search_name('計算')] == ['CS352A']
+    assert catalog.search_name('網路') == []
+    catalog.add(CourseRecord.from_mUrl(ARTS.replace('LS239', 'LS240').replace('藝術與人生', '藝術史'), '901'))
+    assert [record.key for record in catalog.search_name('藝術')] == ['LS240A', 'LS239A']
+    assert len(catalog.search_name('藝術', limit=1)) == 1
+
+
+def test_trie(catalog):
+    trie = CourseTrie(catalog)
+    assert [record.key for record in trie.search('cs3')] == ['CS352A', 'CS354A']
+    # 接續上一次的前綴往下找
+    assert [record.key for record in trie.search('cs35')] == ['CS352A', 'CS354A']
+    assert [record.key for record in trie.search('CS354')] == ['CS354A']
+    assert [record.key for record in trie.search('藝術')] == ['LS239A']
+    assert trie.search('cs3', dept='901') == []
+    assert len(trie.search('', limit=2)) == 2
+    assert trie.search('xyz') == []
+    assert [record.key for record in trie.search('c')] == ['CS352A', 'CS354A']
+
+
+def test_check_course_lines(catalog):
+    lines = ['304,CS354A', '304,CS352A,5', '901,CS354A', '304,CS999A', '304,CS354A', '304,CS352A,x', '304',
+             '305,EE101A']
+    assert check_course_lines(lines, catalog) == [
+        (3, 'CS354A 屬於系所 304，不是 901'),
+        (4, '系所 304 沒有 CS999A 這門課'),
+        (5, 'CS354A 重複'),
+        (6, '優先順序必須是整數'),
+        (7, '格式應為 部門代碼,課程代碼[,優先順序]'),
+    ]
+
+
+def test_catalog_from_cache_skips_stale_departments(tmp_path):
+    cache = CourseCache(str(tmp_path / 'cache.json'), ttl=60)
+    cache.put('304', '114-1', {}, {'CS354A': SECURITY})
+    cache.put('901', '114-1', {}, {'LS239A': ARTS})
+    cache.entries['114-1/901']['savedAt'] = time.time() - 120
+    catalog = catalog_from_cache(cache, '114-1')
+    assert list(catalog) == ['CS354A']
+    # 過期的系所沒有資料時只檢查格式
+    assert check_course_lines(['901,LS999A'], catalog) == []
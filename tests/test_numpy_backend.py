@@ -0,0 +1,159 @@
+# NumPy 推論引擎與逐元素迴圈寫成的參考實作、以及 Keras（有安裝 TensorFlow 時）的結果比對
+#
+# 模型是以固定亂數種子產生的小型合成模型，不需要 model.h5。
+
+import json
+
+import numpy as np
+import pytest
+
+from captcha_ocr import N_CLASSES, NumpyCaptchaModel, decode_prediction
+
+INPUT_SHAPE = (12, 20, 3)
+
+MODEL_CONFIG = {
+    'class_name': 'Sequential',
+    'config': {
+        'name': 'synthetic',
+        'layers': [
+            {'class_name': 'InputLayer', 'config': {'name': 'input', 'batch_input_shape': [None, *INPUT_SHAPE]}},
+            {'class_name': 'Conv2D', 'config': {'name': 'conv1', 'filters': 4, 'kernel_size': [3, 3], 'strides': [1, 1],
+                                                'padding': 'same', 'activation': 'relu'}},
+            {'class_name': 'BatchNormalization', 'config': {'name': 'bn1', 'epsilon': 1e-3}},
+            {'class_name': 'MaxPooling2D', 'config': {'name': 'pool1', 'pool_size': [2, 2]}},
+            {'class_name': 'Conv2D', 'config': {'name': 'conv2', 'filters': 5, 'kernel_size': [3, 3], 'strides': [2, 2],
+                                                'padding': 'valid', 'activation': 'relu'}},
+            {'class_name': 'Flatten', 'config': {'name': 'flatten'}},
+            {'class_name': 'Dense', 'config': {'name': 'dense', 'activation': 'softmax'}},
+        ],
+    },
+}
+
+
+def synthetic_weights(seed=0):
+    rng = np.random.default_rng(seed)
+
+    def normal(*shape):
+        return rng.normal(0, 0.5, shape).astype(np.float32)
+
+    return {
+        'conv1': {'kernel': normal(3, 3, 3, 4), 'bias': normal(4)},
+        'bn1': {'gamma': normal(4) + 1, 'beta': normal(4), 'moving_mean': normal(4),
+                'moving_variance': rng.uniform(0.5, 1.5, 4).astype(np.float32)},
+        'conv2': {'kernel': normal(3, 3, 4, 5), 'bias': normal(5)},
+        'dense': {'kernel': normal(2 * 4 * 5, len(N_CLASSES)), 'bias': normal(len(N_CLASSES))},
+    }
+
+
+def reference_conv(x, kernel, bias, stride, padding):
+    kh, kw, _, out = kernel.shape
+    if padding == 'same':
+        pads = []
+        for size, k in ((x.shape[1], kh), (x.shape[2], kw)):
+            total = max((-(-size // stride) - 1) * stride + k - size, 0)
+            pads.append((total // 2, total - total // 2))
+        x = np.pad(x, ((0, 0), pads[0], pads[1], (0, 0)))
+    n, h, w, _ = x.shape
+    oh, ow = (h - kh) // stride + 1, (w - kw) // stride + 1
+    y = np.zeros((n, oh, ow, out), dtype=np.float64)
+    for b in range(n):
+        for i in range(oh):
+            for j in range(ow):
+                patch = x[b, i * stride:i * stride + kh, j * stride:j * stride + kw, :]
+                for o in range(out):
+                    y[b, i, j, o] = (patch * kernel[..., o]).sum() + bias[o]
+    return y
+
+
+def reference_predict(x, weights):
+    w = weights
+    y = np.maximum(reference_conv(x, w['conv1']['kernel'], w['conv1']['bias'], 1, 'same'), 0)
+    bn = w['bn1']
+    y = (y - bn['moving_mean']) / np.sqrt(bn['moving_variance'] + 1e-3) * bn['gamma'] + bn['beta']
+    n, h, wd, c = y.shape
+    y = y.reshape(n, h // 2, 2, wd // 2, 2, c).max(axis=(2, 4))
+    y = np.maximum(reference_conv(y, w['conv2']['kernel'], w['conv2']['bias'], 2, 'valid'), 0)
+    logits = y.reshape(n, -1) @ w['dense']['kernel'] + w['dense']['bias']
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def write_h5(path, model_config, weights):
+    """以 Keras 2 的 model.h5 格式寫出模型設定與權重"""
+    h5py = pytest.importorskip('h5py')
+    with h5py.File(path, 'w') as f:
+        f.attrs['model_config'] = json.dumps(model_config)
+        group = f.create_group('model_weights')
+        group.attrs['layer_names'] = [name.encode() for name in weights]
+        for layer_name, layer_weights in weights.items():
+            layer_group = group.create_group(layer_name)
+            names = ['{}/{}:0'.format(layer_name, short) for short in layer_weights]
+            layer_group.attrs['weight_names'] = [name.encode() for name in names]
+            for name, value in zip(names, layer_weights.values()):
+                layer_group.create_dataset(name, data=value)
+
+
+@pytest.fixture
+def batch():
+    return np.random.default_rng(1).uniform(0, 1, (2, *INPUT_SHAPE)).astype(np.float32)
+
+
+def test_matches_reference(batch):
+    weights = synthetic_weights()
+    model = NumpyCaptchaModel.from_config(MODEL_CONFIG, weights)
+    assert model.input_shape == (None, *INPUT_SHAPE)
+    np.testing.assert_allclose(model.predict(batch), reference_predict(batch, weights), rtol=1e-4, atol=1e-6)
+
+
+def test_from_h5_matches_from_config(tmp_path, batch):
+    weights = synthetic_weights()
+    path = str(tmp_path / 'synthetic.h5')
+    write_h5(path, MODEL_CONFIG, weights)
+    expected = NumpyCaptchaModel.from_config(MODEL_CONFIG, weights).predict(batch)
+    np.testing.assert_array_equal(NumpyCaptchaModel.from_h5(path).predict(batch), expected)
+
+
+@pytest.mark.filterwarnings('ignore:You are saving your model as an HDF5 file')
+def test_matches_keras(tmp_path, batch):
+    pytest.importorskip('tensorflow')
+    from tensorflow import keras
+
+    weights = synthetic_weights()
+    model = keras.Sequential([
+        keras.Input(shape=INPUT_SHAPE),
+        keras.layers.Conv2D(4, 3, padding='same', activation='relu', name='conv1'),
+        keras.layers.BatchNormalization(epsilon=1e-3, name='bn1'),
+        keras.layers.MaxPooling2D(2, name='pool1'),
+        keras.layers.Conv2D(5, 3, strides=2, activation='relu', name='conv2'),
+        keras.layers.Flatten(name='flatten'),
+        keras.layers.Dense(len(N_CLASSES), activation='softmax', name='dense'),
+    ])
+    bn = weights['bn1']
+    model.get_layer('conv1').set_weights([weights['conv1']['kernel'], weights['conv1']['bias']])
+    model.get_layer('bn1').set_weights([bn['gamma'], bn['beta'], bn['moving_mean'], bn['moving_variance']])
+    model.get_layer('conv2').set_weights([weights['conv2']['kernel'], weights['conv2']['bias']])
+    model.get_layer('dense').set_weights([weights['dense']['kernel'], weights['dense']['bias']])
+    path = str(tmp_path / 'keras.h5')
+    model.save(path)
+
+    np.testing.assert_allclose(NumpyCaptchaModel.from_h5(path).predict(batch), model.predict(batch, verbose=0),
+                               rtol=1e-4, atol=1e-6)
+
+
+def test_unsupported_layer():
+    config = json.loads(json.dumps(MODEL_CONFIG))
+    config['config']['layers'].append({'class_name': 'LSTM', 'config': {'name': 'lstm'}})
+    with pytest.raises(NotImplementedError):
+        NumpyCaptchaModel.from_config(config, synthetic_weights())
+
+
+def test_decode_prediction():
+    outputs = []
+    for ch in 'AB12':
+        probs = np.full((1, len(N_CLASSES)), 0.01, dtype=np.float32)
+        probs[0, N_CLASSES.index(ch)] = 0.6
+        outputs.append(probs)
+    text, confidence = decode_prediction(outputs, with_confidence=True)
+    assert text == 'AB12'
+    np.testing.assert_allclose(confidence, [0.6] * 4)
+    assert decode_prediction(outputs) == 'AB12'
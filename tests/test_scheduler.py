@@ -0,0 +1,131 @@
+import pytest
+
+from scheduler import MIN_BACKOFF_BASE, AttemptScheduler, RequestBudget, parse_course
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        return False
+
+
+def test_parse_course():
+    assert parse_course('304,CS352A') == ('304', 'CS352A', 0)
+    assert parse_course('304, CS352A ,5') == ('304', 'CS352A', 5)
+    assert parse_course('304,CS352A,') == ('304', 'CS352A', 0)
+
+
+def test_priority_first_then_round_robin():
+    clock = FakeClock()
+    scheduler = AttemptScheduler(['304,CS201A', '901,LS239A', '304,CS352A,5'], delay=1, clock=clock)
+    order = []
+    for _ in range(4):
+        attempt, wait = scheduler.next_attempt()
+        clock.now += wait
+        order.append(attempt.key)
+        scheduler.record(attempt, 'full')
+    assert order == ['CS352A', 'CS201A', 'LS239A', 'CS352A']
+
+
+def test_same_department_back_to_back():
+    scheduler = AttemptScheduler(['304,CS201A', '901,LS239A', '304,CS352A'], clock=FakeClock())
+    order = []
+    while len(order) < 3:
+        attempt, _ = scheduler.next_attempt()
+        order.append(attempt.key)
+        scheduler.record(attempt, 'relogin')
+    assert order == ['CS201A', 'CS352A', 'LS239A']
+
+
+def test_full_retries_on_the_delay_cadence():
+    clock = FakeClock()
+    scheduler = AttemptScheduler(['304,CS201A'], delay=2.0, clock=clock)
+    attempt, _ = scheduler.next_attempt()
+    for _ in range(5):
+        scheduler.record(attempt, 'full')
+        assert attempt.ready_at - clock.now == pytest.approx(2.0)
+
+
+def test_unknown_backs_off_exponentially_up_to_the_cap():
+    clock = FakeClock()
+    scheduler = AttemptScheduler(['304,CS201A'], delay=1.0, max_backoff=10.0, clock=clock)
+    attempt, _ = scheduler.next_attempt()
+    waits = []
+    for _ in range(5):
+        scheduler.record(attempt, 'unknown')
+        waits.append(attempt.ready_at - clock.now)
+    assert waits == [2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_zero_delay_still_backs_off():
+    scheduler = AttemptScheduler(['304,CS201A'], delay=0, clock=FakeClock())
+    assert scheduler.backoff('full', 1) == MIN_BACKOFF_BASE
+
+
+def test_waits_for_the_earliest_course():
+    clock = FakeClock()
+    scheduler = AttemptScheduler(['304,CS201A'], delay=3.0, clock=clock)
+    attempt, _ = scheduler.next_attempt()
+    scheduler.record(attempt, 'full')
+    attempt, wait = scheduler.next_attempt()
+    assert wait == pytest.approx(3.0)
+
+
+@pytest.mark.parametrize('outcome', ['success', 'error', 'conflict', 'ineligible'])
+def test_final_outcomes_leave_the_schedule(outcome):
+    scheduler = AttemptScheduler(['304,CS201A', '304,CS352A'], clock=FakeClock())
+    attempt, _ = scheduler.next_attempt()
+    scheduler.record(attempt, outcome)
+    assert len(scheduler) == 1
+    assert attempt.format_outcomes() == '{} 1'.format(outcome)
+
+
+def test_completed_cycle():
+    scheduler = AttemptScheduler(['304,CS201A', '901,LS239A'], clock=FakeClock())
+    attempt, _ = scheduler.next_attempt()
+    scheduler.record(attempt, 'relogin')
+    assert scheduler.completed_cycle() is None
+    attempt, _ = scheduler.next_attempt()
+    scheduler.record(attempt, 'relogin')
+    assert scheduler.completed_cycle() == (2, 2)
+    assert scheduler.completed_cycle() is None
+
+
+def test_budget_unlimited():
+    budget = RequestBudget(None)
+    assert budget.delay(100) == 0.0
+    assert budget.acquire(100)
+
+
+def test_budget_sliding_window():
+    clock = FakeClock()
+    budget = RequestBudget(3, window=60.0, clock=clock)
+    for _ in range(3):
+        assert budget.acquire(1, clock.sleep)
+    assert clock.now == 0.0
+    assert budget.delay() == pytest.approx(60.0)
+    clock.now = 30.0
+    assert budget.delay(1) == pytest.approx(30.0)
+    assert budget.acquire(1, clock.sleep)
+    assert clock.now == pytest.approx(60.0)
+
+
+def test_budget_cost_larger_than_the_cap_waits_for_an_empty_window():
+    clock = FakeClock()
+    budget = RequestBudget(2, window=10.0, clock=clock)
+    budget.spend(1)
+    assert budget.delay(5) == pytest.approx(10.0)
+
+
+def test_budget_acquire_gives_up_when_stopped():
+    clock = FakeClock()
+    budget = RequestBudget(1, window=10.0, clock=clock)
+    assert budget.acquire(1, clock.sleep)
+    assert not budget.acquire(1, lambda seconds: True)
+    assert len(budget.sent) == 1
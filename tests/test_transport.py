@@ -0,0 +1,106 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from scheduler import RequestBudget
+from transport import HttpSession, RequestCancelled
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """前 server.failures 個請求回傳 503，之後回傳 200"""
+
+    def respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.server.hits.append(self.command)
+        status = 503 if len(self.server.hits) <= self.server.failures else 200
+        body = 'hit {}'.format(len(self.server.hits)).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    server.hits = []
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = 'http://127.0.0.1:{}/Index.aspx'.format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_session(**kwargs):
+    return HttpSession(sleep=lambda seconds: None, **kwargs)
+
+
+def test_get_is_retried(server):
+    server.failures = 2
+    with make_session(get_retries=2) as session:
+        response = session.get(server.url)
+        assert response.status_code == 200
+        stats = session.stats.snapshot()['GET Index.aspx']
+    assert server.hits == ['GET'] * 3
+    assert (stats['requests'], stats['retries'], stats['errors']) == (3, 2, 0)
+    assert stats['bytes_in'] == len('hit 1') * 3
+
+
+def test_get_gives_up_after_the_retries(server):
+    server.failures = 5
+    with make_session(get_retries=1) as session:
+        assert session.get(server.url).status_code == 503
+    assert len(server.hits) == 2
+
+
+def test_post_is_not_retried(server):
+    server.failures = 1
+    with make_session() as session:
+        response = session.post(server.url, data={'Txt_User': 's1091234'})
+        assert response.status_code == 503
+        stats = session.stats.snapshot()['POST Index.aspx']
+    assert server.hits == ['POST']
+    assert stats['bytes_out'] > 0
+
+
+def test_retries_zero_disables_get_retries(server):
+    server.failures = 1
+    with make_session() as session:
+        assert session.get(server.url, retries=0).status_code == 503
+    assert len(server.hits) == 1
+
+
+def test_connection_errors_are_counted():
+    with make_session(get_retries=1, connect_timeout=1) as session:
+        with pytest.raises(requests.ConnectionError):
+            session.get('http://127.0.0.1:1/Index.aspx')
+        stats = session.stats.snapshot()['GET Index.aspx']
+    assert (stats['requests'], stats['errors'], stats['retries']) == (2, 2, 1)
+
+
+def test_budget_is_charged_per_attempt(server):
+    server.failures = 1
+    budget = RequestBudget(10)
+    with make_session(budget=budget) as session:
+        session.get(server.url)
+    assert len(budget.sent) == 2
+
+
+def test_cancelled_while_waiting_for_the_budget(server):
+    budget = RequestBudget(1)
+    with make_session(budget=budget, budget_sleep=lambda seconds: True) as session:
+        session.get(server.url)
+        with pytest.raises(RequestCancelled):
+            session.get(server.url)
+    assert len(server.hits) == 1
@@ -0,0 +1,136 @@
+# 由登入結果自動標記的驗證碼資料集（captchaCorpusPath / GUI「收集驗證碼資料集」）報告
+#
+# usage: python tools/captcha_report.py CORPUS_DIR [--model model.h5] [--backend numpy] [--export DIR] [--top 15]
+#
+# 列出各登入結果的筆數、實際送出的驗證碼正確率（success / (success + wrong)）與最低字元信心值的分布。
+# 只有 success 的辨識結果確定正確：指定 --model 時以這些樣本重新辨識，計算逐字元正確率與字元混淆
+# （正確字元 -> 辨識結果）；wrong 的樣本列出各位置中信心值最低的字元，通常就是辨識錯的那一個。
+# success 的樣本只包含收集時的模型辨識正確的驗證碼，以同一個模型重新辨識必定全對，
+# 所以 --model 必須是不同的模型（例如重新訓練或量化後的模型）。
+# --export 將 success 樣本寫成 LABEL_n.png（或伺服器回傳的其他圖片格式），可直接給 tools/quantize_model.py --eval 使用。
+
+import os
+import sys
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from captcha_corpus import OUTCOMES, corpus_models, iter_records, model_fingerprint, shard_paths
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else float('nan')
+
+
+# 圖片開頭的 magic bytes -> 副檔名
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'BM', '.bmp'),
+)
+
+
+def image_extension(image, default='.png'):
+    for signature, extension in IMAGE_SIGNATURES:
+        if image.startswith(signature):
+            return extension
+    return default
+
+
+def export_verified(records, directory):
+    os.makedirs(directory, exist_ok=True)
+    for i, (image, label, _, _, _) in enumerate(records):
+        with open(os.path.join(directory, '{}_{:05d}{}'.format(label, i, image_extension(image))), 'wb') as f:
+            f.write(image)
+    print('exported {} verified captchas to {}'.format(len(records), directory))
+
+
+def rerun_ocr(records, model, backend, top):
+    from captcha_ocr import decode_captcha, decode_prediction, get_predictor
+
+    predictor = get_predictor(model, backend)
+    predictor.warm_up()
+    confusion = Counter()
+    chars = correct = whole = 0
+    for image, label, _, _, _ in records:
+        text = decode_prediction(predictor(decode_captcha(image)))
+        whole += text == label
+        for a, b in zip(label, text):
+            chars += 1
+            if a == b:
+                correct += 1
+            else:
+                confusion[a, b] += 1
+
+    print('{} on {} verified captchas: char {:.2%}  captcha {:.2%}'.format(
+        model, len(records), correct / chars, whole / len(records)))
+    if confusion:
+        print('  most common confusions (true -> predicted):')
+        for (a, b), count in confusion.most_common(top):
+            print('    {} -> {}  {}'.format(a, b, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report OCR accuracy from the login-labeled captcha corpus')
+    parser.add_argument('corpus', help='directory with captchas-*.npz shards')
+    parser.add_argument('--model', help='re-run this model on the verified captchas (must differ from the collecting one)')
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--export', metavar='DIR', help='write verified captchas as LABEL_n.png')
+    parser.add_argument('--top', type=int, default=15, help='confusions to list')
+    args = parser.parse_args()
+
+    records = list(iter_records(args.corpus))
+    if not records:
+        print('No captcha shards found in', args.corpus)
+        return 1
+
+    print('{} captchas in {} shards'.format(len(records), len(shard_paths(args.corpus))))
+    counts = Counter(record[3] for record in records)
+    print('  {:<8} {:>6}   min confidence p10 / p50 / p90'.format('outcome', 'count'))
+    for outcome in OUTCOMES:
+        mins = [record[2].min() for record in records if record[3] == outcome and len(record[2])]
+        print('  {:<8} {:>6}   {:.2f} / {:.2f} / {:.2f}'.format(
+            outcome, counts[outcome], percentile(mins, 10), percentile(mins, 50), percentile(mins, 90)))
+
+    submitted = counts['success'] + counts['wrong']
+    if submitted:
+        print('login captcha accuracy: {:.2%} ({} / {} submitted)'.format(
+            counts['success'] / submitted, counts['success'], submitted))
+
+    # 送錯的驗證碼：信心值最低的位置最可能是辨識錯的字元
+    suspects = Counter()
+    for _, label, confidence, outcome, _ in records:
+        if outcome == 'wrong' and len(confidence):
+            position = int(confidence.argmin())
+            suspects[position, label[position]] += 1
+    if suspects:
+        print('  least confident character in wrong captchas (position, predicted):')
+        for (position, ch), count in suspects.most_common(args.top):
+            print('    #{} {}  {}'.format(position + 1, ch, count))
+
+    verified = [record for record in records if record[3] == 'success']
+    if args.export:
+        export_verified(verified, args.export)
+    if args.model:
+        collected_by = corpus_models(args.corpus)
+        if model_fingerprint(args.model) in collected_by:
+            print('{} collected these captchas: the verified ones are exactly those it read correctly, '
+                  'so re-running it always scores 100%. Pass a different (retrained or quantized) model.'.format(args.model))
+            return 2
+        if '' in collected_by:
+            print('Note: some shards do not record the collecting model; if it is {}, the accuracy below is '
+                  'trivially 100%'.format(args.model))
+        if not verified:
+            print('No verified captchas to evaluate on')
+            return 1
+        rerun_ocr(verified, args.model, args.backend, args.top)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
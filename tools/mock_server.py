@@ -0,0 +1,420 @@
+# 本機模擬的 CnStdSel 選課系統，用於壓力測試、效能分析與離線測試
+#
+# usage: python tools/mock_server.py [--port 8000] [--captcha any|strict] [--captcha-dir DIR] [--latency MS]
+#
+# 啟動後將 CourseBot 的 base URL 指向 http://127.0.0.1:<port>/CnStdSel/
+# （命令列版與 GUI 版都可以用環境變數 YZU_BASE_URL 設定）。
+
+import os
+import sys
+import hmac
+import time
+import gzip
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from html import escape
+from urllib.parse import parse_qsl, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from captcha_ocr import N_CLASSES
+
+PREFIX = '/CnStdSel/'
+
+# 預設的模擬課程：dept -> [(課號, 班別, 學分, 語言, 課名, 名額)]
+DEFAULT_CATALOG = {
+    '304': [
+        ('CS201', 'A', 3, 'Chinese', '資料結構', 50),
+        ('CS201', 'B', 3, 'Chinese', '資料結構', 0),
+        ('CS352', 'A', 3, 'Chinese', '作業系統', 40),
+        ('CS354', 'A', 3, 'Chinese', '電腦與網路安全概論', 2),
+        ('CS375', 'A', 3, 'English', 'Machine Learning', 30),
+        ('CS380', 'A', 2, 'Chinese', '專題實驗', 10),
+    ],
+    '312': [
+        ('EEB219', 'A', 3, 'Chinese', '電子學(一)', 60),
+        ('EEB220', 'A', 3, 'Chinese', '電路學', 0),
+    ],
+    '901': [
+        ('LS239', 'A', 2, 'Chinese', '藝術與人生', 100),
+        ('LS240', 'A', 2, 'English', 'World Cultures', 100),
+    ],
+}
+
+ALERT_SUCCESS = '加選訊息：{} 加選成功'
+ALERT_SELECTED = '已選過此課程'
+ALERT_FULL = '加選失敗：課程人數已額滿'
+ALERT_LOGON = 'please log on again!'
+ALERT_NOT_OPEN = '選課系統尚未開放!'
+# 重試也不會成功的加選失敗，以 blocked={'CS380A': 'conflict'} 指定
+ALERT_BLOCKED = {
+    'conflict': '加選失敗：與已選課程衝堂',
+    'credits': '加選失敗：超過學分上限',
+    'ineligible': '加選失敗：不符合修課資格（限大三以上）',
+}
+
+
+def course_mUrl(dept, course):
+    code, cls, credits, language, name, _ = course
+    # 與實際系統相同的格式：SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 電腦與網路安全概論
+    return 'SelCos,{0},{1},1,F,{2},Y,{3},{0},{1},{2} {4}'.format(code, cls, credits, language, name)
+
+
+def render_captcha(label, size=(60, 200)):
+    """產生一張帶有雜訊的驗證碼 PNG"""
+    import numpy as np
+    import cv2
+
+    height, width = size
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    rng = np.random.default_rng()
+    for _ in range(6):
+        pt1 = tuple(int(v) for v in rng.integers(0, (width, height)))
+        pt2 = tuple(int(v) for v in rng.integers(0, (width, height)))
+        cv2.line(img, pt1, pt2, tuple(int(v) for v in rng.integers(0, 200, 3)), 1)
+    step = width // (len(label) + 1)
+    for i, char in enumerate(label):
+        color = tuple(int(v) for v in rng.integers(0, 150, 3))
+        cv2.putText(img, char, (step // 2 + i * step, int(height * 0.7)), cv2.FONT_HERSHEY_SIMPLEX, 1.2, color, 2)
+    ok, png = cv2.imencode('.png', img)
+    return png.tobytes()
+
+
+class MockCnStdSel:
+    """模擬選課系統的狀態（session、驗證碼、名額），可在同一個程式中直接呼叫或透過 HTTP 使用"""
+
+    def __init__(self, catalog=None, captcha='any', captcha_dir=None, captcha_length=4, captcha_size=(60, 200),
+                 viewstate_kb=40, latency_ms=0, open_at=None, relogin_every=0, seed=None, clock_skew=0.0, blocked=None,
+                 compress=True, stall_every=0, stall_ms=0):
+        self.catalog = catalog or DEFAULT_CATALOG
+        self.captcha = captcha  # 'any': 任何驗證碼都接受；'strict': 必須與答案相同
+        self.captcha_length = captcha_length
+        self.captcha_size = captcha_size
+        self.viewstate_kb = viewstate_kb
+        self.latency_ms = latency_ms
+        self.open_at = open_at  # epoch 秒（伺服器時間），在此之前登入頁顯示「選課系統尚未開放!」
+        self.clock_skew = clock_skew  # 伺服器時鐘比本機快幾秒（影響 Date header 與 open_at 的判斷）
+        self.relogin_every = relogin_every  # 每 N 次選課要求重新登入（0 = 不要求）
+        self.blocked = blocked or {}  # 課程代碼 -> ALERT_BLOCKED 的 key
+        self.compress = compress  # 用戶端要求時以 gzip 壓縮 HTML（與 IIS 相同）
+        self.stall_every = stall_every  # 每 N 個請求延遲 stall_ms 才回應，模擬卡住的連線（0 = 不延遲）
+        self.stall_ms = stall_ms
+        self.random = random.Random(seed)
+        self.key = os.urandom(16)
+        self.lock = threading.Lock()
+
+        self.sessions = {}
+        self.seats = {}
+        for dept, courses in self.catalog.items():
+            for course in courses:
+                self.seats[course_mUrl(dept, course)] = course[5]
+        self.courses = {course_mUrl(dept, course): course for dept, courses in self.catalog.items() for course in courses}
+
+        # 以檔名為答案的真實驗證碼圖片（例：7KQ2.png），沒有則即時產生
+        self.captcha_files = []
+        if captcha_dir:
+            for filename in sorted(os.listdir(captcha_dir)):
+                label = os.path.splitext(filename)[0].split('_')[0].upper()
+                with open(os.path.join(captcha_dir, filename), 'rb') as f:
+                    self.captcha_files.append((label, f.read()))
+
+        self.stats = {'requests': 0, 'logins': 0, 'login_failed': 0, 'selections': 0, 'stalled': 0}
+        self.received = 0
+
+    # ===== ViewState =====
+
+    def viewstate(self, page):
+        """產生簽章過的 ViewState，大小接近實際頁面"""
+        nonce = os.urandom(8).hex()
+        payload = '{}|{}'.format(page, nonce).encode()
+        sig = hmac.new(self.key, payload, hashlib.sha256).hexdigest()[:16].encode()
+        padding = os.urandom(max(self.viewstate_kb * 1024 * 3 // 4 - len(payload), 0))
+        return base64.b64encode(payload + b'|' + sig + b'|' + padding).decode()
+
+    def check_viewstate(self, value, page):
+        try:
+            raw = base64.b64decode(value)
+            page_name, nonce, sig = raw.split(b'|', 3)[:3]
+        except (ValueError, TypeError):
+            return False
+        payload = page_name + b'|' + nonce
+        expected = hmac.new(self.key, payload, hashlib.sha256).hexdigest()[:16].encode()
+        return page_name.decode() == page and hmac.compare_digest(sig, expected)
+
+    def hidden_fields(self, page):
+        return (
+            '<div class="aspNetHidden">\n'
+            '<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{}" />\n'
+            '</div>\n<div class="aspNetHidden">\n'
+            '<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="{}" />\n'
+            '<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{}" />\n'
+            '</div>\n'
+        ).format(self.viewstate(page), hashlib.md5(page.encode()).hexdigest()[:8].upper(),
+                 base64.b64encode(os.urandom(512)).decode())
+
+    # ===== 頁面 =====
+
+    @staticmethod
+    def page(title, body, script=None):
+        script = '<script type="text/javascript">{}</script>'.format(script) if script else ''
+        return ('<!DOCTYPE html>\n<html><head><title>{}</title>{}</head>\n<body>\n{}\n</body></html>'
+                .format(title, script, body))
+
+    @classmethod
+    def alert(cls, message, then=''):
+        return cls.page('Message', '', "alert('{}');{}".format(message, then))
+
+    def error_page(self, message):
+        return self.page('Error', "<h1>Server Error in '/' Application.</h1><h2>{}</h2>".format(escape(message)))
+
+    def login_page(self):
+        return self.page('元智大學選課系統', (
+            '<form method="post" action="./Index.aspx" id="form1">\n{}'
+            '<select name="DPL_SelCosType" id="DPL_SelCosType">\n'
+            '<option value="">請選擇</option>\n<option value="{}">初選</option>\n</select>\n'
+            '<input name="Txt_User" type="text" id="Txt_User" />\n'
+            '<input name="Txt_Password" type="password" id="Txt_Password" />\n'
+            '<input name="Txt_CheckCode" type="text" id="Txt_CheckCode" />\n'
+            '<input type="submit" name="btnOK" value="確定" id="btnOK" />\n</form>'
+        ).format(self.hidden_fields('Index'), 'S1'))
+
+    def course_list_page(self, dept=None):
+        rows = []
+        for course in self.catalog.get(dept, []):
+            mUrl = course_mUrl(dept, course)
+            rows.append('<tr><td><input type="image" name="{}" src="../images/add.gif" /></td>'
+                        '<td>{}{}</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+                            escape(mUrl), course[0], course[1], escape(course[4]), course[2], self.seats[mUrl]))
+        options = ''.join('<option value="{0}"{1}>{0}</option>'.format(d, ' selected="selected"' if d == dept else '')
+                          for d in self.catalog)
+        table = '<table id="CosListTable">\n{}\n</table>'.format('\n'.join(rows)) if dept else ''
+        return self.page('CosList', (
+            '<form method="post" action="./CosList.aspx" id="form1">\n{}'
+            '<select name="DPL_DeptName" id="DPL_DeptName">{}</select>\n'
+            '<select name="DPL_Degree" id="DPL_Degree"><option value="6">全部</option></select>\n{}\n</form>'
+        ).format(self.hidden_fields('CosList'), options, table))
+
+    # ===== session =====
+
+    def new_session(self):
+        session_id = base64.b32encode(os.urandom(15)).decode().lower()
+        self.sessions[session_id] = {'label': None, 'logged_in': False, 'selections': 0, 'clicked': None}
+        return session_id
+
+    def next_captcha(self):
+        if self.captcha_files:
+            return self.random.choice(self.captcha_files)
+        label = ''.join(self.random.choice(N_CLASSES) for _ in range(self.captcha_length))
+        return label, render_captcha(label, self.captcha_size)
+
+    def now(self):
+        return time.time() + self.clock_skew
+
+    def stall(self):
+        """這個請求是否要延遲回應（每 stall_every 個請求一次）"""
+        if not self.stall_every:
+            return False
+        with self.lock:
+            self.received += 1
+            if self.received % self.stall_every:
+                return False
+            self.stats['stalled'] += 1
+            return True
+
+    # ===== 請求處理 =====
+
+    def handle(self, method, path, query, form, session_id):
+        """回傳 (status, content_type, body_bytes, session_id)"""
+        with self.lock:
+            self.stats['requests'] += 1
+            session = self.sessions.get(session_id)
+            if session is None:
+                session_id = self.new_session()
+                session = self.sessions[session_id]
+
+            if path == 'SelRandomImage.aspx':
+                label, image = self.next_captcha()
+                session['label'] = label
+                return 200, 'image/png', image, session_id
+
+            if path == 'Index.aspx':
+                if self.open_at is not None and self.now() < self.open_at:
+                    return 200, 'text/html', self.page('元智大學選課系統', ALERT_NOT_OPEN), session_id
+                if method == 'GET':
+                    return 200, 'text/html', self.login_page(), session_id
+                return 200, 'text/html', self.login(session, form), session_id
+
+            if path == 'SelCurr/CosList.aspx':
+                if not session['logged_in']:
+                    return 200, 'text/html', self.alert(ALERT_LOGON, "parent.location='../Index.aspx';"), session_id
+                if method == 'GET':
+                    return 200, 'text/html', self.course_list_page(), session_id
+                return 200, 'text/html', self.course_list_post(session, form), session_id
+
+            if path == 'SelCurr/CurrMainTrans.aspx':
+                return 200, 'text/html', self.select(session, query), session_id
+
+            return 404, 'text/html', self.error_page('The resource cannot be found.'), session_id
+
+    def login(self, session, form):
+        if not self.check_viewstate(form.get('__VIEWSTATE', ''), 'Index'):
+            return self.error_page('Validation of viewstate MAC failed.')
+        if self.captcha == 'strict' and form.get('Txt_CheckCode', '').upper() != (session['label'] or '').upper():
+            self.stats['login_failed'] += 1
+            return self.alert('驗證碼錯誤!')
+        if not form.get('Txt_User') or form.get('Txt_Password') == 'wrong':
+            self.stats['login_failed'] += 1
+            return self.alert('資料庫發生異常')
+        session['logged_in'] = True
+        session['selections'] = 0
+        self.stats['logins'] += 1
+        return self.alert('登入成功', "parent.location ='SelCurr.aspx?Culture=zh-tw';")
+
+    def course_list_post(self, session, form):
+        if not self.check_viewstate(form.get('__VIEWSTATE', ''), 'CosList'):
+            return self.error_page('Validation of viewstate MAC failed.')
+        dept = form.get('DPL_DeptName', '')
+        if dept not in self.catalog:
+            return self.error_page('Invalid department.')
+        # 點擊課程的圖片按鈕（name.x / name.y）
+        for field in form:
+            if field.endswith('.x') and field[:-2] in self.courses:
+                session['clicked'] = field[:-2]
+        return self.course_list_page(dept)
+
+    def select(self, session, query):
+        if not session['logged_in']:
+            return self.alert(ALERT_LOGON, "parent.location='../Index.aspx';")
+        if self.relogin_every and session['selections'] >= self.relogin_every:
+            session['logged_in'] = False
+            return self.alert(ALERT_LOGON, "parent.location='../Index.aspx';")
+        session['selections'] += 1
+        self.stats['selections'] += 1
+
+        mUrl = query.get('mUrl', '').rsplit(' ,B,', 1)[0]
+        if mUrl not in self.courses:
+            return self.alert('加選失敗：查無此課程')
+        selected = session.setdefault('selected', set())
+        if mUrl in selected:
+            return self.alert(ALERT_SELECTED)
+        code, cls, _, _, name, _ = self.courses[mUrl]
+        if code + cls in self.blocked:
+            return self.alert(ALERT_BLOCKED[self.blocked[code + cls]])
+        if self.seats[mUrl] <= 0:
+            return self.alert(ALERT_FULL)
+        self.seats[mUrl] -= 1
+        selected.add(mUrl)
+        return self.alert(ALERT_SUCCESS.format(code + cls + ' ' + name))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def date_time_string(self, timestamp=None):
+        # Date header 使用模擬的伺服器時鐘
+        return super().date_time_string(self.mock.now() if timestamp is None else timestamp)
+
+    def _respond(self, method):
+        url = urlsplit(self.path)
+        if not url.path.startswith(PREFIX):
+            self.send_error(404)
+            return
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        form = {}
+        if method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            form = dict(parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True))
+
+        cookies = dict(c.strip().split('=', 1) for c in self.headers.get('Cookie', '').split(';') if '=' in c)
+        if self.mock.latency_ms:
+            time.sleep(self.mock.latency_ms / 1000)
+        if self.mock.stall():
+            time.sleep(self.mock.stall_ms / 1000)
+        status, content_type, body, session_id = self.mock.handle(
+            method, url.path[len(PREFIX):], query, form, cookies.get('ASP.NET_SessionId'))
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+            content_type += '; charset=utf-8'
+        compressed = (self.mock.compress and content_type.startswith('text/')
+                      and 'gzip' in self.headers.get('Accept-Encoding', ''))
+        if compressed:
+            body = gzip.compress(body, compresslevel=6)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        if cookies.get('ASP.NET_SessionId') != session_id:
+            self.send_header('Set-Cookie', 'ASP.NET_SessionId={}; path=/; HttpOnly'.format(session_id))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        try:
+            self._respond('GET')
+        except (BrokenPipeError, ConnectionResetError):
+            # 用戶端取消了請求（例如 asyncio 引擎被停止）
+            pass
+
+    def do_POST(self):
+        try:
+            self._respond('POST')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_mock_server(host='127.0.0.1', port=0, **options):
+    """在背景執行緒啟動模擬伺服器，回傳 (server, mock, base_url)；結束時呼叫 server.shutdown()"""
+    mock = MockCnStdSel(**options)
+    handler = type('Handler', (_Handler,), {'mock': mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://{}:{}{}'.format(host, server.server_address[1], PREFIX)
+    return server, mock, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline mock of the YZU CnStdSel course selection system')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--captcha', choices=('any', 'strict'), default='any',
+                        help="'strict' only accepts the correct captcha")
+    parser.add_argument('--captcha-dir', help='serve labeled captcha images from this directory')
+    parser.add_argument('--viewstate-kb', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0, help='extra latency per request (ms)')
+    parser.add_argument('--open-in', type=float, default=None, help='system opens N seconds after start')
+    parser.add_argument('--relogin-every', type=int, default=0, help='require a new login every N selections')
+    parser.add_argument('--clock-skew', type=float, default=0, help='server clock runs N seconds ahead of this machine')
+    parser.add_argument('--no-gzip', action='store_true', help='never compress responses')
+    parser.add_argument('--stall-every', type=int, default=0, help='hold every Nth request for --stall-ms')
+    parser.add_argument('--stall-ms', type=float, default=30000)
+    parser.add_argument('--blocked', action='append', default=[], metavar='COURSE=REASON',
+                        help='always reject a course, REASON is conflict, credits or ineligible (repeatable)')
+    args = parser.parse_args()
+
+    server, mock, base_url = start_mock_server(
+        args.host, args.port, captcha=args.captcha, captcha_dir=args.captcha_dir, viewstate_kb=args.viewstate_kb,
+        latency_ms=args.latency, open_at=time.time() + args.clock_skew + args.open_in if args.open_in is not None else None,
+        relogin_every=args.relogin_every, clock_skew=args.clock_skew,
+        blocked=dict(item.split('=', 1) for item in args.blocked), compress=not args.no_gzip,
+        stall_every=args.stall_every, stall_ms=args.stall_ms)
+    print('Mock CnStdSel running at {}'.format(base_url))
+    print('set YZU_BASE_URL={}'.format(base_url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
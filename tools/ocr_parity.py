@@ -0,0 +1,61 @@
+# 比對 keras 與 numpy 兩種 OCR 後端在同一組驗證碼圖片上的辨識結果
+#
+# usage: python tools/ocr_parity.py <captcha_dir> [--model model.h5]
+#
+# 圖片檔名若以驗證碼內容開頭（例：`7KQ2.png`、`7KQ2_001.png`），會一併統計辨識正確率。
+# 任一張圖片兩個後端結果不同時，結束代碼為 1。
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from captcha_ocr import decode_captcha
+from yzuCourseBot import CourseBot
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR backend parity check')
+    parser.add_argument('captcha_dir')
+    parser.add_argument('--model', default='model.h5')
+    args = parser.parse_args()
+
+    files = sorted(f for f in os.listdir(args.captcha_dir) if f.lower().endswith(IMAGE_EXTS))
+    if not files:
+        print('No captcha images found in', args.captcha_dir)
+        return 1
+
+    kerasBot = CourseBot('', '', ocrBackend='keras', modelPath=args.model)
+    numpyBot = CourseBot('', '', ocrBackend='numpy', modelPath=args.model)
+
+    mismatches = 0
+    correct = {'keras': 0, 'numpy': 0}
+    labeled = 0
+    for filename in files:
+        with open(os.path.join(args.captcha_dir, filename), 'rb') as f:
+            img = decode_captcha(f.read())
+        kerasStr = kerasBot.predict(img)
+        numpyStr = numpyBot.predict(img)
+
+        label = os.path.splitext(filename)[0].split('_')[0].upper()
+        if len(label) == len(kerasStr):
+            labeled += 1
+            correct['keras'] += kerasStr == label
+            correct['numpy'] += numpyStr == label
+
+        if kerasStr != numpyStr:
+            mismatches += 1
+            print('MISMATCH {}: keras={} numpy={}'.format(filename, kerasStr, numpyStr))
+
+    print('{} images, {} mismatches'.format(len(files), mismatches))
+    if labeled:
+        for backend, n in correct.items():
+            print('{} accuracy: {:.2%} ({}/{})'.format(backend, n / labeled, n, labeled))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# 將驗證碼模型的 Conv2D / Dense 權重量化成 int8（逐輸出通道的對稱量化）或 float16，並評估正確率
+#
+# usage: python tools/quantize_model.py [model.h5] [--mode int8|float16|all] [--eval captcha_dir] [--floor 0.98]
+#
+# 輸出 model.int8.h5 / model.float16.h5：結構與 model.h5 相同（不含 optimizer 狀態），只能以 numpy 後端載入。
+# 指定 --eval 時，以標記好的驗證碼圖片（檔名以驗證碼內容開頭，例：7KQ2.png、7KQ2_001.png）比較原本與
+# 量化模型的逐字元 / 整張正確率、與原模型的一致率、推論延遲與記憶體，並將結果寫入量化模型檔。
+# CourseBot（numpy 後端）設定 ocrAccuracyFloor 時，只會使用評估過且逐字元正確率不低於門檻的量化模型。
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import h5py
+import numpy as np
+
+from captcha_ocr import (QUANTIZED_MODES, CaptchaPredictor, NumpyCaptchaModel, choose_model, decode_captcha,
+                         decode_prediction, quantized_path)
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+
+def quantize_kernel(kernel, mode):
+    """回傳 (量化後的權重, scale)；int8 以最後一軸（輸出通道）為單位，float16 沒有 scale"""
+    if mode == 'float16':
+        return kernel.astype(np.float16), None
+    axes = tuple(range(kernel.ndim - 1))
+    scale = np.abs(kernel).max(axis=axes) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def write_quantized(src, dst, mode):
+    tmp = dst + '.tmp'
+    with h5py.File(src, 'r') as fin, h5py.File(tmp, 'w') as fout:
+        for key, value in fin.attrs.items():
+            fout.attrs[key] = value
+        fout.attrs['quantization'] = mode
+
+        def copy(name, obj):
+            # HDF5 刪除 dataset 不會縮小檔案，逐一寫入而不是複製後再取代 kernel
+            if isinstance(obj, h5py.Group):
+                target = fout.require_group(name)
+            elif name.split('/')[-1].split(':')[0] == 'kernel':
+                q, scale = quantize_kernel(obj[()], mode)
+                target = fout.create_dataset(name, data=q)
+                if scale is not None:
+                    target.attrs['scale'] = scale
+            else:
+                target = fout.create_dataset(name, data=obj[()])
+            for key, value in obj.attrs.items():
+                target.attrs[key] = value
+
+        for name in fin:
+            # optimizer 狀態只有繼續訓練時才需要
+            if name != 'optimizer_weights':
+                copy(name, fin[name])
+                if isinstance(fin[name], h5py.Group):
+                    fin[name].visititems(lambda child, obj, parent=name: copy(parent + '/' + child, obj))
+    os.replace(tmp, dst)
+
+
+def load_labeled(captcha_dir):
+    images, labels = [], []
+    for filename in sorted(os.listdir(captcha_dir)):
+        if not filename.lower().endswith(IMAGE_EXTS):
+            continue
+        with open(os.path.join(captcha_dir, filename), 'rb') as f:
+            images.append(decode_captcha(f.read()))
+        labels.append(os.path.splitext(filename)[0].split('_')[0].upper())
+    return images, labels
+
+
+def evaluate(path, images, labels, reference=None):
+    """回傳 (評估結果, 每張的辨識結果)；reference 為原模型的辨識結果，用來計算一致率"""
+    tracemalloc.start()
+    model = NumpyCaptchaModel.from_h5(path)
+    load_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    predictor = CaptchaPredictor(model, 'numpy')
+    predictor.warm_up()
+    texts, latencies = [], []
+    for img in images:
+        start = time.perf_counter()
+        texts.append(decode_prediction(predictor(img)))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    chars = sum(len(label) for label in labels)
+    result = {
+        'samples': len(images),
+        'char_accuracy': sum(a == b for text, label in zip(texts, labels) for a, b in zip(text, label)) / chars,
+        'captcha_accuracy': sum(text == label for text, label in zip(texts, labels)) / len(labels),
+        'agreement': 1.0 if reference is None else
+                     sum(a == b for text, ref in zip(texts, reference) for a, b in zip(text, ref)) / chars,
+        'latency_p50_ms': latencies[len(latencies) // 2],
+        'latency_p90_ms': latencies[max(0, int(round(len(latencies) * 0.9)) - 1)],
+        'weight_bytes': model.weight_bytes,
+        'load_peak_bytes': load_peak,
+        'file_bytes': os.path.getsize(path),
+    }
+    return result, texts
+
+
+def print_result(name, result, floor=None):
+    verdict = ''
+    if floor is not None:
+        verdict = 'PASS' if result['char_accuracy'] >= floor else 'FAIL'
+    print('  {:<9} char {:7.2%}  captcha {:7.2%}  agree {:7.2%}  p50 {:6.1f} ms  p90 {:6.1f} ms  '
+          'weights {:7.0f} KB  load peak {:7.0f} KB  file {:7.0f} KB  {}'.format(
+              name, result['char_accuracy'], result['captcha_accuracy'], result['agreement'],
+              result['latency_p50_ms'], result['latency_p90_ms'], result['weight_bytes'] / 1024,
+              result['load_peak_bytes'] / 1024, result['file_bytes'] / 1024, verdict))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize the captcha model and gate it on accuracy')
+    parser.add_argument('model', nargs='?', default='model.h5')
+    parser.add_argument('--mode', choices=QUANTIZED_MODES + ('all',), default='all')
+    parser.add_argument('--eval', metavar='CAPTCHA_DIR', help='labeled captcha images to evaluate on')
+    parser.add_argument('--floor', type=float, default=None,
+                        help='per-character accuracy a quantized model must reach (as ocrAccuracyFloor)')
+    args = parser.parse_args()
+
+    modes = QUANTIZED_MODES if args.mode == 'all' else (args.mode,)
+    for mode in modes:
+        write_quantized(args.model, quantized_path(args.model, mode), mode)
+        print('wrote {}'.format(quantized_path(args.model, mode)))
+
+    if not args.eval:
+        return 0
+    images, labels = load_labeled(args.eval)
+    if not images:
+        print('No captcha images found in', args.eval)
+        return 1
+
+    print('{} labeled captchas'.format(len(images)))
+    baseline, reference = evaluate(args.model, images, labels)
+    print_result('float32', baseline)
+    for mode in modes:
+        path = quantized_path(args.model, mode)
+        result, _ = evaluate(path, images, labels, reference)
+        result['baseline_char_accuracy'] = baseline['char_accuracy']
+        print_result(mode, result, args.floor)
+        with h5py.File(path, 'a') as f:
+            for key, value in result.items():
+                f.attrs['eval_' + key] = value
+
+    if args.floor is not None:
+        chosen, _ = choose_model(args.model, 'numpy', args.floor)
+        print('ocrAccuracyFloor={} -> CourseBot loads {}'.format(args.floor, chosen))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# HTTP 連線層：CourseBot 的 requests.Session 加上逾時、連線池與 GET 重試，並統計每個請求的位元組與延遲
+#
+# - connect / read 逾時：卡住的 TCP 連線不會讓 selectCourses 永遠停住，逾時丟出 requests.Timeout
+# - 連線池：同一台主機的 keep-alive 連線重複使用，POOL_SIZE 涵蓋登入時背景下載登入頁的連線
+# - 壓縮：requests 預設即送出 Accept-Encoding: gzip, deflate；ViewState 很大的頁面壓縮後小很多，wire_bytes 統計實際傳輸量
+# - 只重試 GET：連線錯誤、逾時或 502 / 503 / 504 時以有上限、加上 jitter 的指數退避重試。
+#   POST（登入、系所 postback、點選課程）不重試；選課的 GET 會改變伺服器狀態，呼叫時以 retries=0 關閉重試
+# - 每分鐘請求上限：傳入 scheduler.RequestBudget 時，每個送出的請求（包含重試）都先扣除 1 個額度
+
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 5.0   # 秒
+READ_TIMEOUT = 20.0     # 秒，尖峰時段伺服器回應很慢，但不能無限等待
+POOL_SIZE = 4           # 每台主機保留的 keep-alive 連線數
+GET_RETRIES = 2
+RETRY_BACKOFF = 0.25    # 第 n 次重試前等待 uniform(0, RETRY_BACKOFF * 2 ** n) 秒
+RETRY_BACKOFF_MAX = 2.0
+RETRY_STATUS = (502, 503, 504)
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'retries', 'errors', 'bytes_out', 'bytes_in', 'wire_bytes', 'seconds', 'max_seconds')
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.bytes_out = 0    # request body
+        self.bytes_in = 0     # 解壓縮後的 response body
+        self.wire_bytes = 0   # 實際傳輸的 response body（壓縮後）
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TransportStats:
+    """以 'GET Index.aspx' 這樣的 method + 頁面名稱分類累計，thread-safe（登入頁在背景執行緒下載）"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def _endpoint(self, method, url):
+        name = '{} {}'.format(method, urlsplit(url).path.rsplit('/', 1)[-1])
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def record(self, method, url, seconds, response=None, bytes_out=0, retry=False):
+        with self.lock:
+            stats = self._endpoint(method, url)
+            stats.requests += 1
+            stats.retries += retry
+            stats.bytes_out += bytes_out
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if response is None:
+                stats.errors += 1
+                return
+            stats.bytes_in += len(response.content)
+            stats.wire_bytes += wire_bytes(response)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: stats.as_dict() for name, stats in self.endpoints.items()}
+
+    def summary_lines(self):
+        lines = []
+        for name, stats in sorted(self.snapshot().items()):
+            lines.append('{:<32} {:>5} req {:>3} retry {:>3} err  {:>8.1f} KB in ({:>8.1f} KB wire)  {:>7.1f} KB out  '
+                         'avg {:>6.1f} ms  max {:>7.1f} ms'.format(
+                             name, stats['requests'], stats['retries'], stats['errors'], stats['bytes_in'] / 1024,
+                             stats['wire_bytes'] / 1024, stats['bytes_out'] / 1024,
+                             stats['seconds'] / stats['requests'] * 1000, stats['max_seconds'] * 1000))
+        return lines
+
+
+def wire_bytes(response):
+    """response body 實際傳輸的位元組數（壓縮時為壓縮後的大小）；也接受 httpx 的 response"""
+    downloaded = getattr(response, 'num_bytes_downloaded', None)
+    if downloaded is not None:
+        return downloaded
+    raw = response.raw
+    if raw is not None and hasattr(raw, 'tell'):
+        try:
+            return raw.tell()
+        except (OSError, ValueError):
+            pass
+    return int(response.headers.get('Content-Length') or len(response.content))
+
+
+def _body_size(kwargs):
+    body = kwargs.get('data')
+    if isinstance(body, dict):
+        # 與 requests 編碼後的長度相近即可
+        return sum(len(str(k)) + len(str(v)) + 2 for k, v in body.items())
+    if isinstance(body, (str, bytes)):
+        return len(body)
+    return 0
+
+
+class RequestCancelled(requests.RequestException):
+    """等待請求額度時使用者按下停止，請求沒有送出"""
+
+
+class HttpSession(requests.Session):
+    """CourseBot 使用的 requests.Session，介面相同；統計資料在 self.stats"""
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, pool_size=POOL_SIZE,
+                 get_retries=GET_RETRIES, sleep=time.sleep, budget=None, budget_sleep=time.sleep):
+        super().__init__()
+        self.timeout = (connect_timeout, read_timeout)
+        self.get_retries = get_retries
+        self.sleep = sleep
+        # budget_sleep 回傳 True（例如 stop_event.wait）時放棄等待，丟出 RequestCancelled
+        self.budget = budget
+        self.budget_sleep = budget_sleep
+        self.stats = TransportStats()
+        # 重試由 request() 處理（只限 GET），adapter 本身不重試
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, *args, retries=None, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if retries is None:
+            retries = self.get_retries if method.upper() == 'GET' else 0
+        bytes_out = _body_size(kwargs)
+
+        for attempt in range(retries + 1):
+            if attempt:
+                self.sleep(random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt)))
+            if self.budget is not None and not self.budget.acquire(1, self.budget_sleep):
+                raise RequestCancelled('stopped while waiting for the request budget')
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.stats.record(method, url, time.perf_counter() - start, None, bytes_out, attempt > 0)
+                if attempt == retries:
+                    raise
+                continue
+            self.stats.record(method, url, time.perf_counter() - start, response, bytes_out, attempt > 0)
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                return response
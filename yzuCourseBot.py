@@ -1,47 +1,98 @@
 # cmd line version
 
 import os
-import cv2
 import time
 import requests
-import numpy as np
 import configparser
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
-from keras.models import load_model
-import tensorflow as tf
+from aspnet_fields import MissingFieldError, extract_first_script, extract_hidden_fields, extract_select_options
+from course_cache import DEFAULT_TTL, CourseCache, current_semester
+from course_catalog import CourseCatalog, CourseRecord, records_from_cache
+from captcha_ocr import N_CLASSES, choose_model, decode_captcha, decode_prediction, get_predictor
+from ocr_daemon import OcrClient
+from captcha_corpus import CaptchaCorpus, model_fingerprint
+from metrics import StageMetrics
+from transport import HttpSession
+from scheduler import AttemptScheduler, RequestBudget, parse_course
+from alerts import FINAL_FAILURES, classify_alert
+from opening import OpeningWindow
+import session_store
+
+# the course selection system, override with YZU_BASE_URL to run against tools/mock_server.py
+DEFAULT_BASE_URL = os.environ.get('YZU_BASE_URL', 'https://isdna1.yzu.edu.tw/CnStdSel/')
 
 class CourseBot:
-    def __init__(self, account, password):
+    def __init__(self, account, password, ocrBackend='keras', modelPath='model.h5', ocrThreshold=0.0,
+                 cachePath='coursesCache.json', cacheTTL=DEFAULT_TTL, semester=None, baseUrl=DEFAULT_BASE_URL,
+                 metricsPath=None, requestsPerMinute=None, openTime=None, sessionPath=None, ocrAccuracyFloor=None,
+                 captchaCorpusPath=None, ocrSocket=None):
         self.account = account
         self.password = password
-        self.coursesDB = {}
-
-        # for keras - 直接載入模型但不編譯
-        try:
-            self.model = load_model('model.h5')
-        except ValueError as e:
-            if 'lr' in str(e):
-                # 直接載入模型但跳過編譯
-                self.model = load_model('model.h5', compile=False)
-                # 手動重新編譯
-                self.model.compile(
-                    optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-                    loss='categorical_crossentropy',
-                    metrics=['accuracy']
-                )
-            else:
-                raise e
-        
-        self.n_classes = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-
-        # for requests
-        self.session = requests.Session()
+        self.coursesDB = CourseCatalog()
+
+        # local course catalog cache, keyed by semester and department (cachePath=None disables it)
+        self.courseCache = CourseCache(cachePath, cacheTTL) if cachePath else None
+        self.semester = semester or current_semester()
+        self.cachedDepts = set()
+
+        # per-stage latency histograms, exported to metricsPath + '.json' / '.prom' when set
+        self.metrics = StageMetrics()
+        self.metricsPath = metricsPath
+
+        # use model.int8.h5 / model.float16.h5 (tools/quantize_model.py) when its evaluated
+        # per-character accuracy reaches ocrAccuracyFloor, numpy backend only
+        modelPath, modelEval = choose_model(modelPath, ocrBackend, ocrAccuracyFloor)
+        if modelEval is not None:
+            self.log('Using quantized OCR model {}: char accuracy {:.2%} on {:.0f} captchas (float32 {:.2%})'.format(
+                modelPath, modelEval['char_accuracy'], modelEval['samples'], modelEval['baseline_char_accuracy']))
+
+        self.modelPath = modelPath
+        self.ocrBackend = ocrBackend
+
+        # a running ocr_daemon.py with the same model already has it loaded and warmed up
+        self.ocrClient = OcrClient.connect(ocrSocket) if ocrSocket else None
+        if self.ocrClient is not None and not self.ocrClient.serves(modelPath, ocrBackend):
+            self.log('OCR daemon at {} serves {} ({}), loading {} here'.format(
+                ocrSocket, self.ocrClient.info.get('model'), self.ocrClient.info.get('backend'), modelPath))
+            self.ocrClient.close()
+            self.ocrClient = None
+
+        if self.ocrClient is not None:
+            self.predictor = self.model = None
+            self.log('Using OCR daemon at {} (pid {}): skipped {:.0f} ms of model loading and warm-up'.format(
+                ocrSocket, self.ocrClient.info['pid'], self.ocrClient.info['load_ms']))
+        else:
+            self.loadPredictor()
+
+        self.n_classes = N_CLASSES
+
+        # captchas whose least confident character is below this are refetched instead of submitted
+        self.ocrThreshold = ocrThreshold
+        self.maxCaptchaRefetch = 5
+        self.loginStats = {'captchas': 0, 'skipped': 0, 'posts': 0, 'success': 0}
+
+        # downloads the login page while the captcha is being decoded
+        self.loginPrefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix='login-page')
+
+        # opt-in: keep every captcha with its prediction and login outcome (tools/captcha_report.py)
+        self.captchaCorpus = CaptchaCorpus(captchaCorpusPath, model=model_fingerprint(modelPath)) if captchaCorpusPath else None
+
+        # opening time of the selection system ('YYYY-MM-DD HH:MM'), judged by the server's clock
+        self.opening = OpeningWindow(openTime)
+
+        # hard cap on traffic in requests per minute (None = unlimited), charged by the session on every request sent
+        self.requestBudget = RequestBudget(requestsPerMinute)
+
+        # for requests: connect/read timeouts, keep-alive pool, retried GETs and the request budget, see transport.py
+        self.session = HttpSession(budget=self.requestBudget)
         self.session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36'
 
-        self.loginUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/Index.aspx'
-        self.captchaUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/SelRandomImage.aspx'
-        self.courseListUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/SelCurr/CosList.aspx'
-        self.courseSelectUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/SelCurr/CurrMainTrans.aspx?mSelType=SelCos&mUrl='
+        baseUrl = baseUrl.rstrip('/') + '/'
+        self.loginUrl = baseUrl + 'Index.aspx'
+        self.captchaUrl = baseUrl + 'SelRandomImage.aspx'
+        self.courseListUrl = baseUrl + 'SelCurr/CosList.aspx'
+        self.courseSelectUrl = baseUrl + 'SelCurr/CurrMainTrans.aspx?mSelType=SelCos&mUrl='
 
         self.loginPayLoad = {
             '__VIEWSTATE': '',
@@ -56,52 +107,195 @@ class CourseBot:
 
         self.selectPayLoad = {}
 
-    def predict(self, img):
-        prediction = self.model.predict(np.array([img]))
+        # last valid postback state (hidden fields) of each department listing, reused across attempts
+        self.deptState = {}
+        self.selectStats = {'attempts': 0, 'requests': 0, 'refreshes': 0}
 
-        predicStr = ""
-        for pred in prediction:
-            predicStr += self.n_classes[np.argmax(pred[0])]
-        return predicStr
-
-    def captchaOCR(self):
-        captchaImg = cv2.imread('captcha.png') / 255.0
-        return self.predict(captchaImg)
+        # encrypted cookies + postback state, reused by the next run (sessionPath=None disables it)
+        self.sessionStore = None
+        if sessionPath:
+            if session_store.available():
+                self.sessionStore = session_store.SessionStore(sessionPath, account, password)
+            else:
+                self.log('cryptography is not installed, session persistence disabled')
+
+    def loadPredictor(self):
+        # 'keras' 使用 TensorFlow 載入模型，'numpy' 只用 h5py 讀取權重，不會 import TensorFlow
+        self.predictor = get_predictor(self.modelPath, self.ocrBackend)
+        self.model = self.predictor.model
+
+        # warm up the model so the first captcha after login isn't the slowest
+        firstMs, steadyMs = self.predictor.warm_up()
+        self.log('OCR model ready ({}): first call {:.1f} ms, steady {:.1f} ms'.format(self.ocrBackend, firstMs, steadyMs))
+
+    def predict(self, img, withConfidence=False):
+        prediction = self.predictor(img)
+        return decode_prediction(prediction, self.n_classes, withConfidence)
+
+    # return the captcha string and the per-character softmax confidences
+    def captchaOCR(self, captchaBytes):
+        with self.metrics.span('captcha_ocr'):
+            if self.ocrClient is not None:
+                try:
+                    return self.ocrClient.ocr(captchaBytes)
+                except (OSError, ValueError) as e:
+                    # connection lost, or the daemon answered with an error / a malformed reply
+                    self.log('OCR daemon unavailable ({}), falling back to in-process OCR'.format(e))
+                    self.ocrClient.close()
+                    self.ocrClient = None
+                    self.loadPredictor()
+            captchaImg = decode_captcha(captchaBytes)
+            return self.predict(captchaImg, withConfidence=True)
+
+    def recordCaptcha(self, captchaBytes, captcha, confidence, outcome, flush=False):
+        if self.captchaCorpus is not None:
+            self.captchaCorpus.add(captchaBytes, captcha, confidence, outcome)
+            if flush:
+                self.captchaCorpus.flush()
+
+    def exportMetrics(self):
+        if self.metricsPath:
+            self.metrics.export(self.metricsPath)
+
+    def logLoginStats(self):
+        stats = self.loginStats
+        rate = stats['success'] / stats['posts'] if stats['posts'] else 0
+        self.log('Login stats: {} captchas, {} low-confidence refetched (login POSTs saved), {} POSTs, success rate {:.0%}'.format(
+            stats['captchas'], stats['skipped'], stats['posts'], rate))
+
+    def saveSession(self):
+        if self.sessionStore is not None:
+            self.sessionStore.save({
+                'loginUrl': self.loginUrl,
+                'cookies': session_store.dump_cookies(self.session.cookies),
+                'selectPayLoad': self.selectPayLoad,
+                'deptState': self.deptState,
+            })
+
+    # reuse the session of the previous run, returns False when login() is needed
+    def resumeSession(self):
+        if self.sessionStore is None:
+            return False
+        state = self.sessionStore.load()
+        if state is None or state.get('loginUrl') != self.loginUrl:
+            return False
+
+        self.session.cookies.clear()
+        session_store.load_cookies(self.session.cookies, state['cookies'])
+        try:
+            html = self.session.get(self.courseListUrl)
+        except requests.RequestException as e:
+            self.log('Checking the saved session failed ({}), login again'.format(e))
+            self.session.cookies.clear()
+            return False
+        if 'please log on again!' in html.text:
+            self.log('Saved session expired, login again')
+            self.session.cookies.clear()
+            self.sessionStore.clear()
+            return False
+
+        self.selectPayLoad.update(state['selectPayLoad'])
+        self.deptState.update(state['deptState'])
+        self.log('Reusing saved session (saved {:.0f} s ago)'.format(time.time() - state['savedAt']))
+        return True
+
+    # sleep until shortly before the opening time, re-syncing with the server clock on long waits
+    def waitForOpening(self):
+        while self.opening.open_at is not None:
+            if not self.opening.clock.samples or self.opening.sleep_before() > 0:
+                try:
+                    self.opening.clock.observe(self.session.get(self.loginUrl))
+                except requests.RequestException as e:
+                    # keep the last clock offset, the next wait re-syncs
+                    self.log('Server clock check failed ({})'.format(e))
+            wait = self.opening.sleep_before()
+            if wait <= 0:
+                return
+            self.log('選課系統尚未開放，{:.0f} 秒後開始準備 (server clock offset {:+.1f}s)'.format(
+                self.opening.until_open() - self.opening.lead, self.opening.clock.offset))
+            time.sleep(wait)
+
+    def fetchLoginPage(self):
+        with self.metrics.span('login_page'):
+            return self.session.get(self.loginUrl)
 
     # login into system and get session
     def login(self):
-        
-        while True:
-            # clear Session object
-            self.session.cookies.clear()
+        lowConfidence = 0
+        captcha = None
+        loginPage = None
+        self.waitForOpening()
 
-            # download and recognize captch
-            with self.session.get(self.captchaUrl, stream= True) as captchaHtml:
-                with open('captcha.png', 'wb') as img:
-                    img.write(captchaHtml.content)
-            captcha = self.captchaOCR()
-
-            # get login data
-            loginHtml = self.session.get(self.loginUrl)
+        while True:
+            try:
+                # a decoded captcha is kept (with its session) while waiting for the system to open
+                if captcha is None:
+                    # clear Session object
+                    self.session.cookies.clear()
+
+                    # download and recognize captch (decoded in memory, no captcha.png)
+                    with self.metrics.span('captcha_download'):
+                        captchaHtml = self.session.get(self.captchaUrl)
+                    self.opening.clock.observe(captchaHtml)
+
+                    # the captcha GET starts the session, the login page is downloaded while the captcha is decoded
+                    loginPage = self.loginPrefetch.submit(self.fetchLoginPage)
+                    captchaBytes = captchaHtml.content
+                    captcha, confidence = self.captchaOCR(captchaBytes)
+                    self.loginStats['captchas'] += 1
+
+                    # likely misread: fetch a new captcha instead of spending a login POST
+                    if confidence.min() < self.ocrThreshold and lowConfidence < self.maxCaptchaRefetch:
+                        lowConfidence += 1
+                        self.loginStats['skipped'] += 1
+                        self.log('Low captcha confidence {} ({:.2f}), refetch'.format(captcha, confidence.min()))
+                        self.recordCaptcha(captchaBytes, captcha, confidence, 'skipped')
+                        captcha = None
+                        # don't clear the cookies under the request still in flight
+                        loginPage.result()
+                        continue
+                    lowConfidence = 0
+
+                # get login data (already in flight when a new captcha was just fetched)
+                loginHtml = loginPage.result() if loginPage is not None else self.fetchLoginPage()
+            except requests.RequestException as e:
+                # the captcha or the login page timed out, start over with a new captcha
+                self.log('Login page request failed ({}), re-try'.format(e))
+                captcha = loginPage = None
+                continue
+            loginPage = None
+            self.opening.clock.observe(loginHtml)
             
-            # check if system is open
+            # check if system is open, poll again with backoff instead of spinning
             if '選課系統尚未開放!' in loginHtml.text:
-                self.log('選課系統尚未開放!')
+                wait = self.opening.next_poll()
+                self.log('選課系統尚未開放! {:.1f} 秒後再試'.format(wait))
+                time.sleep(wait)
                 continue
+            self.opening.opened()
 
-            # use BeautifulSoup to parse html
-            parser = BeautifulSoup(loginHtml.text, 'lxml')
-
-            # update login payload
-            self.loginPayLoad['__VIEWSTATE'] = parser.select("#__VIEWSTATE")[0]['value']
-            self.loginPayLoad['__VIEWSTATEGENERATOR'] = parser.select("#__VIEWSTATEGENERATOR")[0]['value']
-            self.loginPayLoad['__EVENTVALIDATION'] = parser.select("#__EVENTVALIDATION")[0]['value']
-            self.loginPayLoad['DPL_SelCosType'] = parser.select("#DPL_SelCosType option")[1]['value']
+            # update login payload (only scan for the hidden fields, no full html parse)
+            self.loginPayLoad.update(extract_hidden_fields(loginHtml.text))
+            self.loginPayLoad['DPL_SelCosType'] = extract_select_options(loginHtml.text, 'DPL_SelCosType')[1]
             self.loginPayLoad['Txt_CheckCode'] = captcha
-
-            result = self.session.post(self.loginUrl, data= self.loginPayLoad)
+            captcha = None
+
+            try:
+                with self.metrics.span('login_post'):
+                    result = self.session.post(self.loginUrl, data= self.loginPayLoad)
+            except requests.RequestException as e:
+                # the POST is not resent as is, start over with a new captcha
+                self.log('Login request failed ({}), re-try'.format(e))
+                continue
+            self.loginStats['posts'] += 1
             if ("parent.location ='SelCurr.aspx?Culture=zh-tw'" in result.text): #成功登入訊息可能一直改，挑個不太能改的
-                self.log('Login Successful! {}'.format(captcha))
+                self.loginStats['success'] += 1
+                # a successful login proves the captcha was read correctly
+                self.recordCaptcha(captchaBytes, self.loginPayLoad['Txt_CheckCode'], confidence, 'success', flush=True)
+                self.log('Login Successful! {}'.format(self.loginPayLoad['Txt_CheckCode']))
+                self.logLoginStats()
+                self.exportMetrics()
+                self.saveSession()
                 break
             elif ("資料庫發生異常" in result.text): # 僅比較成功登入及帳號密碼錯誤的訊息，不確定是否還有其他種情況也符合這個條件
                 self.log('帳號或密碼錯誤，請重新確認。')
@@ -109,107 +303,250 @@ class CourseBot:
                 self.log('您未在此階段選課時程之內!請於時程內選課!!')
             else:
                 self.log("Login Failed, Re-try!")
+                self.recordCaptcha(captchaBytes, self.loginPayLoad['Txt_CheckCode'], confidence,
+                                   'wrong' if '驗證碼錯誤' in result.text else 'failed')
                 continue
+            self.recordCaptcha(captchaBytes, self.loginPayLoad['Txt_CheckCode'], confidence, 'failed', flush=True)
             exit(0)
 
-    def getCourseDB(self, depts):
-
-        for dept in depts:
-            # use BeautifulSoup to parse html
-            html = self.session.get(self.courseListUrl)
-            if "異常登入" in html.text:
-                self.log("異常登入，休息10分鐘!")
-                time.sleep(600) # sleep 10 min
+    def loadCachedDept(self, dept):
+        if self.courseCache is None:
+            return False
+        entry = self.courseCache.get(dept, self.semester)
+        if entry is None:
+            return False
+
+        self.selectPayLoad[dept] = entry['selectPayLoad']
+        self.coursesDB.update(records_from_cache(entry['courses'], dept))
+        self.cachedDepts.add(dept)
+        self.log('Get {} Data from cache!'.format(dept))
+        return True
+
+    # the cached listing state / mUrl is still accepted if the server renders the course button
+    def isDeptPageValid(self, html, key):
+        return "Error" not in html and self.coursesDB[key].button in html
+
+    def refreshCachedDept(self, dept):
+        self.log('Cached {} data rejected, refreshing...'.format(dept))
+        entry = self.courseCache.invalidate(dept, self.semester)
+        if entry is not None:
+            for key in entry['courses']:
+                self.coursesDB.pop(key, None)
+        self.cachedDepts.discard(dept)
+        self.deptState.pop(dept, None)
+        self.getCourseDB([dept], refresh=True)
+
+    def getCourseDB(self, depts, refresh=False):
+
+        pending = list(depts)
+        while pending:
+            dept = pending.pop(0)
+            # skip the download when the department is still fresh in the local cache
+            if not refresh and self.loadCachedDept(dept):
                 continue
-            parser = BeautifulSoup(html.text, 'lxml')
-
-            self.selectPayLoad[dept] = {
-                '__EVENTTARGET': 'DPL_Degree',
-                '__EVENTARGUMENT': '',
-                '__LASTFOCUS': '',
-                '__VIEWSTATE': parser.select("#__VIEWSTATE")[0]['value'],
-                '__VIEWSTATEGENERATOR': parser.select("#__VIEWSTATEGENERATOR")[0]['value'],
-                '__VIEWSTATEENCRYPTED': '',
-                '__EVENTVALIDATION': parser.select("#__EVENTVALIDATION")[0]['value'],
-                'Hidden1': '',
-                'Hid_SchTime': '',
-                'DPL_DeptName': dept,
-                'DPL_Degree': '6',
-            }
-
-            # use BeautifulSoup to parse html
-            html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
-            if "Error" in html.text:
-                self.log('Wrong coursesList, please check it again!')
-                exit(0)
-            parser = BeautifulSoup(html.text, 'lxml')
-
-            # parse and save courses information
-            courseList = parser.select("#CosListTable input")
-            for courseInfo in courseList:
-                tokens = courseInfo.attrs['name'].split(',') # SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 電腦與網路安全概論
 
-                key = tokens[1] + tokens[2]
-                courseName = '{} {}'.format(key, tokens[-1].split(' ')[1])
-
-                self.coursesDB[key] = {
-                    'name': courseName,
-                    'mUrl': courseInfo.attrs['name']
-                }
-                # self.log(self.coursesDB[key])
-
-            self.log('Get {} Data Completed!'.format(dept))
-
-
-
-    def selectCourses(self, coursesList, delay = 0):
-        while len(coursesList) > 0:
-            for course in coursesList.copy():
-                tokens = course.split(',')
-                dept = tokens[0]
-                key  = tokens[1]
-                
-                # check if the classID is legal
-                if key not in self.coursesDB:
-                    self.log('{} is not a legal classID'.format(key))
-                    coursesList.remove(course)
+            try:
+                # get a fresh ViewState for the department postback
+                with self.metrics.span('catalog_page'):
+                    html = self.session.get(self.courseListUrl)
+                if "異常登入" in html.text:
+                    self.log("異常登入，休息10分鐘!")
+                    time.sleep(600) # sleep 10 min
+                    pending.insert(0, dept)
                     continue
-                
-                # simulte click button
-                html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
-                parser = BeautifulSoup(html.text, 'lxml')
+                fields = extract_hidden_fields(html.text)
 
-                selectPayLoad = {
-                    '__EVENTTARGET': '',
+                self.selectPayLoad[dept] = {
+                    '__EVENTTARGET': 'DPL_Degree',
                     '__EVENTARGUMENT': '',
                     '__LASTFOCUS': '',
-                    '__VIEWSTATE': parser.select("#__VIEWSTATE")[0]['value'],
-                    '__VIEWSTATEGENERATOR': parser.select("#__VIEWSTATEGENERATOR")[0]['value'],
+                    '__VIEWSTATE': fields['__VIEWSTATE'],
+                    '__VIEWSTATEGENERATOR': fields['__VIEWSTATEGENERATOR'],
                     '__VIEWSTATEENCRYPTED': '',
-                    '__EVENTVALIDATION': parser.select("#__EVENTVALIDATION")[0]['value'],
+                    '__EVENTVALIDATION': fields['__EVENTVALIDATION'],
                     'Hidden1': '',
                     'Hid_SchTime': '',
                     'DPL_DeptName': dept,
                     'DPL_Degree': '6',
-                    self.coursesDB[key]['mUrl'] + '.x': '0', 
-                    self.coursesDB[key]['mUrl'] + '.y': '0'
                 }
-                self.session.post(self.courseListUrl, data= selectPayLoad)
-
-                # select course
-                html = self.session.get(self.courseSelectUrl + self.coursesDB[key]['mUrl'] + ' ,B,')
 
-                # check if successful
+                # use BeautifulSoup to parse html
+                with self.metrics.span('dept_post'):
+                    html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
+            except requests.RequestException as e:
+                # the listing postback does not change anything on the server, download the department again later
+                self.log('{} catalog request failed ({}), will retry'.format(dept, e))
+                pending.append(dept)
+                time.sleep(1)
+                continue
+            if "Error" in html.text:
+                self.log('Wrong coursesList, please check it again!')
+                exit(0)
+            with self.metrics.span('catalog_parse'):
                 parser = BeautifulSoup(html.text, 'lxml')
-                alertMsg = parser.select("script")[0].string.split(';')[0]
-                self.log('{} {}'.format(self.coursesDB[key]['name'], alertMsg[7:-2]))
+                # the listing page is also the first postback state for selectCourses
+                self.deptState[dept] = extract_hidden_fields(html.text)
+
+                # parse and save courses information
+                deptCourses = {}
+                courseList = parser.select("#CosListTable input")
+                for courseInfo in courseList:
+                    try:
+                        record = CourseRecord.from_mUrl(courseInfo.attrs.get('name', ''), dept) # SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 電腦與網路安全概論
+                    except ValueError as e:
+                        # one odd button should not abort the whole catalog
+                        self.log('{}: skipped ({})'.format(dept, e))
+                        continue
+                    deptCourses[record.key] = record
+                    # self.log(record)
+
+            self.coursesDB.update(deptCourses)
+            if self.courseCache is not None:
+                # only the button name is cached, the record is parsed again on load
+                self.courseCache.put(dept, self.semester, self.selectPayLoad[dept],
+                                     {key: record.mUrl for key, record in deptCourses.items()})
+                self.courseCache.save()
+
+            self.log('Get {} Data Completed!'.format(dept))
 
-                if "加選訊息：" in alertMsg or "已選過" in alertMsg:
-                    coursesList.remove(course)
-                elif "please log on again!" in alertMsg:
-                    self.login()
+        self.saveSession()
 
-                time.sleep(delay)
+
+
+    # keep the latest ViewState/EventValidation of a department listing; returns False when the server rejected it
+    def updateDeptState(self, dept, html):
+        if "Error" in html:
+            self.deptState.pop(dept, None)
+            return False
+        try:
+            self.deptState[dept] = extract_hidden_fields(html)
+        except MissingFieldError:
+            # no new state in this response, the previous one is still usable
+            pass
+        return True
+
+    def clickPayLoad(self, dept, key):
+        fields = self.deptState[dept]
+        return {
+            '__EVENTTARGET': '',
+            '__EVENTARGUMENT': '',
+            '__LASTFOCUS': '',
+            '__VIEWSTATE': fields['__VIEWSTATE'],
+            '__VIEWSTATEGENERATOR': fields['__VIEWSTATEGENERATOR'],
+            '__VIEWSTATEENCRYPTED': '',
+            '__EVENTVALIDATION': fields['__EVENTVALIDATION'],
+            'Hidden1': '',
+            'Hid_SchTime': '',
+            'DPL_DeptName': dept,
+            'DPL_Degree': '6',
+            self.coursesDB[key].mUrl + '.x': '0', 
+            self.coursesDB[key].mUrl + '.y': '0'
+        }
+
+    def logSelectStats(self):
+        stats = self.selectStats
+        if stats['attempts']:
+            self.log('{} attempts, {} requests ({:.2f} per attempt, was 3.00), {} listing refreshes'.format(
+                stats['attempts'], stats['requests'], stats['requests'] / stats['attempts'], stats['refreshes']))
+
+    def logTransportStats(self):
+        for line in self.session.stats.summary_lines():
+            self.log(line)
+
+    def logCourseOutcomes(self, scheduler):
+        for attempt in scheduler.attempts:
+            if attempt.outcomes:
+                self.log('  {}: {}'.format(attempt.key, attempt.format_outcomes()))
+
+    def selectCourses(self, coursesList, delay = 0):
+        # courses are picked by priority ('dept,course,priority'), each backs off on its own after a failure
+        scheduler = AttemptScheduler(coursesList, delay)
+        cycleRequests = self.selectStats['requests']
+        while len(scheduler) > 0:
+            attempt, wait = scheduler.next_attempt()
+            if wait > 0:
+                time.sleep(wait)
+            dept, key = attempt.dept, attempt.key
+
+            # check if the classID is legal
+            if key not in self.coursesDB:
+                self.log('{} is not a legal classID'.format(key))
+                scheduler.record(attempt, 'error')
+                coursesList.remove(attempt.course)
+                continue
+
+            try:
+                # re-post the department listing only when there is no reusable postback state
+                if dept not in self.deptState:
+                    with self.metrics.span('dept_post'):
+                        html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
+                    self.selectStats['requests'] += 1
+                    self.selectStats['refreshes'] += 1
+                    if 'please log on again!' in html.text:
+                        # logged out during a request that timed out, the relogin alert never arrived
+                        self.log('Session expired, login again')
+                        self.deptState.clear()
+                        self.login()
+                        continue
+                    if dept in self.cachedDepts and not self.isDeptPageValid(html.text, key):
+                        self.refreshCachedDept(dept)
+                        continue
+                    self.deptState[dept] = extract_hidden_fields(html.text)
+
+                # simulte click button, then select course
+                with self.metrics.span('click_post'):
+                    html = self.session.post(self.courseListUrl, data= self.clickPayLoad(dept, key))
+                self.selectStats['requests'] += 1
+                self.updateDeptState(dept, html.text)
+
+                # selecting is a GET but changes server state, never resend it
+                with self.metrics.span('select_get'):
+                    html = self.session.get(self.courseSelectUrl + self.coursesDB[key].mUrl + ' ,B,', retries=0)
+                self.selectStats['requests'] += 1
+                self.selectStats['attempts'] += 1
+            except requests.RequestException as e:
+                # timed out or dropped: the postback state is unknown, back off like an unknown alert
+                self.log('{} request failed ({}), will retry'.format(key, e))
+                self.deptState.pop(dept, None)
+                scheduler.record(attempt, 'unknown')
+                continue
+
+            # check if successful
+            alertMsg = extract_first_script(html.text).split(';')[0]
+            self.log('{} {}'.format(self.coursesDB[key].title, alertMsg[7:-2]))
+
+            # map the alert of CurrMainTrans.aspx to a scheduler outcome
+            outcome = classify_alert(alertMsg, self.coursesDB[key].name)
+            scheduler.record(attempt, outcome)
+            if outcome == 'success':
+                coursesList.remove(attempt.course)
+            elif outcome in FINAL_FAILURES:
+                # a time clash or an eligibility rule will not change by retrying
+                self.log('{} dropped ({}), will not retry'.format(key, outcome))
+                coursesList.remove(attempt.course)
+            elif outcome == 'relogin':
+                # postback state belongs to the old session
+                self.deptState.clear()
+                self.login()
+
+            # one cycle: every pending course tried once, same-department courses back to back
+            cycle = scheduler.completed_cycle()
+            if cycle is not None:
+                self.log('Cycle done: {} round trips for {} courses in {} departments'.format(
+                    self.selectStats['requests'] - cycleRequests, *cycle))
+                cycleRequests = self.selectStats['requests']
+
+            if self.selectStats['attempts'] % 20 == 0:
+                self.logSelectStats()
+                self.logCourseOutcomes(scheduler)
+                self.exportMetrics()
+                self.saveSession()
+
+        self.logSelectStats()
+        self.logCourseOutcomes(scheduler)
+        self.logTransportStats()
+        self.exportMetrics()
+        self.saveSession()
 
     def log(self, msg):
         print(time.strftime("[%Y-%m-%d %H:%M:%S]", time.localtime()), msg)
@@ -227,17 +564,53 @@ if __name__ == '__main__':
     Account = config['Default']['Account']
     Password = config['Default']['Password']
 
-# the courses you want to select, format: '`deptId`,`courseId``classId`'
+# the courses you want to select, format: '`deptId`,`courseId``classId`[,`priority`]' (higher priority is tried first)
     coursesList = [
          '304,CS352A'
     ]
 
     # Time Parameter, sleep n seconds
     delay = 2.5
+
+    # OCR backend: 'numpy' (no TensorFlow, fast startup) or 'keras'
+    ocrBackend = 'numpy'
+
+    # ignore the local course catalog cache and download every department again
+    refreshCatalog = False
+
+    # refetch the captcha when any character's confidence is below this (0 = always submit)
+    ocrThreshold = 0.0
+
+    # load the quantized model when its measured per-character accuracy is at least this (None = always float32)
+    ocrAccuracyFloor = None
+
+    # collect captchas labeled by the login outcome into this directory (None = disabled), see tools/captcha_report.py
+    captchaCorpusPath = None
+
+    # use a running ocr_daemon.py on this socket instead of loading the model in every run (None = never),
+    # e.g. the path the daemon prints when it starts; only a socket owned by the current user is trusted
+    ocrSocket = None
+
+    # write per-stage latency histograms to <metricsPath>.json / .prom (None = disabled)
+    metricsPath = None
+
+    # opening time of the selection system, e.g. '2026-02-10 09:00' (None = log in right away)
+    openTime = None
+
+    # keep the logged-in session (encrypted, needs the cryptography package) so a restart skips the login,
+    # e.g. 'session.bin' (None = disabled)
+    sessionPath = None
+
+    # hard cap on requests per minute (None = unlimited), counting login and catalog requests; an attempt costs 2
+    requestsPerMinute = 60
     
-    depts = set([i.split(',')[0] for i in coursesList])
+    depts = set([parse_course(i)[0] for i in coursesList])
     
-    myBot = CourseBot(Account, Password)
-    myBot.login()
-    myBot.getCourseDB(depts)
+    myBot = CourseBot(Account, Password, ocrBackend, ocrThreshold=ocrThreshold, metricsPath=metricsPath,
+                      requestsPerMinute=requestsPerMinute, openTime=openTime, sessionPath=sessionPath,
+                      ocrAccuracyFloor=ocrAccuracyFloor, captchaCorpusPath=captchaCorpusPath,
+                      ocrSocket=ocrSocket)
+    if not myBot.resumeSession():
+        myBot.login()
+    myBot.getCourseDB(depts, refreshCatalog)
     myBot.selectCourses(coursesList, delay)
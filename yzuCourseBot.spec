@@ -1,5 +1,6 @@
 ﻿# -*- mode: python ; coding: utf-8 -*-
 
+import glob
 from PyInstaller.utils.hooks import collect_data_files, collect_submodules, collect_dynamic_libs
 
 block_cipher = None
@@ -8,7 +9,8 @@ a = Analysis(
     ['yzuCourseBot_GUI.py'],
     pathex=[],
     binaries=[],
-    datas=[('model.h5', '.')],  # 包含 model.h5，Flet 相關由 hook 自動處理
+    # 包含 model.h5 與 tools/quantize_model.py 產生的量化模型（若有），Flet 相關由 hook 自動處理
+    datas=[('model.h5', '.')] + [(path, '.') for path in glob.glob('model.*.h5')],
     hiddenimports=[
         # 核心套件
         'tensorflow',
@@ -16,6 +18,8 @@ a = Analysis(
         'cv2',
         'numpy',
         'requests',
+        'httpx',
+        'cryptography',
         'bs4',
         'lxml',
         'PIL',
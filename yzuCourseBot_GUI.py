@@ -2,12 +2,31 @@
 import os
 import sys
 import time
-import tempfile
+import asyncio
 import requests
 import configparser
-from threading import Thread, Event
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Event, Lock
 from bs4 import BeautifulSoup
+from aspnet_fields import MissingFieldError, extract_first_script, extract_hidden_fields, extract_select_options
 from multiprocessing import freeze_support
+from course_cache import DEFAULT_TTL, CourseCache, current_semester
+from course_catalog import CourseCatalog, CourseRecord, CourseTrie, catalog_from_cache, check_course_lines, records_from_cache
+from captcha_ocr import N_CLASSES, choose_model, decode_captcha, decode_prediction, get_predictor
+from captcha_corpus import CaptchaCorpus, model_fingerprint
+from metrics import StageMetrics
+from transport import CONNECT_TIMEOUT, GET_RETRIES, POOL_SIZE, READ_TIMEOUT, HttpSession, TransportStats
+from scheduler import AttemptScheduler, RequestBudget, parse_course
+from alerts import FINAL_FAILURES, classify_alert
+from opening import OpeningWindow, parse_open_time
+import session_store
+
+# httpx 為選用套件：有安裝時使用 asyncio 選課引擎，停止時可立即中斷進行中的連線
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 # 注意：numpy 和 cv2 移至懶加載，只在需要驗證碼時才 import
 
@@ -28,30 +47,65 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# 選課系統網址，可用環境變數 YZU_BASE_URL 指向 tools/mock_server.py 進行離線測試
+DEFAULT_BASE_URL = os.environ.get('YZU_BASE_URL', 'https://isdna1.yzu.edu.tw/CnStdSel/')
+
 class CourseBot:
-    def __init__(self, account, password, log_callback=None, status_callback=None, stop_event=None):
+    def __init__(self, account, password, log_callback=None, status_callback=None, stop_event=None, ocr_backend='keras', ocr_threshold=0.0,
+                 cache_path=None, cache_ttl=DEFAULT_TTL, semester=None, base_url=DEFAULT_BASE_URL,
+                 metrics_path=None, requests_per_minute=None, open_time=None, session_path=None, ocr_accuracy_floor=None,
+                 captcha_corpus_path=None):
         self.account = account
         self.password = password
-        self.coursesDB = {}
+        self.coursesDB = CourseCatalog()
+
+        # 課程資料本機快取，以學期與系所為 key（cache_path=None 表示不使用）
+        self.course_cache = CourseCache(cache_path, cache_ttl) if cache_path else None
+        self.semester = semester or current_semester()
+        self.cached_depts = set()
+
+        # 各階段耗時統計，設定 metrics_path 時輸出成 .json 與 .prom（metric 名稱與命令列版本相同）
+        self.metrics = StageMetrics()
+        self.metrics_path = metrics_path
+
         self.log_callback = log_callback
         self.status_callback = status_callback
         self.stop_event = stop_event or Event()
-        
-        # captcha.png 存放在系統暫存目錄
-        self.captcha_path = os.path.join(tempfile.gettempdir(), 'yzuCourseBot_captcha.png')
 
-        # 移至載入 TensorFlow 模型，等到需要時才加載
-        self.model = None        
-        self.n_classes = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+        # 移至載入驗證碼模型，等到需要時才加載
+        self.model = None
+        self.ocr_backend = ocr_backend
+        # 量化模型（tools/quantize_model.py）評估的逐字元正確率達到門檻時改用量化模型（None 表示不使用）
+        self.ocr_accuracy_floor = ocr_accuracy_floor
+        self.n_classes = N_CLASSES
+
+        # 驗證碼中信心最低的字元低於門檻時，重新取得驗證碼而不送出登入
+        self.ocr_threshold = ocr_threshold
+        self.max_captcha_refetch = 5
+        self.login_stats = {'captchas': 0, 'skipped': 0, 'posts': 0, 'success': 0}
+
+        # 選用：保存每張驗證碼、辨識結果與登入結果，用來評估與重新訓練模型（tools/captcha_report.py）
+        self.captcha_corpus = CaptchaCorpus(captcha_corpus_path) if captcha_corpus_path else None
+
+        # 辨識驗證碼的同時下載登入頁
+        self.login_prefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix='login-page')
 
-        # for requests
-        self.session = requests.Session()
+        # 選課系統開放時間（'YYYY-MM-DD HH:MM'），以伺服器時間判斷
+        self.opening = OpeningWindow(open_time)
+
+        # 每分鐘請求數的硬上限（None 表示不限制），登入與下載課程清單也計入
+        self.request_budget = RequestBudget(requests_per_minute)
+
+        # for requests：連線 / 讀取逾時、keep-alive 連線池、GET 重試與請求上限（transport.py）
+        # 等待額度時按下停止，請求會丟出 RequestCancelled
+        self.session = HttpSession(budget=self.request_budget, budget_sleep=self.stop_event.wait)
         self.session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36'
 
-        self.loginUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/Index.aspx'
-        self.captchaUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/SelRandomImage.aspx'
-        self.courseListUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/SelCurr/CosList.aspx'
-        self.courseSelectUrl = 'https://isdna1.yzu.edu.tw/CnStdSel/SelCurr/CurrMainTrans.aspx?mSelType=SelCos&mUrl='
+        base_url = base_url.rstrip('/') + '/'
+        self.loginUrl = base_url + 'Index.aspx'
+        self.captchaUrl = base_url + 'SelRandomImage.aspx'
+        self.courseListUrl = base_url + 'SelCurr/CosList.aspx'
+        self.courseSelectUrl = base_url + 'SelCurr/CurrMainTrans.aspx?mSelType=SelCos&mUrl='
 
         self.loginPayLoad = {
             '__VIEWSTATE': '',
@@ -66,240 +120,543 @@ class CourseBot:
 
         self.selectPayLoad = {}
 
-    def _load_model(self):
-        """移至載入 TensorFlow 模型，等到真正需要時才 import 相關套件"""
-        if self.model is None:
-            # 抑制不必要的 TensorFlow 警告和日誌
-            os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-            os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+        # 各系所課程清單最後一次有效的 postback 狀態（隱藏欄位），在每次嘗試之間重複使用
+        self.dept_state = {}
+        self.select_stats = {'attempts': 0, 'requests': 0, 'refreshes': 0}
 
-            # 現在才 import NumPy, cv2 和 TensorFlow（懶載入）
-            import numpy as np
-            import cv2
-            from keras.models import load_model
-            import tensorflow as tf
+        # 加密保存的 cookies 與 postback 狀態，下次啟動時沿用（session_path=None 表示不使用）
+        self.session_path = session_path
+        self.session_store = None
 
-            # 保存 numpy 和 cv2 到 instance，供其他方法使用
-            self.np = np
-            self.cv2 = cv2
+    def open_session_store(self):
+        if self.session_path and self.session_store is None:
+            if session_store.available():
+                self.session_store = session_store.SessionStore(self.session_path, self.account, self.password)
+            else:
+                self.log('未安裝 cryptography，不會保存登入狀態')
+                self.session_path = None
+        return self.session_store
 
-            # 設定 TensorFlow 日誌級別
-            tf.get_logger().setLevel('ERROR')
-            tf.autograph.set_verbosity(0)
+    def http_cookies(self):
+        return self.session.cookies
 
-            model_path = resource_path('model.h5')
-            try:
-                self.model = load_model(model_path)
-            except ValueError as e:
-                if 'lr' in str(e):
-                    self.model = load_model(model_path, compile=False)
-                    self.model.compile(
-                        optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-                        loss='categorical_crossentropy',
-                        metrics=['accuracy']
-                    )
-                else:
-                    raise e
-            self.log("TensorFlow 模型載入完成")
+    def save_session(self):
+        if self.session_store is not None:
+            self.session_store.save({
+                'loginUrl': self.loginUrl,
+                'cookies': session_store.dump_cookies(self.http_cookies()),
+                'selectPayLoad': self.selectPayLoad,
+                'deptState': self.dept_state,
+            })
+
+    def load_saved_session(self):
+        """讀取上次保存的 session 並放回 cookies，沒有可用的 session 時回傳 None"""
+        if self.open_session_store() is None:
+            return None
+        state = self.session_store.load()
+        if state is None or state.get('loginUrl') != self.loginUrl:
+            return None
+        cookies = self.http_cookies()
+        cookies.clear()
+        session_store.load_cookies(cookies, state['cookies'])
+        return state
 
-    def predict(self, img):
+    def accept_saved_session(self, state, html):
+        """以 CosList.aspx 的回應確認保存的 session 是否仍有效"""
+        if 'please log on again!' in html:
+            self.log('保存的登入狀態已失效，重新登入')
+            self.http_cookies().clear()
+            self.session_store.clear()
+            return False
+        self.selectPayLoad.update(state['selectPayLoad'])
+        self.dept_state.update(state['deptState'])
+        self.log('沿用保存的登入狀態（{:.0f} 秒前）'.format(time.time() - state['savedAt']))
+        return True
+
+    def resume_session(self):
+        """沿用上次的 session，需要重新登入時回傳 False"""
+        state = self.load_saved_session()
+        if state is None:
+            return False
+        try:
+            html = self.session.get(self.courseListUrl)
+        except requests.RequestException as e:
+            self.log('確認保存的登入狀態失敗（{}），重新登入'.format(e))
+            self.http_cookies().clear()
+            return False
+        return self.accept_saved_session(state, html.text)
+
+    def _load_model(self):
+        """移至載入驗證碼模型，等到真正需要時才 import 相關套件"""
+        if self.model is None:
+            # 若 GUI 開啟時已在背景預熱，這裡會直接取得已載入的模型
+            # keras 後端才會 import TensorFlow；numpy 後端只用 h5py 讀取權重
+            model_path, model_eval = choose_model(resource_path('model.h5'), self.ocr_backend, self.ocr_accuracy_floor)
+            self.predictor = get_predictor(model_path, self.ocr_backend)
+            self.model = self.predictor.model
+            if self.captcha_corpus is not None:
+                self.captcha_corpus.model = model_fingerprint(model_path)
+            if model_eval is not None:
+                self.log("驗證碼模型載入完成 ({}，量化模型 {}，逐字元正確率 {:.2%})".format(
+                    self.ocr_backend, os.path.basename(model_path), model_eval['char_accuracy']))
+            else:
+                self.log("驗證碼模型載入完成 ({})".format(self.ocr_backend))
+
+    def predict(self, img, with_confidence=False):
         # 確保模型已載入
         self._load_model()
-        # 使用 verbose=0 避免在 GUI 模式下輸出進度條
-        prediction = self.model.predict(self.np.array([img]), verbose=0)
+        prediction = self.predictor(img)
+        return decode_prediction(prediction, self.n_classes, with_confidence)
 
-        predicStr = ""
-        for pred in prediction:
-            predicStr += self.n_classes[self.np.argmax(pred[0])]
-        return predicStr
-
-    def captchaOCR(self):
-        # 確保模型已載入（這樣才能使用 cv2）
+    def captchaOCR(self, captcha_bytes):
         self._load_model()
-        captchaImg = self.cv2.imread(self.captcha_path) / 255.0
-        return self.predict(captchaImg)
+        with self.metrics.span('captcha_ocr'):
+            # 直接在記憶體中解碼，不寫入暫存檔，多個程式同時執行也不會互相覆蓋
+            captchaImg = decode_captcha(captcha_bytes)
+            # 回傳驗證碼字串與每個字元的 softmax 信心值
+            return self.predict(captchaImg, with_confidence=True)
+
+    def export_metrics(self):
+        if self.metrics_path:
+            self.metrics.export(self.metrics_path)
+
+    def log_login_stats(self):
+        stats = self.login_stats
+        rate = stats['success'] / stats['posts'] if stats['posts'] else 0
+        self.log('登入統計：驗證碼 {} 張，低信心重抓 {} 次（省下的登入 POST），登入 POST {} 次，成功率 {:.0%}'.format(
+            stats['captchas'], stats['skipped'], stats['posts'], rate))
 
     # login into system and get session
+    def wait_for_opening(self):
+        """休眠到開放時間前 lead 秒；等待時間較長時會定期重新校正與伺服器的時間差，停止時回傳 False"""
+        while self.opening.open_at is not None:
+            if not self.opening.clock.samples or self.opening.sleep_before() > 0:
+                try:
+                    self.opening.clock.observe(self.session.get(self.loginUrl))
+                except requests.RequestException as e:
+                    # 沿用上次的時間差，下一次等待時再校正
+                    self.log('校正伺服器時間失敗（{}）'.format(e))
+            wait = self.opening.sleep_before()
+            if wait <= 0:
+                return True
+            self.log_opening_wait()
+            if self.stop_event.wait(wait):
+                return False
+        return True
+
+    def log_opening_wait(self):
+        self.log('選課系統尚未開放，{:.0f} 秒後開始準備（與伺服器時間差 {:+.1f} 秒）'.format(
+            self.opening.until_open() - self.opening.lead, self.opening.clock.offset))
+
+    def fetch_login_page(self):
+        with self.metrics.span('login_page'):
+            return self.session.get(self.loginUrl)
+
     def login(self):
-        
+        low_confidence = 0
+        captcha = None
+        login_page = None
+        if not self.wait_for_opening():
+            self.log("使用者已停止")
+            return False
+
         while True:
             # 檢查是否需要停止
             if self.stop_event.is_set():
                 self.log("使用者已停止")
                 return False
             
-            # clear Session object
-            self.session.cookies.clear()
+            try:
+                # 等待開放期間保留已辨識的驗證碼（與其 session），開放時可以直接登入
+                if captcha is None:
+                    # clear Session object
+                    self.session.cookies.clear()
+
+                    # download and recognize captch
+                    with self.metrics.span('captcha_download'):
+                        captchaHtml = self.session.get(self.captchaUrl)
+                    self.opening.clock.observe(captchaHtml)
+
+                    # 取得驗證碼時已建立 session，登入頁在辨識驗證碼的同時下載
+                    login_page = self.login_prefetch.submit(self.fetch_login_page)
+                    captcha, confidence = self.captchaOCR(captchaHtml.content)
+                    self.login_stats['captchas'] += 1
 
-            # download and recognize captch
-            with self.session.get(self.captchaUrl, stream= True) as captchaHtml:
-                with open(self.captcha_path, 'wb') as img:
-                    img.write(captchaHtml.content)
-            captcha = self.captchaOCR()
+                    # 可能辨識錯誤：重新取得驗證碼，不浪費一次登入 POST
+                    if confidence.min() < self.ocr_threshold and low_confidence < self.max_captcha_refetch:
+                        low_confidence += 1
+                        self.login_stats['skipped'] += 1
+                        self.log('驗證碼信心不足 {} ({:.2f})，重新取得'.format(captcha, confidence.min()))
+                        self.record_captcha(captchaHtml.content, captcha, confidence, 'skipped')
+                        captcha = None
+                        # 等進行中的請求結束才清除 cookies
+                        login_page.result()
+                        continue
+                    low_confidence = 0
 
-            # get login data
-            loginHtml = self.session.get(self.loginUrl)
+                # get login data（剛取得新驗證碼時已在下載中）
+                loginHtml = login_page.result() if login_page is not None else self.fetch_login_page()
+            except requests.RequestException as e:
+                # 驗證碼或登入頁逾時：重新取得驗證碼；等待請求額度時按下停止也會到這裡
+                self.log('登入頁請求失敗（{}），重試'.format(e))
+                captcha = login_page = None
+                continue
+            login_page = None
+            self.opening.clock.observe(loginHtml)
             
-            # check if system is open
+            # check if system is open：以退避間隔輪詢，不再每次重新下載與辨識驗證碼
             if '選課系統尚未開放!' in loginHtml.text:
-                self.log('選課系統尚未開放!')
-                # 檢查是否需要停止
-                if self.stop_event.is_set():
+                wait = self.opening.next_poll()
+                self.log('選課系統尚未開放! {:.1f} 秒後再試'.format(wait))
+                if self.stop_event.wait(wait):
                     self.log("使用者已停止")
                     return False
                 continue
+            self.opening.opened()
 
-            # use BeautifulSoup to parse html
-            parser = BeautifulSoup(loginHtml.text, 'lxml')
-
-            # update login payload
-            self.loginPayLoad['__VIEWSTATE'] = parser.select("#__VIEWSTATE")[0]['value']
-            self.loginPayLoad['__VIEWSTATEGENERATOR'] = parser.select("#__VIEWSTATEGENERATOR")[0]['value']
-            self.loginPayLoad['__EVENTVALIDATION'] = parser.select("#__EVENTVALIDATION")[0]['value']
-            self.loginPayLoad['DPL_SelCosType'] = parser.select("#DPL_SelCosType option")[1]['value']
-            self.loginPayLoad['Txt_CheckCode'] = captcha
-
-            result = self.session.post(self.loginUrl, data= self.loginPayLoad)
-            if ("parent.location ='SelCurr.aspx?Culture=zh-tw'" in result.text): #成功登入訊息可能一直改，挑個不太能改的
-                self.log('Login Successful! {}'.format(captcha))
-                break
-            elif ("資料庫發生異常" in result.text): # 僅比較成功登入及帳號密碼錯誤的訊息，不確定是否還有其他種情況也符合這個條件
-                self.log('帳號或密碼錯誤，請重新確認。')
-            elif ("您未在此階段選課時程之內!請於時程內選課!!" in result.text):
-                self.log('您未在此階段選課時程之內!請於時程內選課!!')
-            else:
-                self.log("Login Failed, Re-try!")
+            self.update_login_payload(loginHtml.text, captcha)
+            login_captcha, captcha = captcha, None
+
+            try:
+                with self.metrics.span('login_post'):
+                    result = self.session.post(self.loginUrl, data= self.loginPayLoad)
+            except requests.RequestException as e:
+                # 登入 POST 不重送，改用新的驗證碼重新登入
+                self.log('登入請求失敗（{}），重試'.format(e))
+                continue
+            login_result = self.check_login_result(result.text, login_captcha, captchaHtml.content, confidence)
+            if login_result is None:
                 # 檢查是否需要停止
                 if self.stop_event.is_set():
                     self.log("使用者已停止")
                     return False
                 continue
-            return False  # Login failed with error
+            return login_result
 
-        return True  # Login successful
+    def update_login_payload(self, html, captcha):
+        # update login payload (only scan for the hidden fields, no full html parse)
+        self.loginPayLoad.update(extract_hidden_fields(html))
+        self.loginPayLoad['DPL_SelCosType'] = extract_select_options(html, 'DPL_SelCosType')[1]
+        self.loginPayLoad['Txt_CheckCode'] = captcha
 
-    def getCourseDB(self, depts):
+    def record_captcha(self, captcha_bytes, captcha, confidence, outcome, flush=False):
+        if self.captcha_corpus is not None:
+            self.captcha_corpus.add(captcha_bytes, captcha, confidence, outcome)
+            if flush:
+                self.flush_captcha_corpus()
 
-        for dept in depts:
-            # use BeautifulSoup to parse html
-            html = self.session.get(self.courseListUrl)
-            if "異常登入" in html.text:
-                self.log("異常登入，休息10分鐘!")
-                time.sleep(600) # sleep 10 min
+    def flush_captcha_corpus(self):
+        if self.captcha_corpus is not None:
+            try:
+                self.captcha_corpus.flush()
+            except OSError as e:
+                self.log("驗證碼資料集寫入失敗: {}".format(e))
+
+    def check_login_result(self, html, captcha, captcha_bytes, confidence):
+        """登入成功回傳 True，帳號密碼或時程錯誤回傳 False，其他情況回傳 None（重試）"""
+        self.login_stats['posts'] += 1
+        if ("parent.location ='SelCurr.aspx?Culture=zh-tw'" in html): #成功登入訊息可能一直改，挑個不太能改的
+            self.login_stats['success'] += 1
+            # 登入成功代表驗證碼辨識正確
+            self.record_captcha(captcha_bytes, captcha, confidence, 'success', flush=True)
+            self.log('Login Successful! {}'.format(captcha))
+            self.log_login_stats()
+            self.export_metrics()
+            self.open_session_store()
+            self.save_session()
+            return True
+        elif ("資料庫發生異常" in html): # 僅比較成功登入及帳號密碼錯誤的訊息，不確定是否還有其他種情況也符合這個條件
+            self.log('帳號或密碼錯誤，請重新確認。')
+        elif ("您未在此階段選課時程之內!請於時程內選課!!" in html):
+            self.log('您未在此階段選課時程之內!請於時程內選課!!')
+        else:
+            self.log("Login Failed, Re-try!")
+            self.record_captcha(captcha_bytes, captcha, confidence, 'wrong' if '驗證碼錯誤' in html else 'failed')
+            return None
+        self.record_captcha(captcha_bytes, captcha, confidence, 'failed', flush=True)
+        return False
+
+    def load_cached_dept(self, dept):
+        if self.course_cache is None:
+            return False
+        entry = self.course_cache.get(dept, self.semester)
+        if entry is None:
+            return False
+
+        self.selectPayLoad[dept] = entry['selectPayLoad']
+        self.coursesDB.update(records_from_cache(entry['courses'], dept))
+        self.cached_depts.add(dept)
+        self.log('Get {} Data from cache!'.format(dept))
+        return True
+
+    def is_dept_page_valid(self, html, key):
+        # 伺服器仍顯示該課程的加選按鈕，代表快取的 postback 狀態與 mUrl 仍然有效
+        return "Error" not in html and self.coursesDB[key].button in html
+
+    def refresh_cached_dept(self, dept):
+        self.log('{} 的快取資料已失效，重新下載...'.format(dept))
+        entry = self.course_cache.invalidate(dept, self.semester)
+        if entry is not None:
+            for key in entry['courses']:
+                self.coursesDB.pop(key, None)
+        self.cached_depts.discard(dept)
+        self.dept_state.pop(dept, None)
+        return self.getCourseDB([dept], refresh=True)
+
+    def getCourseDB(self, depts, refresh=False):
+
+        pending = list(depts)
+        while pending:
+            dept = pending.pop(0)
+            # 快取仍有效時直接使用，不必重新下載 CosList.aspx
+            if not refresh and self.load_cached_dept(dept):
                 continue
-            parser = BeautifulSoup(html.text, 'lxml')
-
-            self.selectPayLoad[dept] = {
-                '__EVENTTARGET': 'DPL_Degree',
-                '__EVENTARGUMENT': '',
-                '__LASTFOCUS': '',
-                '__VIEWSTATE': parser.select("#__VIEWSTATE")[0]['value'],
-                '__VIEWSTATEGENERATOR': parser.select("#__VIEWSTATEGENERATOR")[0]['value'],
-                '__VIEWSTATEENCRYPTED': '',
-                '__EVENTVALIDATION': parser.select("#__EVENTVALIDATION")[0]['value'],
-                'Hidden1': '',
-                'Hid_SchTime': '',
-                'DPL_DeptName': dept,
-                'DPL_Degree': '6',
-            }
 
-            # use BeautifulSoup to parse html
-            html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
+            try:
+                # get a fresh ViewState for the department postback
+                with self.metrics.span('catalog_page'):
+                    html = self.session.get(self.courseListUrl)
+                if "異常登入" in html.text:
+                    self.log("異常登入，休息10分鐘!")
+                    if self.stop_event.wait(600): # sleep 10 min
+                        self.log("使用者已停止")
+                        return False
+                    pending.insert(0, dept)
+                    continue
+                self.selectPayLoad[dept] = self.dept_payload(dept, extract_hidden_fields(html.text))
+
+                with self.metrics.span('dept_post'):
+                    html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
+            except requests.RequestException as e:
+                # 系所清單的 postback 不會改變伺服器狀態，稍後重新下載該系所
+                self.log('{} 課程清單請求失敗（{}），稍後重試'.format(dept, e))
+                if self.stop_event.wait(1):
+                    self.log("使用者已停止")
+                    return False
+                pending.append(dept)
+                continue
             if "Error" in html.text:
                 self.log('Wrong coursesList, please check it again!')
                 return False
-            parser = BeautifulSoup(html.text, 'lxml')
+            self.save_dept_courses(dept, html.text)
+
+        self.save_session()
+        return True
+
+    def dept_payload(self, dept, fields):
+        return {
+            '__EVENTTARGET': 'DPL_Degree',
+            '__EVENTARGUMENT': '',
+            '__LASTFOCUS': '',
+            '__VIEWSTATE': fields['__VIEWSTATE'],
+            '__VIEWSTATEGENERATOR': fields['__VIEWSTATEGENERATOR'],
+            '__VIEWSTATEENCRYPTED': '',
+            '__EVENTVALIDATION': fields['__EVENTVALIDATION'],
+            'Hidden1': '',
+            'Hid_SchTime': '',
+            'DPL_DeptName': dept,
+            'DPL_Degree': '6',
+        }
+
+    def save_dept_courses(self, dept, html):
+        # use BeautifulSoup to parse html
+        with self.metrics.span('catalog_parse'):
+            parser = BeautifulSoup(html, 'lxml')
+            # 課程清單頁同時也是 selectCourses 第一次 postback 的狀態
+            self.dept_state[dept] = extract_hidden_fields(html)
 
             # parse and save courses information
+            dept_courses = {}
             courseList = parser.select("#CosListTable input")
             for courseInfo in courseList:
-                tokens = courseInfo.attrs['name'].split(',') # SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 電腦與網路安全概論
+                try:
+                    record = CourseRecord.from_mUrl(courseInfo.attrs.get('name', ''), dept) # SelCos,CS354,A,1,F,3,Y,Chinese,CS354,A,3 電腦與網路安全概論
+                except ValueError as e:
+                    # 單一無法解析的按鈕不影響整個系所的課程清單
+                    self.log('{}：略過（{}）'.format(dept, e))
+                    continue
+                dept_courses[record.key] = record
+                # self.log(record)
 
-                key = tokens[1] + tokens[2]
-                courseName = '{} {}'.format(key, tokens[-1].split(' ')[1])
+        self.coursesDB.update(dept_courses)
+        if self.course_cache is not None:
+            # 快取只存按鈕的 name 屬性，載入時再解析成 CourseRecord
+            self.course_cache.put(dept, self.semester, self.selectPayLoad[dept],
+                                  {key: record.mUrl for key, record in dept_courses.items()})
+            self.course_cache.save()
 
-                self.coursesDB[key] = {
-                    'name': courseName,
-                    'mUrl': courseInfo.attrs['name']
-                }
-                # self.log(self.coursesDB[key])
+        self.log('Get {} Data Completed!'.format(dept))
 
-            self.log('Get {} Data Completed!'.format(dept))
 
+    def update_dept_state(self, dept, html):
+        """保存系所清單最新的 ViewState/EventValidation，伺服器拒絕時回傳 False"""
+        if "Error" in html:
+            self.dept_state.pop(dept, None)
+            return False
+        try:
+            self.dept_state[dept] = extract_hidden_fields(html)
+        except MissingFieldError:
+            # 這次回應沒有新的狀態，沿用上一次的即可
+            pass
         return True
 
+    def click_payload(self, dept, key):
+        fields = self.dept_state[dept]
+        return {
+            '__EVENTTARGET': '',
+            '__EVENTARGUMENT': '',
+            '__LASTFOCUS': '',
+            '__VIEWSTATE': fields['__VIEWSTATE'],
+            '__VIEWSTATEGENERATOR': fields['__VIEWSTATEGENERATOR'],
+            '__VIEWSTATEENCRYPTED': '',
+            '__EVENTVALIDATION': fields['__EVENTVALIDATION'],
+            'Hidden1': '',
+            'Hid_SchTime': '',
+            'DPL_DeptName': dept,
+            'DPL_Degree': '6',
+            self.coursesDB[key].mUrl + '.x': '0', 
+            self.coursesDB[key].mUrl + '.y': '0'
+        }
+
+    def log_select_stats(self):
+        stats = self.select_stats
+        if stats['attempts']:
+            self.log('選課統計：嘗試 {} 次，請求 {} 次（每次嘗試 {:.2f} 個請求，原本為 3.00），重新取得清單 {} 次'.format(
+                stats['attempts'], stats['requests'], stats['requests'] / stats['attempts'], stats['refreshes']))
+
+    def log_cycle(self, scheduler, cycle_requests):
+        """完成一輪時輸出本輪的往返次數，回傳下一輪起算的請求數"""
+        cycle = scheduler.completed_cycle()
+        if cycle is None:
+            return cycle_requests
+        courses, depts = cycle
+        self.log('本輪完成：{} 個系所、{} 門課程，共 {} 次往返'.format(
+            depts, courses, self.select_stats['requests'] - cycle_requests))
+        return self.select_stats['requests']
+
+    def transport_stats(self):
+        return self.session.stats
+
+    def log_transport_stats(self):
+        for line in self.transport_stats().summary_lines():
+            self.log(line)
+
+    def log_course_outcomes(self, scheduler):
+        for attempt in scheduler.attempts:
+            if attempt.outcomes:
+                self.log('  {}：{}'.format(attempt.key, attempt.format_outcomes()))
 
     def selectCourses(self, coursesList, delay = 0):
-        while len(coursesList) > 0:
-            # 檢查是否需要停止
-            if self.stop_event.is_set():
+        # 依優先順序（'系所,課程,優先順序'）挑選下一門課，每門課依上一次的結果各自退避
+        scheduler = AttemptScheduler(coursesList, delay)
+        cycle_requests = self.select_stats['requests']
+        while len(scheduler) > 0:
+            attempt, wait = scheduler.next_attempt()
+            # 等待期間按下停止會立即返回
+            if self.stop_event.wait(wait) if wait > 0 else self.stop_event.is_set():
                 self.log("使用者已停止選課")
                 return
-                
-            for course in coursesList.copy():
-                # 檢查是否需要停止
+            course, dept, key = attempt.course, attempt.dept, attempt.key
+
+            # 更新狀態為嘗試中
+            if self.status_callback:
+                self.status_callback(key, "trying")
+
+            # check if the classID is legal
+            if key not in self.coursesDB:
+                self.log('{} is not a legal classID'.format(key))
+                scheduler.record(attempt, 'error')
+                coursesList.remove(course)
+                if self.status_callback:
+                    self.status_callback(key, "error")
+                continue
+
+            try:
+                # 沒有可重複使用的 postback 狀態時才重新送出系所清單
+                if dept not in self.dept_state:
+                    with self.metrics.span('dept_post'):
+                        html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
+                    self.select_stats['requests'] += 1
+                    self.select_stats['refreshes'] += 1
+                    if 'please log on again!' in html.text:
+                        # 逾時的請求期間 session 已失效，沒有收到重新登入的訊息
+                        self.log('登入狀態已失效，重新登入')
+                        self.dept_state.clear()
+                        if not self.login():
+                            return
+                        continue
+                    if dept in self.cached_depts and not self.is_dept_page_valid(html.text, key):
+                        if not self.refresh_cached_dept(dept):
+                            return
+                        continue
+                    self.dept_state[dept] = extract_hidden_fields(html.text)
+
+                # simulte click button
+                attempt_start = time.perf_counter()
+                with self.metrics.span('click_post'):
+                    html = self.session.post(self.courseListUrl, data= self.click_payload(dept, key))
+                self.select_stats['requests'] += 1
+                self.update_dept_state(dept, html.text)
+
+                # select course：會改變伺服器狀態的 GET，不重送
+                with self.metrics.span('select_get'):
+                    html = self.session.get(self.courseSelectUrl + self.coursesDB[key].mUrl + ' ,B,', retries=0)
+                self.select_stats['requests'] += 1
+                self.select_stats['attempts'] += 1
+            except requests.RequestException as e:
                 if self.stop_event.is_set():
                     self.log("使用者已停止選課")
                     return
-                    
-                tokens = course.split(',')
-                dept = tokens[0]
-                key  = tokens[1]
-                
-                # 更新狀態為嘗試中
+                # 逾時或連線中斷：postback 狀態不確定，與無法辨識的結果一樣退避後重試
+                self.log('{} 請求失敗（{}），稍後重試'.format(key, e))
+                self.dept_state.pop(dept, None)
+                scheduler.record(attempt, 'unknown')
                 if self.status_callback:
-                    self.status_callback(key, "trying")
-                
-                # check if the classID is legal
-                if key not in self.coursesDB:
-                    self.log('{} is not a legal classID'.format(key))
-                    coursesList.remove(course)
-                    if self.status_callback:
-                        self.status_callback(key, "error")
-                    continue
-                
-                # simulte click button
-                html = self.session.post(self.courseListUrl, data= self.selectPayLoad[dept])
-                parser = BeautifulSoup(html.text, 'lxml')
-
-                selectPayLoad = {
-                    '__EVENTTARGET': '',
-                    '__EVENTARGUMENT': '',
-                    '__LASTFOCUS': '',
-                    '__VIEWSTATE': parser.select("#__VIEWSTATE")[0]['value'],
-                    '__VIEWSTATEGENERATOR': parser.select("#__VIEWSTATEGENERATOR")[0]['value'],
-                    '__VIEWSTATEENCRYPTED': '',
-                    '__EVENTVALIDATION': parser.select("#__EVENTVALIDATION")[0]['value'],
-                    'Hidden1': '',
-                    'Hid_SchTime': '',
-                    'DPL_DeptName': dept,
-                    'DPL_Degree': '6',
-                    self.coursesDB[key]['mUrl'] + '.x': '0', 
-                    self.coursesDB[key]['mUrl'] + '.y': '0'
-                }
-                self.session.post(self.courseListUrl, data= selectPayLoad)
-
-                # select course
-                html = self.session.get(self.courseSelectUrl + self.coursesDB[key]['mUrl'] + ' ,B,')
-
-                # check if successful
-                parser = BeautifulSoup(html.text, 'lxml')
-                alertMsg = parser.select("script")[0].string.split(';')[0]
-                self.log('{} {}'.format(self.coursesDB[key]['name'], alertMsg[7:-2]))
-
-                if "加選訊息：" in alertMsg or "已選過" in alertMsg:
-                    coursesList.remove(course)
-                    if self.status_callback:
-                        self.status_callback(key, "success")
-                elif "please log on again!" in alertMsg:
-                    if not self.login():
-                        return
-                else:
-                    # 重試中
-                    if self.status_callback:
-                        self.status_callback(key, "retry")
+                    self.status_callback(key, "waiting")
+                continue
+            # 本次嘗試（點擊 POST + 選課 GET）的耗時，顯示在狀態表
+            latency_ms = (time.perf_counter() - attempt_start) * 1000
+
+            outcome = self.select_outcome(key, html.text, latency_ms)
+            scheduler.record(attempt, outcome)
+            if outcome == 'success' or outcome in FINAL_FAILURES:
+                coursesList.remove(course)
+            elif outcome == 'relogin':
+                # 舊的 postback 狀態屬於上一個 session
+                self.dept_state.clear()
+                if not self.login():
+                    return
+
+            # 每一輪：所有待選課程各嘗試一次，同系所的課程連續送出
+            cycle_requests = self.log_cycle(scheduler, cycle_requests)
+
+            if self.select_stats['attempts'] % 20 == 0:
+                self.log_select_stats()
+                self.log_course_outcomes(scheduler)
+                self.export_metrics()
+                self.save_session()
+
+        self.log_select_stats()
+        self.log_course_outcomes(scheduler)
+        self.log_transport_stats()
+        self.export_metrics()
+        self.save_session()
+
+    def select_outcome(self, key, html, latency_ms):
+        """解析選課結果的 alert，回傳排程用的結果（alerts.OUTCOMES 之一）"""
+        # check if successful
+        alertMsg = extract_first_script(html).split(';')[0]
+        self.log('{} {}'.format(self.coursesDB[key].title, alertMsg[7:-2]))
 
-                time.sleep(delay)
+        outcome = classify_alert(alertMsg, self.coursesDB[key].name)
+        if outcome in FINAL_FAILURES:
+            # 衝堂、學分上限或修課資格不符，重試也不會成功
+            self.log('{} 無法加選（{}），不再重試'.format(key, outcome))
+        if self.status_callback and outcome != 'relogin':
+            # 額滿與無法分類的訊息都顯示為重試中
+            status = outcome if outcome == 'success' or outcome in FINAL_FAILURES else "retry"
+            self.status_callback(key, status, latency_ms)
+        return outcome
 
     def log(self, msg):
         timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]", time.localtime())
@@ -308,6 +665,359 @@ class CourseBot:
         if self.log_callback:
             self.log_callback(full_msg)
 
+
+def http_error_text(error):
+    """httpx 的逾時例外沒有訊息，以例外名稱代替"""
+    return str(error) or type(error).__name__
+
+
+class AsyncCourseBot(CourseBot):
+    """asyncio 版本的 CourseBot，流程與 login / getCourseDB / selectCourses 相同
+
+    所有網路請求與等待都是 await，取消 task 時進行中的連線、delay 與異常登入的 10 分鐘等待會立即中斷，
+    不必等到下一次檢查 stop_event。驗證碼辨識在執行緒中進行，不會卡住 Flet 的事件迴圈。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = httpx.AsyncClient(
+            headers={'User-Agent': self.session.headers['User-Agent']},
+            follow_redirects=True,
+            # 與 transport.HttpSession 相同的逾時與連線池（httpx 預設即要求 gzip）；transport 的 retries 只重試建立連線
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            transport=httpx.AsyncHTTPTransport(retries=GET_RETRIES),
+            # 每個送出的請求都扣除每分鐘請求上限的額度
+            event_hooks={'request': [self.charge_budget]},
+        )
+        self.client_stats = TransportStats()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def http_cookies(self):
+        return self.client.cookies
+
+    def transport_stats(self):
+        return self.client_stats
+
+    async def request(self, method, url, **kwargs):
+        """透過 self.client 送出請求，與 transport.HttpSession 一樣統計每個頁面的位元組與延遲"""
+        request = self.client.build_request(method, url, **kwargs)
+        start = time.perf_counter()
+        try:
+            response = await self.client.send(request)
+        except httpx.HTTPError:
+            self.client_stats.record(method, url, time.perf_counter() - start, None, len(request.content))
+            raise
+        self.client_stats.record(method, url, time.perf_counter() - start, response, len(request.content))
+        return response
+
+    async def resume_session(self):
+        state = self.load_saved_session()
+        if state is None:
+            return False
+        try:
+            html = await self.request('GET', self.courseListUrl)
+        except httpx.HTTPError as e:
+            self.log('確認保存的登入狀態失敗（{}），重新登入'.format(http_error_text(e)))
+            self.http_cookies().clear()
+            return False
+        return self.accept_saved_session(state, html.text)
+
+    async def wait_for_opening(self):
+        while self.opening.open_at is not None:
+            if not self.opening.clock.samples or self.opening.sleep_before() > 0:
+                try:
+                    self.opening.clock.observe(await self.request('GET', self.loginUrl))
+                except httpx.HTTPError as e:
+                    # 沿用上次的時間差，下一次等待時再校正
+                    self.log('校正伺服器時間失敗（{}）'.format(http_error_text(e)))
+            wait = self.opening.sleep_before()
+            if wait <= 0:
+                return
+            self.log_opening_wait()
+            await asyncio.sleep(wait)
+
+    async def fetch_login_page(self):
+        with self.metrics.span('login_page'):
+            return await self.request('GET', self.loginUrl)
+
+    async def login(self):
+        low_confidence = 0
+        captcha = None
+        login_page = None
+        await self.wait_for_opening()
+
+        while True:
+            if self.stop_event.is_set():
+                self.log("使用者已停止")
+                return False
+
+            try:
+                # 等待開放期間保留已辨識的驗證碼（與其 session）
+                if captcha is None:
+                    # clear Session object
+                    self.client.cookies.clear()
+
+                    # download and recognize captch
+                    with self.metrics.span('captcha_download'):
+                        captchaHtml = await self.request('GET', self.captchaUrl)
+                    self.opening.clock.observe(captchaHtml)
+
+                    # 取得驗證碼時已建立 session，登入頁在辨識驗證碼的同時下載
+                    login_page = asyncio.create_task(self.fetch_login_page())
+                    try:
+                        captcha, confidence = await asyncio.to_thread(self.captchaOCR, captchaHtml.content)
+                    except BaseException:
+                        # 按下停止（task 被取消）或辨識失敗時，不留下無人等待的請求
+                        login_page.cancel()
+                        raise
+                    self.login_stats['captchas'] += 1
+
+                    # 可能辨識錯誤：重新取得驗證碼，不浪費一次登入 POST
+                    if confidence.min() < self.ocr_threshold and low_confidence < self.max_captcha_refetch:
+                        low_confidence += 1
+                        self.login_stats['skipped'] += 1
+                        self.log('驗證碼信心不足 {} ({:.2f})，重新取得'.format(captcha, confidence.min()))
+                        self.record_captcha(captchaHtml.content, captcha, confidence, 'skipped')
+                        captcha = None
+                        # 等進行中的請求結束才清除 cookies
+                        await login_page
+                        continue
+                    low_confidence = 0
+
+                # get login data（剛取得新驗證碼時已在下載中）
+                loginHtml = await login_page if login_page is not None else await self.fetch_login_page()
+            except httpx.HTTPError as e:
+                # 驗證碼或登入頁逾時：重新取得驗證碼
+                self.log('登入頁請求失敗（{}），重試'.format(http_error_text(e)))
+                captcha = login_page = None
+                continue
+            login_page = None
+            self.opening.clock.observe(loginHtml)
+
+            # check if system is open
+            if '選課系統尚未開放!' in loginHtml.text:
+                wait = self.opening.next_poll()
+                self.log('選課系統尚未開放! {:.1f} 秒後再試'.format(wait))
+                await asyncio.sleep(wait)
+                continue
+            self.opening.opened()
+
+            self.update_login_payload(loginHtml.text, captcha)
+            login_captcha, captcha = captcha, None
+
+            try:
+                with self.metrics.span('login_post'):
+                    result = await self.request('POST', self.loginUrl, data= self.loginPayLoad)
+            except httpx.HTTPError as e:
+                # 登入 POST 不重送，改用新的驗證碼重新登入
+                self.log('登入請求失敗（{}），重試'.format(http_error_text(e)))
+                continue
+            login_result = self.check_login_result(result.text, login_captcha, captchaHtml.content, confidence)
+            if login_result is None:
+                continue
+            return login_result
+
+    async def refresh_cached_dept(self, dept):
+        self.log('{} 的快取資料已失效，重新下載...'.format(dept))
+        entry = self.course_cache.invalidate(dept, self.semester)
+        if entry is not None:
+            for key in entry['courses']:
+                self.coursesDB.pop(key, None)
+        self.cached_depts.discard(dept)
+        self.dept_state.pop(dept, None)
+        return await self.getCourseDB([dept], refresh=True)
+
+    async def getCourseDB(self, depts, refresh=False):
+
+        pending = list(depts)
+        while pending:
+            dept = pending.pop(0)
+            # 快取仍有效時直接使用，不必重新下載 CosList.aspx
+            if not refresh and self.load_cached_dept(dept):
+                continue
+
+            try:
+                # get a fresh ViewState for the department postback
+                with self.metrics.span('catalog_page'):
+                    html = await self.request('GET', self.courseListUrl)
+                if "異常登入" in html.text:
+                    self.log("異常登入，休息10分鐘!")
+                    await asyncio.sleep(600) # sleep 10 min
+                    pending.insert(0, dept)
+                    continue
+                self.selectPayLoad[dept] = self.dept_payload(dept, extract_hidden_fields(html.text))
+
+                with self.metrics.span('dept_post'):
+                    html = await self.request('POST', self.courseListUrl, data= self.selectPayLoad[dept])
+            except httpx.HTTPError as e:
+                # 系所清單的 postback 不會改變伺服器狀態，稍後重新下載該系所
+                self.log('{} 課程清單請求失敗（{}），稍後重試'.format(dept, http_error_text(e)))
+                await asyncio.sleep(1)
+                pending.append(dept)
+                continue
+            if "Error" in html.text:
+                self.log('Wrong coursesList, please check it again!')
+                return False
+            self.save_dept_courses(dept, html.text)
+
+        self.save_session()
+        return True
+
+    async def charge_budget(self, request):
+        # 只在事件迴圈中執行，不需要 RequestBudget 的 lock
+        wait = self.request_budget.delay()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.request_budget.delay()
+        self.request_budget.spend()
+
+    async def selectCourses(self, coursesList, delay = 0):
+        scheduler = AttemptScheduler(coursesList, delay)
+        cycle_requests = self.select_stats['requests']
+        while len(scheduler) > 0:
+            if self.stop_event.is_set():
+                self.log("使用者已停止選課")
+                return
+            attempt, wait = scheduler.next_attempt()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            course, dept, key = attempt.course, attempt.dept, attempt.key
+
+            # 更新狀態為嘗試中
+            if self.status_callback:
+                self.status_callback(key, "trying")
+
+            # check if the classID is legal
+            if key not in self.coursesDB:
+                self.log('{} is not a legal classID'.format(key))
+                scheduler.record(attempt, 'error')
+                coursesList.remove(course)
+                if self.status_callback:
+                    self.status_callback(key, "error")
+                continue
+
+            try:
+                # 沒有可重複使用的 postback 狀態時才重新送出系所清單
+                if dept not in self.dept_state:
+                    with self.metrics.span('dept_post'):
+                        html = await self.request('POST', self.courseListUrl, data= self.selectPayLoad[dept])
+                    self.select_stats['requests'] += 1
+                    self.select_stats['refreshes'] += 1
+                    if 'please log on again!' in html.text:
+                        # 逾時的請求期間 session 已失效，沒有收到重新登入的訊息
+                        self.log('登入狀態已失效，重新登入')
+                        self.dept_state.clear()
+                        if not await self.login():
+                            return
+                        continue
+                    if dept in self.cached_depts and not self.is_dept_page_valid(html.text, key):
+                        if not await self.refresh_cached_dept(dept):
+                            return
+                        continue
+                    self.dept_state[dept] = extract_hidden_fields(html.text)
+
+                # simulte click button
+                attempt_start = time.perf_counter()
+                with self.metrics.span('click_post'):
+                    html = await self.request('POST', self.courseListUrl, data= self.click_payload(dept, key))
+                self.select_stats['requests'] += 1
+                self.update_dept_state(dept, html.text)
+
+                # select course：會改變伺服器狀態的 GET，不重送
+                with self.metrics.span('select_get'):
+                    html = await self.request('GET', self.courseSelectUrl + self.coursesDB[key].mUrl + ' ,B,')
+                self.select_stats['requests'] += 1
+                self.select_stats['attempts'] += 1
+            except httpx.HTTPError as e:
+                # 逾時或連線中斷：postback 狀態不確定，與無法辨識的結果一樣退避後重試
+                self.log('{} 請求失敗（{}），稍後重試'.format(key, http_error_text(e)))
+                self.dept_state.pop(dept, None)
+                scheduler.record(attempt, 'unknown')
+                if self.status_callback:
+                    self.status_callback(key, "waiting")
+                continue
+            latency_ms = (time.perf_counter() - attempt_start) * 1000
+
+            outcome = self.select_outcome(key, html.text, latency_ms)
+            scheduler.record(attempt, outcome)
+            if outcome == 'success' or outcome in FINAL_FAILURES:
+                coursesList.remove(course)
+            elif outcome == 'relogin':
+                # 舊的 postback 狀態屬於上一個 session
+                self.dept_state.clear()
+                if not await self.login():
+                    return
+
+            cycle_requests = self.log_cycle(scheduler, cycle_requests)
+
+            if self.select_stats['attempts'] % 20 == 0:
+                self.log_select_stats()
+                self.log_course_outcomes(scheduler)
+                self.export_metrics()
+                self.save_session()
+
+        self.log_select_stats()
+        self.log_course_outcomes(scheduler)
+        self.log_transport_stats()
+        self.export_metrics()
+        self.save_session()
+
+
+class LogBuffer:
+    """執行日誌的環狀緩衝區：畫面只保留最近 capacity 行，較舊的行寫入 spill_path
+
+    背景執行緒只把訊息放進緩衝區，由 GUI 以固定間隔呼叫 drain() 批次更新畫面，
+    不會每一行都觸發一次 page.update()，長時間重試後畫面也不會越來越慢。
+    """
+
+    def __init__(self, capacity=500, spill_path=None):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.lines = deque()
+        self.pending = deque(maxlen=capacity)
+        self.spilled = []
+        self.lock = Lock()
+        self._rotate()
+
+    def _rotate(self, max_bytes=5 * 1024 * 1024):
+        # 上次留下的日誌檔太大時改名為 .1，只保留一份舊檔
+        try:
+            if self.spill_path and os.path.getsize(self.spill_path) > max_bytes:
+                os.replace(self.spill_path, self.spill_path + '.1')
+        except OSError:
+            pass
+
+    def append(self, msg, color):
+        with self.lock:
+            if len(self.lines) >= self.capacity:
+                self.spilled.append(self.lines.popleft()[0])
+            self.lines.append((msg, color))
+            self.pending.append((msg, color))
+
+    def clear(self):
+        with self.lock:
+            self.spilled.extend(msg for msg, _ in self.lines)
+            self.lines.clear()
+            self.pending.clear()
+
+    def drain(self):
+        """取出尚未顯示的新訊息，並把被擠出緩衝區的舊訊息寫入檔案"""
+        with self.lock:
+            pending = list(self.pending)
+            self.pending.clear()
+            spilled, self.spilled = self.spilled, []
+        if spilled and self.spill_path:
+            try:
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(spilled) + '\n')
+            except OSError:
+                pass
+        return pending
+
+
 def main(page: ft.Page):
     # 設定頁面屬性
     page.title = "元智大學選課機器人"
@@ -323,9 +1033,32 @@ def main(page: ft.Page):
     # 設定檔路徑
     CONFIG_DIR = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'yzuCourseBot')
     CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.ini')
+    CACHE_FILE = os.path.join(CONFIG_DIR, 'course_cache.json')
+    # 各階段耗時統計（metrics.json / metrics.prom）
+    METRICS_PATH = os.path.join(CONFIG_DIR, 'metrics')
+    # 加密保存的登入狀態
+    SESSION_FILE = os.path.join(CONFIG_DIR, 'session.bin')
+    # 由登入結果自動標記的驗證碼資料集
+    CAPTCHA_CORPUS_DIR = os.path.join(CONFIG_DIR, 'captchas')
+    # 超出畫面保留行數的舊日誌
+    LOG_FILE = os.path.join(CONFIG_DIR, 'bot.log')
+    LOG_CAPACITY = 500
+    # 日誌與課程狀態表合併成每個畫面週期一次 page.update()
+    UI_FLUSH_INTERVAL = 0.2  # 秒
+    # 課程清單自動完成最多顯示的建議數
+    SUGGESTION_LIMIT = 6
     
     # 全域變數
     stop_event = Event()
+    # 視窗關閉後 flush_ui_loop 才結束
+    page_closed = Event()
+    # asyncio 引擎執行中的 task（停止時直接取消）
+    bot_task = None
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    log_buffer = LogBuffer(LOG_CAPACITY, LOG_FILE)
+    # 由課程快取建立的課程資料，用來檢查與自動完成課程清單（不需登入）
+    course_catalog = CourseCatalog()
+    course_trie = CourseTrie()
     
     # ===== UI 元件定義 =====
     
@@ -365,17 +1098,84 @@ def main(page: ft.Page):
         expand=True
     )
     
+    # 進階設定（移至設定分頁）
+    ocr_backend_dropdown = ft.Dropdown(
+        label="驗證碼辨識引擎",
+        value="numpy",
+        options=[
+            ft.dropdown.Option("numpy", "NumPy（不載入 TensorFlow，啟動較快）"),
+            ft.dropdown.Option("keras", "TensorFlow / Keras"),
+        ],
+    )
+
+    ocr_threshold_field = ft.TextField(
+        label="驗證碼信心門檻 (0~1)",
+        value="0",
+        hint_text="任一字元信心低於門檻時重新取得驗證碼，0 表示不啟用",
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+
+    ocr_accuracy_floor_field = ft.TextField(
+        label="量化模型正確率門檻 (0~1)",
+        value="",
+        hint_text="量化模型評估的逐字元正確率不低於門檻時改用量化模型（僅 NumPy），留空表示不使用",
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+
+    requests_per_minute_field = ft.TextField(
+        label="每分鐘請求上限",
+        value="60",
+        hint_text="每分鐘最多送出的請求數（包含登入，每次選課嘗試 2 個），0 表示不限制",
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+
+    open_time_field = ft.TextField(
+        label="選課開放時間",
+        value="",
+        hint_text="YYYY-MM-DD HH:MM，開放前休眠並提前辨識驗證碼，留空表示立即登入",
+    )
+
+    refresh_catalog_checkbox = ft.Checkbox(label="忽略課程快取，重新下載課程資料", value=False)
+
+    remember_session_checkbox = ft.Checkbox(label="保存登入狀態（加密），重新啟動時免登入", value=False)
+    collect_captchas_checkbox = ft.Checkbox(label="收集驗證碼資料集（用於評估與重新訓練辨識模型）", value=False)
+
+    advanced_card = ft.Card(
+        content=ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text("進階設定", size=14, weight=ft.FontWeight.BOLD),
+                    ft.Text("變更後請按「儲存設定」，下次開始選課時生效。", size=12, color=ft.Colors.GREY_600),
+                    ocr_backend_dropdown,
+                    ocr_threshold_field,
+                    ocr_accuracy_floor_field,
+                    requests_per_minute_field,
+                    open_time_field,
+                    refresh_catalog_checkbox,
+                    remember_session_checkbox,
+                    collect_captchas_checkbox,
+                ],
+                spacing=8
+            ),
+            padding=12
+        ),
+        expand=True
+    )
+    
     # 2. 課程清單區
     courses_field = ft.TextField(
         multiline=True,
         min_lines=6,
         max_lines=6,
-        hint_text="每行一個，格式：部門代碼,課程代碼（例：312,EEB219A）",
+        hint_text="每行一個，格式：部門代碼,課程代碼[,優先順序]（例：312,EEB219A,1，數字越大越優先）",
         text_size=13,
         border_radius=8,
         bgcolor=ft.Colors.WHITE,
         border_color=ft.Colors.GREY_400,
     )
+
+    # 輸入課程代碼或課名時，依課程快取顯示建議
+    course_suggestions = ft.Column(controls=[], spacing=0, visible=False)
     
     courses_card = ft.Container(
         bgcolor=ft.Colors.WHITE,
@@ -391,7 +1191,8 @@ def main(page: ft.Page):
                     padding=ft.padding.all(8),
                     bgcolor=ft.Colors.GREY_50,
                     border_radius=10,
-                )
+                ),
+                course_suggestions,
             ],
             spacing=8
         )
@@ -436,13 +1237,20 @@ def main(page: ft.Page):
     
     # 4. 課程狀態區（自訂表頭 + 滾動內容）
     status_entries = {}
+    # 背景執行緒送來、尚未顯示的狀態，每門課只保留最新一筆
+    pending_status = {}
+    status_lock = Lock()
+    # log_view / status_list 的 controls 由 flush_ui_loop 在背景執行緒修改，清除時也必須持有同一個 lock
+    ui_lock = Lock()
     
     status_header = ft.Container(
         content=ft.Row(
             [
-                ft.Container(ft.Text("課程代碼", size=13, weight=ft.FontWeight.BOLD), width=120),
+                ft.Container(ft.Text("課程代碼", size=13, weight=ft.FontWeight.BOLD), width=100),
                 ft.Container(ft.Text("狀態", size=13, weight=ft.FontWeight.BOLD), expand=True),
-                ft.Container(ft.Text("最後更新", size=13, weight=ft.FontWeight.BOLD), width=100, alignment=ft.alignment.center_right),
+                ft.Container(ft.Text("次數", size=13, weight=ft.FontWeight.BOLD), width=40, alignment=ft.alignment.center_right),
+                ft.Container(ft.Text("延遲", size=13, weight=ft.FontWeight.BOLD), width=70, alignment=ft.alignment.center_right),
+                ft.Container(ft.Text("最後更新", size=13, weight=ft.FontWeight.BOLD), width=70, alignment=ft.alignment.center_right),
             ],
             vertical_alignment=ft.CrossAxisAlignment.CENTER,
         ),
@@ -466,7 +1274,7 @@ def main(page: ft.Page):
         content=ft.Column(
             [
                 ft.Text("選課狀態", size=14, weight=ft.FontWeight.BOLD),
-                ft.Text("顯示目前各課程的選課狀態與最後更新時間", size=12, color=ft.Colors.GREY_600),
+                ft.Text("顯示目前各課程的選課狀態、嘗試次數、最後一次延遲與更新時間", size=12, color=ft.Colors.GREY_600),
                 ft.Container(
                     border=ft.border.all(1, ft.Colors.GREY_400),
                     border_radius=10,
@@ -535,6 +1343,7 @@ def main(page: ft.Page):
         [
             ft.Text("帳號與登入設定", size=18, weight=ft.FontWeight.BOLD),
             login_card,
+            advanced_card,
             ft.Container(height=15),
             ft.Text("關於", size=18, weight=ft.FontWeight.BOLD),
             ft.Divider(),
@@ -549,12 +1358,43 @@ def main(page: ft.Page):
     # ===== 功能函數 =====
     
     def log_message(msg, color=ft.Colors.BLACK):
-        log_view.controls.append(ft.Text(msg, color=color, size=13, font_family="Consolas"))
-        page.update()
+        # 只放進緩衝區，由 flush_ui_loop 批次顯示
+        log_buffer.append(msg, color)
+
+    def flush_ui_loop():
+        """每 UI_FLUSH_INTERVAL 秒把新的日誌與課程狀態一次更新到畫面上，畫面最多保留 LOG_CAPACITY 行日誌"""
+        update_failed = False
+        while not page_closed.wait(UI_FLUSH_INTERVAL):
+            pending = log_buffer.drain()
+            with status_lock:
+                statuses = dict(pending_status)
+                pending_status.clear()
+            if not pending and not statuses:
+                continue
+            with ui_lock:
+                if pending:
+                    log_view.controls.extend(ft.Text(msg, color=color, size=13, font_family="Consolas") for msg, color in pending)
+                    excess = len(log_view.controls) - LOG_CAPACITY
+                    if excess > 0:
+                        del log_view.controls[:excess]
+                for course_key, update in statuses.items():
+                    apply_status(course_key, update)
+                try:
+                    page.update()
+                except Exception as e:
+                    # 暫時性的錯誤：已加入的日誌與狀態會在下一次更新時顯示；連續失敗時只記錄一次
+                    if not update_failed:
+                        log_message('畫面更新失敗: {}'.format(e), ft.Colors.ORANGE)
+                    update_failed = True
+                else:
+                    update_failed = False
         
     def clear_log():
-        log_view.controls.clear()
-        page.update()
+        with ui_lock:
+            log_buffer.clear()
+            log_buffer.drain()
+            log_view.controls.clear()
+            page.update()
     
     def show_center_snack(message, bgcolor=ft.Colors.RED, duration=2, icon=None):
         """顯示居中的提示訊息，帶有淡入和淡出動畫"""
@@ -643,18 +1483,32 @@ def main(page: ft.Page):
         
         Thread(target=fade_in_out_and_close, daemon=True).start()
         
-    def update_status(course_key, status):
+    def update_status(course_key, status, latency=None):
+        """由背景執行緒呼叫：只記下每門課最新的狀態，畫面由 flush_ui_loop 合併更新"""
+        with status_lock:
+            update = pending_status.setdefault(course_key, {'attempts': 0, 'latency': None})
+            update['status'] = status
+            update['time'] = time.strftime("%H:%M:%S")
+            # 有延遲代表完成了一次選課嘗試
+            if latency is not None:
+                update['attempts'] += 1
+                update['latency'] = latency
+
+    def apply_status(course_key, update):
+        status = update['status']
         # 狀態對應的顏色與圖示
         status_map = {
             "waiting": (ft.Colors.GREY, "等待中", ft.Icons.ACCESS_TIME),
             "trying": (ft.Colors.BLUE, "嘗試中...", ft.Icons.REFRESH),
             "success": (ft.Colors.GREEN, "已選上", ft.Icons.CHECK_CIRCLE),
             "retry": (ft.Colors.ORANGE, "重試中", ft.Icons.REPLAY),
+            "conflict": (ft.Colors.RED, "衝堂", ft.Icons.BLOCK),
+            "ineligible": (ft.Colors.RED, "不符資格", ft.Icons.BLOCK),
             "error": (ft.Colors.RED, "失敗", ft.Icons.ERROR),
         }
         
         color, text, icon = status_map.get(status, (ft.Colors.BLACK, status, ft.Icons.INFO))
-        timestamp = time.strftime("%H:%M:%S")
+        timestamp = update['time']
         
         entry = status_entries.get(course_key)
         if entry:
@@ -667,6 +1521,8 @@ def main(page: ft.Page):
             code_text = ft.Text(course_key, weight=ft.FontWeight.BOLD)
             status_icon = ft.Icon(icon, color=color, size=16)
             status_text = ft.Text(text, color=color)
+            attempts_text = ft.Text("0")
+            latency_text = ft.Text("-")
             time_text = ft.Text(timestamp)
             
             row = ft.Container(
@@ -675,44 +1531,77 @@ def main(page: ft.Page):
                 border=ft.border.only(bottom=ft.border.BorderSide(1, ft.Colors.GREY_200)),
                 content=ft.Row(
                     [
-                        ft.Container(code_text, width=120),
+                        ft.Container(code_text, width=100),
                         ft.Container(ft.Row([status_icon, status_text], spacing=5), expand=True),
-                        ft.Container(time_text, width=100, alignment=ft.alignment.center_right),
+                        ft.Container(attempts_text, width=40, alignment=ft.alignment.center_right),
+                        ft.Container(latency_text, width=70, alignment=ft.alignment.center_right),
+                        ft.Container(time_text, width=70, alignment=ft.alignment.center_right),
                     ],
                     vertical_alignment=ft.CrossAxisAlignment.CENTER,
                 )
             )
             
-            status_entries[course_key] = {
+            entry = status_entries[course_key] = {
                 "row": row,
                 "icon": status_icon,
                 "status_text": status_text,
+                "attempts_text": attempts_text,
+                "latency_text": latency_text,
                 "time_text": time_text,
+                "attempts": 0,
             }
             status_list.controls.append(row)
-        page.update()
 
-    def run_bot_thread(account, password, courses_list, delay):
+        if update['attempts']:
+            entry["attempts"] += update['attempts']
+            entry["attempts_text"].value = str(entry["attempts"])
+        if update['latency'] is not None:
+            entry["latency_text"].value = f"{update['latency']:.0f} ms"
+
+    def warm_up_model():
+        """開啟 GUI 時在背景載入並預熱驗證碼模型，按下開始後的第一張驗證碼不必再等待"""
+        backend = ocr_backend_dropdown.value
+        try:
+            floor = float(ocr_accuracy_floor_field.value) if ocr_accuracy_floor_field.value else None
+            model_path, _ = choose_model(resource_path('model.h5'), backend, floor)
+            start = time.perf_counter()
+            predictor = get_predictor(model_path, backend)
+            load_ms = (time.perf_counter() - start) * 1000
+            first_ms, steady_ms = predictor.warm_up()
+            log_message(f"驗證碼模型已預熱 ({backend})：載入 {load_ms:.0f} ms，首次推論 {first_ms:.1f} ms，穩定後 {steady_ms:.1f} ms", ft.Colors.GREY)
+        except Exception as e:
+            log_message(f"驗證碼模型預熱失敗: {str(e)}", ft.Colors.RED)
+
+    def run_bot_thread(account, password, courses_list, delay, ocr_backend, ocr_threshold, ocr_accuracy_floor, refresh_catalog, requests_per_minute, open_time, session_path, captcha_corpus_path):
+        bot = None
         try:
             # 初始化狀態
             for course in courses_list:
-                key = course.split(',')[1] if ',' in course else course
-                update_status(key, "waiting")
+                update_status(parse_course(course)[1], "waiting")
             
-            depts = set([i.split(',')[0] for i in courses_list])
+            depts = set([parse_course(i)[0] for i in courses_list])
             
             bot = CourseBot(
                 account, 
                 password, 
                 log_callback=lambda msg: log_message(msg),
                 status_callback=update_status,
-                stop_event=stop_event
+                stop_event=stop_event,
+                ocr_backend=ocr_backend,
+                ocr_threshold=ocr_threshold,
+                ocr_accuracy_floor=ocr_accuracy_floor,
+                cache_path=CACHE_FILE,
+                metrics_path=METRICS_PATH,
+                requests_per_minute=requests_per_minute,
+                open_time=open_time,
+                session_path=session_path,
+                captcha_corpus_path=captcha_corpus_path
             )
             
             if stop_event.is_set(): return
 
             log_message("正在登入...", ft.Colors.BLUE)
-            if not bot.login():
+            if not bot.resume_session() and not bot.login():
                 log_message("登入失敗！", ft.Colors.RED)
                 finish_bot()
                 return
@@ -720,7 +1609,7 @@ def main(page: ft.Page):
             if stop_event.is_set(): return
             
             log_message("正在獲取課程資料...", ft.Colors.BLUE)
-            if not bot.getCourseDB(depts):
+            if not bot.getCourseDB(depts, refresh=refresh_catalog):
                 log_message("獲取課程資料失敗！", ft.Colors.RED)
                 finish_bot()
                 return
@@ -735,9 +1624,80 @@ def main(page: ft.Page):
         except Exception as e:
             log_message(f"發生錯誤: {str(e)}", ft.Colors.RED)
         finally:
+            # 按下停止時還沒寫出的驗證碼（登入成功前的 wrong / skipped）
+            if bot is not None:
+                bot.flush_captcha_corpus()
+            finish_bot()
+
+    async def run_bot_async(account, password, courses_list, delay, ocr_backend, ocr_threshold, ocr_accuracy_floor, refresh_catalog, requests_per_minute, open_time, session_path, captcha_corpus_path):
+        """與 run_bot_thread 相同的流程，在 Flet 的事件迴圈中執行；按下停止時整個 task 會被取消"""
+        bot = None
+        try:
+            # 初始化狀態
+            for course in courses_list:
+                update_status(parse_course(course)[1], "waiting")
+
+            depts = set([parse_course(i)[0] for i in courses_list])
+
+            bot = AsyncCourseBot(
+                account,
+                password,
+                log_callback=lambda msg: log_message(msg),
+                status_callback=update_status,
+                stop_event=stop_event,
+                ocr_backend=ocr_backend,
+                ocr_threshold=ocr_threshold,
+                ocr_accuracy_floor=ocr_accuracy_floor,
+                cache_path=CACHE_FILE,
+                metrics_path=METRICS_PATH,
+                requests_per_minute=requests_per_minute,
+                open_time=open_time,
+                session_path=session_path,
+                captcha_corpus_path=captcha_corpus_path
+            )
+
+            log_message("正在登入...", ft.Colors.BLUE)
+            if not await bot.resume_session() and not await bot.login():
+                log_message("登入失敗！", ft.Colors.RED)
+                return
+
+            log_message("正在獲取課程資料...", ft.Colors.BLUE)
+            if not await bot.getCourseDB(depts, refresh=refresh_catalog):
+                log_message("獲取課程資料失敗！", ft.Colors.RED)
+                return
+
+            log_message("開始選課...", ft.Colors.GREEN)
+            await bot.selectCourses(courses_list, delay)
+
+            log_message("選課流程結束！", ft.Colors.GREEN)
+
+        except asyncio.CancelledError:
+            log_message("使用者已停止", ft.Colors.ORANGE)
+        except Exception as e:
+            log_message(f"發生錯誤: {str(e)}", ft.Colors.RED)
+        finally:
+            if bot is not None:
+                bot.flush_captcha_corpus()
+                await bot.aclose()
             finish_bot()
 
+    def parse_number_field(field, cast, high=None, default=None, required=False):
+        """讀取數值欄位（不可為負數）；格式或範圍錯誤時在欄位顯示錯誤並丟出 ValueError，選填欄位空白時回傳 default"""
+        field.error_text = None
+        text = (field.value or '').strip()
+        if not text and not required:
+            return default
+        try:
+            value = cast(text)
+        except ValueError:
+            value = None
+        if value is None or value < 0 or (high is not None and value > high):
+            field.error_text = '請輸入 0 ~ {} 的數字'.format(high) if high is not None else '請輸入不小於 0 的{}'.format('整數' if cast is int else '數字')
+            raise ValueError(field.label)
+        return value
+
     def start_bot(e):
+        nonlocal bot_task
         # 檢查登入資訊
         account = ""
         password = ""
@@ -757,11 +1717,48 @@ def main(page: ft.Page):
         if not courses_field.value:
             show_center_snack("請輸入課程清單", ft.Colors.RED, duration=2)
             return
-        
+
+        # 以課程快取檢查課程清單，打錯的課程代碼不必等到登入後才發現；
+        # 勾選重新下載課程資料時快取可能已經過時，只檢查格式
+        catalog = CourseCatalog() if refresh_catalog_checkbox.value else course_catalog
+        errors = check_course_lines([line.strip() for line in courses_field.value.split('\n') if line.strip()], catalog)
+        if errors:
+            courses_field.error_text = '；'.join('第 {} 行：{}'.format(lineno, msg) for lineno, msg in errors[:3])
+            show_center_snack("課程清單有 {} 行錯誤（課程資料過時可勾選重新下載課程資料）".format(len(errors)), ft.Colors.RED, duration=2)
+            return
+        courses_field.error_text = None
+        course_suggestions.visible = False
+
+        try:
+            open_time = parse_open_time(open_time_field.value)
+        except ValueError:
+            show_center_snack("開放時間格式錯誤，請使用 YYYY-MM-DD HH:MM", ft.Colors.RED, duration=2)
+            return
+
+        # 數值欄位在鎖定 UI 之前檢查，輸入錯誤時不會卡在執行中的狀態
+        numbers = {}
+        invalid = []
+        for name, field, cast, high, default in (
+                ('delay', delay_field, float, None, None),
+                ('ocr_threshold', ocr_threshold_field, float, 1, 0.0),
+                ('ocr_accuracy_floor', ocr_accuracy_floor_field, float, 1, None),
+                ('requests_per_minute', requests_per_minute_field, int, None, 0)):
+            try:
+                numbers[name] = parse_number_field(field, cast, high, default, required=field is delay_field)
+            except ValueError:
+                invalid.append(field.label)
+        if invalid:
+            page.update()
+            show_center_snack("格式錯誤：{}".format('、'.join(invalid)), ft.Colors.RED, duration=2)
+            return
+
         # 重置狀態列表
-        status_list.controls.clear()
-        status_entries.clear()
-        page.update()
+        with ui_lock:
+            with status_lock:
+                pending_status.clear()
+            status_list.controls.clear()
+            status_entries.clear()
+            page.update()
 
         # 鎖定 UI
         start_btn.disabled = True
@@ -770,20 +1767,39 @@ def main(page: ft.Page):
         password_field.disabled = True
         courses_field.disabled = True
         delay_field.disabled = True
+        ocr_backend_dropdown.disabled = True
+        ocr_threshold_field.disabled = True
+        ocr_accuracy_floor_field.disabled = True
+        requests_per_minute_field.disabled = True
+        open_time_field.disabled = True
+        remember_session_checkbox.disabled = True
+        collect_captchas_checkbox.disabled = True
+        refresh_catalog_checkbox.disabled = True
         page.update()
         
         stop_event.clear()
         
         # 解析課程
         courses_list = [line.strip() for line in courses_field.value.split('\n') if line.strip()]
-        delay = float(delay_field.value)
+        delay = numbers['delay']
+        ocr_threshold = numbers['ocr_threshold']
+        ocr_accuracy_floor = numbers['ocr_accuracy_floor']
+        requests_per_minute = numbers['requests_per_minute'] or None
         
-        # 啟動執行緒
-        t = Thread(target=run_bot_thread, args=(account_field.value, password_field.value, courses_list, delay), daemon=True)
-        t.start()
+        args = (account_field.value, password_field.value, courses_list, delay, ocr_backend_dropdown.value, ocr_threshold, ocr_accuracy_floor, refresh_catalog_checkbox.value, requests_per_minute, open_time, SESSION_FILE if remember_session_checkbox.value else None, CAPTCHA_CORPUS_DIR if collect_captchas_checkbox.value else None)
+        if httpx is not None:
+            # 使用 asyncio 引擎，停止時可立即中斷
+            bot_task = page.run_task(run_bot_async, *args)
+        else:
+            # 未安裝 httpx 時退回執行緒版本
+            bot_task = None
+            t = Thread(target=run_bot_thread, args=args, daemon=True)
+            t.start()
 
     def stop_bot_click(e):
         stop_event.set()
+        if bot_task is not None:
+            bot_task.cancel()
         log_message("正在停止...", ft.Colors.ORANGE)
         stop_btn.disabled = True
         page.update()
@@ -795,6 +1811,56 @@ def main(page: ft.Page):
         password_field.disabled = False
         courses_field.disabled = False
         delay_field.disabled = False
+        ocr_backend_dropdown.disabled = False
+        ocr_threshold_field.disabled = False
+        ocr_accuracy_floor_field.disabled = False
+        requests_per_minute_field.disabled = False
+        open_time_field.disabled = False
+        remember_session_checkbox.disabled = False
+        collect_captchas_checkbox.disabled = False
+        refresh_catalog_checkbox.disabled = False
+        page.update()
+        # 選課過程可能下載了新的系所課程資料
+        Thread(target=load_course_catalog, daemon=True).start()
+
+    def load_course_catalog():
+        nonlocal course_catalog, course_trie
+        try:
+            catalog = catalog_from_cache(CourseCache(CACHE_FILE), current_semester())
+        except Exception:
+            return
+        course_catalog, course_trie = catalog, CourseTrie(catalog)
+
+    def on_courses_change(e):
+        courses_field.error_text = None
+        lines = (courses_field.value or '').split('\n')
+        current = lines[-1].strip()
+        # 'CS35' 或 '304,CS35'：補上課程代碼與部門代碼；已輸入優先順序時不再建議
+        dept, sep, prefix = current.rpartition(',')
+        dept, prefix = dept.strip(), prefix.strip()
+        if sep and ',' in dept:
+            prefix = ''
+        records = course_trie.search(prefix, SUGGESTION_LIMIT, dept or None) if len(prefix) >= 2 else []
+        if len(records) == 1 and records[0].key == prefix and dept == records[0].dept:
+            records = []
+
+        def choose(record):
+            def on_click(e):
+                lines[-1] = '{},{}'.format(record.dept, record.key)
+                courses_field.value = '\n'.join(lines)
+                course_suggestions.visible = False
+                page.update()
+            return on_click
+
+        course_suggestions.controls = [
+            ft.TextButton(
+                '{},{}  {}{}'.format(record.dept, record.key, record.name,
+                                     '（{} 學分）'.format(record.credits) if record.credits is not None else ''),
+                on_click=choose(record),
+            )
+            for record in records
+        ]
+        course_suggestions.visible = bool(records)
         page.update()
 
     def load_config():
@@ -807,6 +1873,13 @@ def main(page: ft.Page):
                     password_field.value = config['Default'].get('Password', '')
                     remember = config['Default'].getboolean('RememberMe', False)
                     remember_checkbox.value = remember
+                    ocr_backend_dropdown.value = config['Default'].get('OcrBackend', 'numpy')
+                    ocr_threshold_field.value = config['Default'].get('OcrThreshold', '0')
+                    ocr_accuracy_floor_field.value = config['Default'].get('OcrAccuracyFloor', '')
+                    requests_per_minute_field.value = config['Default'].get('RequestsPerMinute', '60')
+                    open_time_field.value = config['Default'].get('OpenTime', '')
+                    remember_session_checkbox.value = config['Default'].getboolean('RememberSession', False)
+                    collect_captchas_checkbox.value = config['Default'].getboolean('CollectCaptchas', False)
                     if remember:
                         log_message("已載入儲存的帳號資訊", ft.Colors.BLUE)
             except Exception:
@@ -820,7 +1893,14 @@ def main(page: ft.Page):
             config['Default'] = {
                 'Account': account_field.value,
                 'Password': password_field.value,
-                'RememberMe': str(remember_checkbox.value)
+                'RememberMe': str(remember_checkbox.value),
+                'OcrBackend': ocr_backend_dropdown.value,
+                'OcrThreshold': ocr_threshold_field.value,
+                'OcrAccuracyFloor': ocr_accuracy_floor_field.value,
+                'RequestsPerMinute': requests_per_minute_field.value,
+                'OpenTime': open_time_field.value,
+                'RememberSession': str(remember_session_checkbox.value),
+                'CollectCaptchas': str(collect_captchas_checkbox.value)
             }
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
                 config.write(f)
@@ -832,6 +1912,9 @@ def main(page: ft.Page):
         if os.path.exists(CONFIG_FILE):
             os.remove(CONFIG_FILE)
             show_center_snack("已清除設定", ft.Colors.GREEN, duration=2)
+        # 保存的登入狀態也一併刪除
+        if os.path.exists(SESSION_FILE):
+            os.remove(SESSION_FILE)
         remember_checkbox.value = False
         account_field.value = ""
         password_field.value = ""
@@ -840,6 +1923,8 @@ def main(page: ft.Page):
     # 綁定事件
     start_btn.on_click = start_bot
     stop_btn.on_click = stop_bot_click
+    courses_field.on_change = on_courses_change
+    ocr_backend_dropdown.on_change = lambda e: Thread(target=warm_up_model, daemon=True).start()
 
     # 建立分頁
     tabs = ft.Tabs(
@@ -874,7 +1959,14 @@ def main(page: ft.Page):
     )
 
     page.add(tabs)
+    page.on_disconnect = lambda e: page_closed.set()
+    page.on_close = lambda e: page_closed.set()
+    Thread(target=flush_ui_loop, daemon=True).start()
     load_config()
+    Thread(target=load_course_catalog, daemon=True).start()
+
+    # 在背景預先載入驗證碼模型
+    Thread(target=warm_up_model, daemon=True).start()
 
 if __name__ == "__main__":
     # 需要 freeze_support() 以支援 PyInstaller 打包後 multiprocessing